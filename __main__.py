@@ -20,9 +20,19 @@ Moving any of these folders or files will prevent the game from working properly
 Author: Walker M. White (wmw2)
 Date:   November 1, 2017 (Python 3 Version)
 """
+import os
+import sys
+
+# Make the sibling modules importable when started as "python -m planetoids"
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
 from consts import *
-from app import *
 
 # Application code
 if __name__ == '__main__':
-    Planetoids(width=GAME_WIDTH,height=GAME_HEIGHT).run()
+    if HEADLESS:
+        from runner import main
+        sys.exit(main())
+    else:
+        from app import *
+        Planetoids(width=GAME_WIDTH,height=GAME_HEIGHT).run()
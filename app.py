@@ -12,11 +12,27 @@ you are ensure about where a new class should go, post a question on Ed Discussi
 from consts import *
 from game2d import *
 from wave import *
+from replay import InputRecorder
+from campaign import Campaign
+from profiler import Profiler
+from memory import MemoryReport
 import json
 
 # PRIMARY RULE: Planetoids can only access attributes in wave.py via getters/setters
 # Planetoids is NOT allowed to access anything in models.py
 
+# The handlers of each state, as the names of the Planetoids methods called when the
+# state is entered, on every frame in the state, and when the state is left (None
+# where the state needs no handler)
+STATE_HANDLERS = {
+    STATE_INACTIVE: ('enterinactive','inactiveupdate','exitinactive'),
+    STATE_LOADING:  ('enterloading',None,None),
+    STATE_ACTIVE:   (None,'activeupdate',None),
+    STATE_PAUSED:   ('enterpaused','pausedupdate','exitpaused'),
+    STATE_CONTINUE: ('entercontinue',None,None),
+    STATE_COMPLETE: ('entercomplete',None,None)
+}
+
 class Planetoids(GameApp):
     """
     The primary controller class for the Planetoids application
@@ -60,7 +76,7 @@ class Planetoids(GameApp):
     # THE ATTRIBUTES LISTED ARE SUGGESTIONS ONLY AND CAN BE CHANGED AS YOU SEE FIT
     # Attribute _state: the current state of the game as a value from consts.py
     # Invariant: _state is one of STATE_INACTIVE, STATE_LOADING, STATE_PAUSED, 
-    #            STATE_ACTIVE, STATE_CONTINUE
+    #            STATE_ACTIVE, STATE_CONTINUE, STATE_COMPLETE
     #
     # Attribute _wave: the subcontroller for a single wave, which manages the game
     # Invariant: _wave is a Wave object, or None if there is no wave currently active.
@@ -73,6 +89,27 @@ class Planetoids(GameApp):
     # Attribute _message: the currently active message
     # Invariant: _message is a GLabel, or None if there is no message to display. It is 
     #            only None if _state is STATE_ACTIVE.
+    #
+    # Attribute _recorder: the recorder of the player's input (see --record)
+    # Invariant: _recorder is an InputRecorder, or None if RECORD_FILE is None or 
+    #            the recording has been saved
+    #
+    # Attribute _campaign: the waves to play, each prepared while the one before
+    #     it is played (see campaign.py)
+    # Invariant: _campaign is a Campaign for DEFAULT_WAVE
+    #
+    # Attribute _profiler: the frame profiler (see --profile)
+    # Invariant: _profiler is a Profiler, or None if PROFILE_FILE is None
+    #
+    # Attribute _memory: the memory report (see --memory)
+    # Invariant: _memory is a MemoryReport, or None if MEMORY_FILE is None
+    #
+    # Attribute _labels: the labels built so far, by (text, font name, font size)
+    # Invariant: _labels is a dictionary whose values are GLabels
+    #
+    # Attribute _handlers: the bound handlers of each state (see STATE_HANDLERS)
+    # Invariant: _handlers is a dictionary from each state to a list [enter, 
+    #            update, exit] of bound methods or None
     # START REMOVE
     # END REMOVE
 
@@ -81,6 +118,13 @@ class Planetoids(GameApp):
 
     # DO NOT MAKE A NEW INITIALIZER!
 
+    # GETTERS
+    def getLabels(self):
+        """
+        Returns the list of labels built so far (see _getLabel).
+        """
+        return list(self._labels.values())
+
     # THREE MAIN GAMEAPP METHODS
     def start(self):
         """
@@ -93,19 +137,28 @@ class Planetoids(GameApp):
         This method should make sure that all of the attributes satisfy the given
         invariants. When done, it sets the _state to STATE_INACTIVE and creates both 
         the title (in attribute _title) and a message (in attribute _message) saying 
-        that the user should press a key to play a game.
+        that the user should press a key to play a game. It first loads the 
+        textures of all the game images, so that none are loaded during play.
         """
-        self._state=STATE_INACTIVE
+        loadsprites()
+        self._handlers={}
+        for state in STATE_HANDLERS:
+            self._handlers[state]=[None if name is None else getattr(self,name)
+                for name in STATE_HANDLERS[state]]
         self._wave=None
-        self._title=grectangle.GLabel(text='Planetoids', 
-            font_size=TITLE_SIZE, 
-            font_name=TITLE_FONT,
-            x=GAME_WIDTH/2, 
-            y=GAME_HEIGHT/2+TITLE_SIZE/2)
-        self._message=grectangle.GLabel(text="Press 'S' to Start", 
-            font_size=MESSAGE_SIZE, 
-            font_name=MESSAGE_FONT,x=GAME_WIDTH/2, 
-            y=GAME_HEIGHT/2-TITLE_SIZE/2)
+        self._recorder=None
+        self._labels={}
+        self._campaign=Campaign(DEFAULT_WAVE)
+        self._profiler=None
+        if PROFILE_FILE is not None:
+            self._profiler=Profiler()
+            self._profiler.attachapp(self)
+        self._memory=None
+        if MEMORY_FILE is not None:
+            self._memory=MemoryReport()
+            self._memory.attachapp(self)
+        self._state=STATE_INACTIVE
+        self.enterinactive()
 
     def update(self,dt):            
         """
@@ -129,8 +182,9 @@ class Planetoids(GameApp):
         
         STATE_LOADING: This is the state creates a new wave and shows it on the screen.
         The application switches to this state if the state was STATE_INACTIVE in the
-        previous frame, and the player pressed a key. This state only lasts one animation
-        frame before switching to STATE_ACTIVE.
+        previous frame, and the player pressed a key. It also switches to this state 
+        when a wave is won and the campaign (see campaign.py) has another wave. This 
+        state only lasts one animation frame before switching to STATE_ACTIVE.
         
         STATE_ACTIVE: This is a session of normal gameplay. The player can move the
         ship and fire bullets. All of this should be handled inside of class Wave
@@ -145,21 +199,27 @@ class Planetoids(GameApp):
         previous frame, and the player pressed a key. This state only lasts one animation
         frame before switching to STATE_ACTIVE.
         
+        STATE_COMPLETE: The game is over, won or lost. The wave is still shown, but
+        stands still, with a message saying how the game ended.
+        
         You are allowed to add more states if you wish. Should you do so, you should
         describe them here.
+
+        Each state has its handlers in STATE_HANDLERS: one called when the state is
+        entered, one called on every frame in the state, and one called when the 
+        state is left. This method only calls the frame handler of the current 
+        state, so a state does no work for any other. In particular, the wave only
+        runs its physics in STATE_ACTIVE. A new state only needs its handlers and
+        an entry in STATE_HANDLERS.
         
         Parameter dt: The time in seconds since last update
         Precondition: dt is a number (int or float)
         """
         curr_keys = self.input.key_count
         change= curr_keys and self.input.is_key_down('s') 
-        self.inactiveupdate(change)
-        if self._wave!=None:            
-            self._wave.update(self.input,dt)
-        self.pausedupdate(change)
-        self.continueupdate(change)
-        self.updateloosing(change)
-        self.updatewinning()
+        handler=self._handlers[self._state][1]
+        if handler is not None:
+            handler(change,dt)
         
     def draw(self):
         """
@@ -186,96 +246,168 @@ class Planetoids(GameApp):
             self._wave.draw(self.view)
             self._message.draw(self.view)
             
+    def on_stop(self):
+        """
+        Saves any profile to PROFILE_FILE and any memory report to MEMORY_FILE when
+        the window is closed, and stops the thread preparing waves.
+
+        This is called by Kivy as the application stops.
+        """
+        self._campaign.shutdown()
+        if self._profiler is not None:
+            self._profiler.save(PROFILE_FILE)
+        self._savememory()
+
     # HELPER METHODS FOR THE STATES GO HERE
-    def inactiveupdate(self,change):
+    def enterinactive(self):
+        """
+        This method shows the title and the message saying that the user should
+        press a key to play a game.
         """
-        This method checks whether the state is STATE_INACTIVE and whether a wanted change 
-        occurs. It then sets the state to STATE_LOADING. It sets the message and title attributes 
-        to None and loads the DEFAULT_WAVE json. It creates a wave object using the json and stores
-        it in the wave attribute. It then sets the state to STATE_ACTIVE.
+        self._title=self._getLabel('Planetoids',TITLE_FONT,TITLE_SIZE,
+            GAME_WIDTH/2,GAME_HEIGHT/2+TITLE_SIZE/2)
+        self._message=self._getLabel("Press 'S' to Start",MESSAGE_FONT,MESSAGE_SIZE,
+            GAME_WIDTH/2,GAME_HEIGHT/2-TITLE_SIZE/2)
+
+    def inactiveupdate(self,change,dt):
+        """
+        This method checks whether a wanted change occurs. If so, it sets the state
+        to STATE_LOADING.
+
+        The first wave of the campaign starts being prepared on a worker thread on
+        the first frame of STATE_INACTIVE (see campaign.py). So starting a game 
+        takes no loading at all, even for a very large wave.
+
         Parameter change: the wanted change to check for
         Precondition: change is a boolean
+
+        Parameter dt: The time in seconds since last update
+        Precondition: dt is a number (int or float)
         """
-        if self._getState()==STATE_INACTIVE and change:
+        self._campaign.preload()
+        if change:
             self._setState(STATE_LOADING)
-            self._message=None
-            self._title=None
-            json=self.load_json(DEFAULT_WAVE)           
-            self._wave=Wave(json)
-            self._setState(STATE_ACTIVE)
 
-    def pausedupdate(self,change):
+    def exitinactive(self):
+        """
+        This method sets the message and title attributes to None.
+        """
+        self._message=None
+        self._title=None
+
+    def enterloading(self):
         """
-        This method checks whether the state is STATE_PAUSED and whether 
-        a wanted change occurs. If so, it sets the state to STATE_CONTINUE.
+        This method swaps the next wave of the campaign into the wave attribute, 
+        and then sets the state to STATE_ACTIVE.
+
+        The wave was prepared while the title or the wave before it was shown. The
+        lives left in the wave before, if any, are carried into the new wave. Any 
+        recording of the player's input covers only the first wave, and is saved 
+        when the game moves on from it.
+        """
+        lives=None
+        if self._wave is not None:
+            lives=self._wave.getLives()
+            self._saverecording()
+        self._wave=self._campaign.nextwave()
+        if lives is not None:
+            self._wave.setLives(lives)
+        elif RECORD_FILE is not None:
+            self._recorder=InputRecorder(self._wave.getData())
+            self._wave.setRecorder(self._recorder)
+        if self._profiler is not None:
+            self._profiler.attach(self._wave)
+        if self._memory is not None:
+            self._memory.attach(self._wave)
+        self._setState(STATE_ACTIVE)
+
+    def activeupdate(self,change,dt):
+        """
+        This method animates the wave and then resolves the end of a life or game.
+
+        If the ship is destroyed (is none) and there are no lives left over, the 
+        message to be displayed is "You lost..." and the state is set to 
+        STATE_COMPLETE. Otherwise, if all planetoids are destroyed, the state is 
+        set to STATE_LOADING if the campaign has another wave (a ship destroyed on
+        the same tick still costs a life), and otherwise the message is "You 
+        won!!" and the state is set to STATE_COMPLETE. Otherwise,
+        if the ship is destroyed, the lives are reduced by 1 and the state is set 
+        to STATE_PAUSED.
 
         Parameter change: the wanted change to check for
         Precondition: change is a boolean
+
+        Parameter dt: The time in seconds since last update
+        Precondition: dt is a number (int or float)
         """
-        if self._getState()==STATE_PAUSED and change:
-            self._setState(STATE_CONTINUE)
-    
-    def continueupdate(self,change):
+        self._wave.update(self.input,dt)
+        lost=self._wave.isshipnone()
+        if lost and self._wave.getLives()==0:
+            self._message=self._getLabel("You lost...",MESSAGE_FONT,MESSAGE_SIZE,
+                GAME_WIDTH/2,GAME_HEIGHT/2)
+            self._setState(STATE_COMPLETE)
+        elif self._wave.win() and self._campaign.hasnext():
+            if lost:
+                self._wave.setLives(self._wave.getLives()-1)
+            self._setState(STATE_LOADING)
+        elif self._wave.win():
+            self._message=self._getLabel("You won!!",MESSAGE_FONT,MESSAGE_SIZE,
+                GAME_WIDTH/2,GAME_HEIGHT/2-TITLE_SIZE/2)
+            self._setState(STATE_COMPLETE)
+        elif lost:
+            self._wave.setLives(self._wave.getLives()-1)
+            self._setState(STATE_PAUSED)
+
+    def enterpaused(self):
         """
-        This method checks whether the state is STATE_CONTINUE and whether a 
-        wanted change occurs. If so, it creates a new ship in the wave
-        attribute, sets the message to None and sets the state to STATE_ACTIVE.
+        This method sets the message "Press 'S' to Continue" to be displayed.
+        """
+        self._message=self._getLabel("Press 'S' to Continue",MESSAGE_FONT,
+            MESSAGE_SIZE,GAME_WIDTH/2,GAME_HEIGHT/2)
+
+    def pausedupdate(self,change,dt):
+        """
+        This method checks whether a wanted change occurs. If so, it sets the state
+        to STATE_CONTINUE.
 
-        Paramater change: the change to check for
+        Parameter change: the wanted change to check for
         Precondition: change is a boolean
+
+        Parameter dt: The time in seconds since last update
+        Precondition: dt is a number (int or float)
         """
-        if self._getState()==STATE_CONTINUE and change:
-            self._wave.newship()
-            self._message=None
-            self._setState(STATE_ACTIVE)
+        if change:
+            self._setState(STATE_CONTINUE)
 
-    def updateloosing(self,change):
+    def exitpaused(self):
         """
-        This method resolves the cases where a life is lost. If the ship is 
-        destroyed (is none) and the state is STATE_ACTIVE, the lives are reduced
-        by 1, state is set to STATE_PAUSED and the message "Press 'S' to Continue" 
-        is to be displayed. If a wanted change is detected (the key press), the 
-        state is set to STATE_ACTIVE. If there is no lives left over, the message 
-        to be displayed is "You lost..." and the state is set to STATE_COMPLETE.
+        This method sets the message to None.
+        """
+        self._message=None
 
-        Paramater change: the change to check for
-        Precondition: change is a boolean
+    def entercontinue(self):
         """
-        if self._wave!=None and self._wave.isshipnone():
-            lives=self._wave.getLives()
-            if lives!=0 and self._getState()==STATE_ACTIVE:
-                self._wave.setLives(lives-1)
-                self._setState(STATE_PAUSED)
-                self._message=grectangle.GLabel(text="Press 'S' to Continue", 
-                    font_size=MESSAGE_SIZE, 
-                    font_name=MESSAGE_FONT,x=GAME_WIDTH/2,
-                    y=GAME_HEIGHT/2)
-                if change:
-                    self._setState(STATE_ACTIVE)
-            elif lives==0:            
-                self._wave.setAsteroidsvelocity([0,0])        
-                self._message=grectangle.GLabel(text="You lost...",
-                    font_size=MESSAGE_SIZE, 
-                    font_name=MESSAGE_FONT,
-                    x=GAME_WIDTH/2, 
-                    y=GAME_HEIGHT/2)
-                self._setState(STATE_COMPLETE)
-    
-    def updatewinning(self):
-        """
-        This method resolves the case where all planetoids are destroid.
-        If all of them are destroyed, the message to be displayed is set
-        to "You won!!" and the state is set to STATE_COMPLETE
-        """
-        if self._wave!=None and self._wave.win():
-            self._wave.setAsteroidsvelocity([0,0])
-            self._message=grectangle.GLabel(text="You won!!", 
-            font_size=MESSAGE_SIZE, 
-            font_name=MESSAGE_FONT,
-            x=GAME_WIDTH/2, 
-            y=GAME_HEIGHT/2-TITLE_SIZE/2)
-            self._setState(STATE_COMPLETE)
-    
+        This method creates a new ship in the wave attribute and sets the state to
+        STATE_ACTIVE.
+        """
+        self._wave.newship()
+        self._setState(STATE_ACTIVE)
+
+    def entercomplete(self):
+        """
+        This method stops the asteroids, saves any recording of the player's input
+        to RECORD_FILE, any profile to PROFILE_FILE and any memory report to 
+        MEMORY_FILE.
+
+        As it is only called on entry to STATE_COMPLETE, this happens once and not 
+        on every frame after.
+        """
+        self._wave.setAsteroidsvelocity([0,0])
+        self._saverecording()
+        if self._profiler is not None:
+            self._profiler.save(PROFILE_FILE)
+        self._savememory()
+
     def _getState(self):
         """
         Returns the current game state
@@ -286,10 +418,69 @@ class Planetoids(GameApp):
         """
         Sets game state to state
 
+        The exit handler of the old state is called first, then the entry handler
+        of the new one (see STATE_HANDLERS). An entry handler may itself change the
+        state, as STATE_LOADING and STATE_CONTINUE do. Setting the state it already
+        has does nothing.
+
         Paramater state: the state to change to
         Precondition: state is a valid state from consts.py
         """
+        if state==self._state:
+            return
+        leave=self._handlers[self._state][2]
+        if leave is not None:
+            leave()
         self._state=state
+        enter=self._handlers[state][0]
+        if enter is not None:
+            enter()
+
+    def _saverecording(self):
+        """
+        Saves any recording of the player's input to RECORD_FILE and stops it.
+        """
+        if self._recorder is not None:
+            self._recorder.save(RECORD_FILE,self._wave.getDigest())
+            self._wave.setRecorder(None)
+            self._recorder=None
+
+    def _savememory(self):
+        """
+        Finishes any memory report and saves it to MEMORY_FILE.
+        """
+        if self._memory is not None:
+            self._memory.finish()
+            self._memory.save(MEMORY_FILE)
+
+    def _getLabel(self,text,font_name,font_size,x,y):
+        """
+        Returns a label with the given text and font, placed at (x, y).
+
+        Each label is built only once, the first time it is asked for, and then 
+        reused. Building a GLabel loads the font and lays out the text, which is
+        too slow to do on every frame.
+
+        Parameter text: the text of the label
+        Precondition: text is a string
+
+        Parameter font_name: the font file of the label
+        Precondition: font_name is a string naming a font in the Fonts directory
+
+        Parameter font_size: the font size of the label
+        Precondition: font_size is an int > 0
+
+        Parameter x, y: the center of the label
+        Precondition: x and y are numbers
+        """
+        key=(text,font_name,font_size)
+        if key not in self._labels:
+            self._labels[key]=grectangle.GLabel(text=text,font_size=font_size,
+                font_name=font_name,x=x,y=y)
+        label=self._labels[key]
+        label.x=x
+        label.y=y
+        return label
 
    
 
@@ -0,0 +1,233 @@
+"""
+Parallel batch runner for Planetoids
+
+This module plays many waves headlessly at once, spread over a pool of processes,
+to help balance new wave files. Every wave JSON file in a directory is played with
+every policy (the bot that presses the keys), and the random policy is played once
+for each seed. Each run reports whether the wave was won, the lives left, the frames
+and ticks played and how long the frames took. The rows are written to a CSV file
+as the runs finish, and a summary for each wave and policy is printed at the end.
+
+The policies are
+
+    idle          presses nothing
+    default       plays DEFAULT_SCRIPT from headless.py
+    random        presses random keys (see RandomInput), once for each seed
+    script:FILE   plays the script in the JSON file FILE (see ScriptedInput)
+
+Run it from the folder holding the game as
+
+    python batch.py waves/ --policies default random --seeds 16 --output report.csv
+"""
+import os
+import sys
+
+# The batch runs always run without game2d/Kivy (see HEADLESS in consts.py)
+os.environ.setdefault('PLANETOIDS_HEADLESS','1')
+
+from consts import *
+from headless import *
+from runner import playwave
+from compiler import load
+from wave import *
+import argparse
+import csv
+import glob
+import multiprocessing
+import time
+
+# The columns of the report, in order
+REPORT_COLUMNS = ['wave','policy','seed','outcome','win','lives','frames','ticks',
+    'asteroids','seconds','fps','frame_ms_mean','frame_ms_p50','frame_ms_p99',
+    'frame_ms_max']
+
+# The compiled waves already loaded by this process, by file name
+_waves = {}
+
+
+def makeinput(policy,seed):
+    """
+    Returns the input stand-in that plays the given policy.
+
+    Parameter policy: the policy name (see the module description)
+    Precondition: policy is 'idle', 'default', 'random' or 'script:' and a file
+
+    Parameter seed: the seed for the random policy
+    Precondition: seed is an int
+    """
+    if policy=='idle':
+        return ScriptedInput([[]])
+    if policy=='default':
+        return ScriptedInput()
+    if policy=='random':
+        return RandomInput(seed)
+    if policy.startswith('script:'):
+        return ScriptedInput(load_json(policy[len('script:'):]))
+    raise ValueError('unknown policy %r' % policy)
+
+
+def percentile(values,fraction):
+    """
+    Returns the value below which the given fraction of the values lie.
+
+    Parameter values: the values, sorted from smallest to largest
+    Precondition: values is a non-empty sorted list of numbers
+
+    Parameter fraction: the fraction of the values
+    Precondition: fraction is a float between 0 and 1
+    """
+    return values[min(len(values)-1,int(fraction*len(values)))]
+
+
+def runjob(job):
+    """
+    Plays one wave with one policy and returns its row of the report.
+
+    The row is a dictionary with a value for each column in REPORT_COLUMNS. This 
+    runs in a worker process, which keeps each wave file it has loaded.
+
+    Parameter job: the tuple (wave file, policy, seed, frames)
+    Precondition: job names an existing wave file, a policy, an int seed and an 
+    int number of frames > 0
+    """
+    filename,policy,seed,frames=job
+    if filename not in _waves:
+        _waves[filename]=load(filename)
+    timings=[]
+    result=playwave(Wave(_waves[filename]),frames,makeinput(policy,seed),
+        timings=timings)
+    timings.sort()
+    if timings==[]:
+        timings=[0.0]
+    row={'wave':os.path.basename(filename),'policy':policy,'seed':seed,
+        'win':result['outcome']=='won'}
+    for key in ['outcome','lives','frames','ticks','asteroids','seconds','fps']:
+        row[key]=result[key]
+    row['frame_ms_mean']=1000*sum(timings)/len(timings)
+    row['frame_ms_p50']=1000*percentile(timings,0.5)
+    row['frame_ms_p99']=1000*percentile(timings,0.99)
+    row['frame_ms_max']=1000*timings[-1]
+    return row
+
+
+def makejobs(directory,policies,seeds,frames):
+    """
+    Returns the list of jobs for every wave file, policy and seed.
+
+    Only the random policy is played once for each seed; the others are played
+    once, with seed 0.
+
+    Parameter directory: the directory holding the wave JSON files
+    Precondition: directory is a string naming a directory
+
+    Parameter policies: the policies to play
+    Precondition: policies is a list of policy names
+
+    Parameter seeds: the number of seeds for the random policy
+    Precondition: seeds is an int > 0
+
+    Parameter frames: the most frames to play in each run
+    Precondition: frames is an int > 0
+    """
+    jobs=[]
+    for filename in sorted(glob.glob(os.path.join(directory,'*.json'))):
+        for policy in policies:
+            for seed in range(seeds if policy=='random' else 1):
+                jobs.append((filename,policy,seed,frames))
+    return jobs
+
+
+def runbatch(jobs,processes=None,output=None):
+    """
+    Runs the jobs over a pool of processes and returns the list of report rows.
+
+    Rows come back in the order the runs finish. If output is given, each row is 
+    written to that CSV file as soon as it arrives.
+
+    Parameter jobs: the jobs to run
+    Precondition: jobs is a list of jobs from makejobs
+
+    Parameter processes: the number of worker processes, or None for one per CPU
+    Precondition: processes is None or an int > 0
+
+    Parameter output: the CSV file to write, or None
+    Precondition: output is None or a string
+    """
+    rows=[]
+    file=open(output,'w',newline='') if output else None
+    try:
+        writer=csv.DictWriter(file,REPORT_COLUMNS) if file else None
+        if writer:
+            writer.writeheader()
+        with multiprocessing.Pool(processes) as pool:
+            for row in pool.imap_unordered(runjob,jobs):
+                rows.append(row)
+                if writer:
+                    writer.writerow(row)
+                    file.flush()
+    finally:
+        if file:
+            file.close()
+    return rows
+
+
+def summarize(rows):
+    """
+    Returns a table of text summing up the rows for each wave and policy.
+
+    The table gives the number of runs, the share won, the mean lives left and
+    frames played, and the worst 99th percentile frame time.
+
+    Parameter rows: the report rows
+    Precondition: rows is a list of rows from runjob
+    """
+    groups={}
+    for row in rows:
+        groups.setdefault((row['wave'],row['policy']),[]).append(row)
+    lines=['%-24s %-16s %5s %6s %6s %8s %8s' % ('wave','policy','runs','won',
+        'lives','frames','p99 ms')]
+    for key in sorted(groups):
+        group=groups[key]
+        count=len(group)
+        lines.append('%-24s %-16s %5d %5.0f%% %6.2f %8.0f %8.3f' % (key[0],key[1],
+            count,100*sum(row['win'] for row in group)/count,
+            sum(row['lives'] for row in group)/count,
+            sum(row['frames'] for row in group)/count,
+            max(row['frame_ms_p99'] for row in group)))
+    return '\n'.join(lines)
+
+
+def main(args=None):
+    """
+    Runs the batch command line and returns the exit status.
+
+    Parameter args: the command line arguments, or None to use sys.argv
+    Precondition: args is None or a list of strings
+    """
+    parser=argparse.ArgumentParser(prog='python batch.py',
+        description='Play many Planetoids waves headlessly across CPU cores.')
+    parser.add_argument('directory',help='the directory holding the wave JSON files')
+    parser.add_argument('--policies',nargs='+',default=['default','random'],
+        help='the policies to play (default: %(default)s)')
+    parser.add_argument('--seeds',type=int,default=8,
+        help='the number of seeds for the random policy (default: %(default)s)')
+    parser.add_argument('--frames',type=int,default=HEADLESS_FRAMES,
+        help='the most frames to play in each run (default: %(default)s)')
+    parser.add_argument('--processes',type=int,
+        help='the number of worker processes (default: one per CPU)')
+    parser.add_argument('--output',help='the CSV file to write the rows to')
+    options=parser.parse_args(args)
+
+    jobs=makejobs(options.directory,options.policies,options.seeds,options.frames)
+    start=time.perf_counter()
+    rows=runbatch(jobs,options.processes,options.output)
+    seconds=time.perf_counter()-start
+    print(summarize(rows))
+    frames=sum(row['frames'] for row in rows)
+    print('%d runs, %d frames in %.2f s (%.0f frames/s)' % (len(rows),frames,
+        seconds,frames/seconds if seconds>0 else 0))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""
+Benchmarks for Planetoids
+
+This package measures how fast Wave plays synthetic waves of growing size, without a
+window. The module generate makes wave dictionaries in the same format as the wave
+JSON files in the Data directory. The module run plays them headlessly, times each
+phase of Wave.update, records peak memory and compares the results with a stored
+baseline.
+
+Run it from the folder holding the game as
+
+    python -m benchmarks run --output results.json
+    python -m benchmarks run --baseline results.json
+    python -m benchmarks generate 1000 wave1000.json
+
+Importing this package switches the game modules to headless mode.
+"""
+import os
+import sys
+
+# The benchmarks always run without game2d/Kivy (see HEADLESS in consts.py)
+os.environ.setdefault('PLANETOIDS_HEADLESS','1')
+# Make the game modules importable, whatever the current directory is
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
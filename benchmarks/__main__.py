@@ -0,0 +1,9 @@
+"""
+Command line entry point for the Planetoids benchmarks
+
+Run it as "python -m benchmarks run" from the folder holding the game.
+"""
+from benchmarks.run import main
+import sys
+
+sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Synthetic wave generator for the Planetoids benchmarks
+
+This module makes wave dictionaries in the format that Wave.__init__ reads from a
+wave JSON file: a 'ship' with a 'position' and an 'angle', and a list of 'asteroids'
+each with a 'size', a 'position' and a 'direction'. The same count and seed always
+give the same wave.
+"""
+from consts import *
+import json
+import math
+import random
+
+# The share of large, medium and small asteroids in a generated wave
+SIZE_MIX = [(LARGE_ASTEROID,0.5),(MEDIUM_ASTEROID,0.3),(SMALL_ASTEROID,0.2)]
+
+# The distance from the ship inside which no asteroid is placed
+SAFE_DISTANCE = 150
+
+
+def generate(count,seed=0,bounce=False):
+    """
+    Returns a wave dictionary with the given number of asteroids.
+
+    The ship starts in the middle of the window facing up. The asteroids are
+    placed at random in the window, but never within SAFE_DISTANCE of the ship, and
+    move in random directions. The sizes follow SIZE_MIX.
+
+    Parameter count: the number of asteroids
+    Precondition: count is an int >= 0
+
+    Parameter seed: the seed for the random choices
+    Precondition: seed is an int
+
+    Parameter bounce: whether the asteroids bounce off each other (see 
+    Wave.bounce)
+    Precondition: bounce is a bool
+    """
+    rng=random.Random(seed)
+    sx=GAME_WIDTH/2
+    sy=GAME_HEIGHT/2
+    sizes=[size for size,share in SIZE_MIX]
+    shares=[share for size,share in SIZE_MIX]
+    asteroids=[]
+    while len(asteroids)<count:
+        x=rng.uniform(0,GAME_WIDTH)
+        y=rng.uniform(0,GAME_HEIGHT)
+        if math.hypot(x-sx,y-sy)<SAFE_DISTANCE:
+            continue
+        angle=rng.uniform(0,2*math.pi)
+        asteroids.append({'size':rng.choices(sizes,shares)[0],
+            'position':[round(x,2),round(y,2)],
+            'direction':[round(math.cos(angle),4),round(math.sin(angle),4)]})
+    data={'ship':{'position':[sx,sy],'angle':90},'asteroids':asteroids}
+    if bounce:
+        data['bounce']=True
+    return data
+
+
+def save(data,filename):
+    """
+    Writes a wave dictionary to a JSON file.
+
+    Parameter data: the wave to write
+    Precondition: data is a wave dictionary
+
+    Parameter filename: the file to write to
+    Precondition: filename is a string
+    """
+    with open(filename,'w') as file:
+        json.dump(data,file,indent=1)
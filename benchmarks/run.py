@@ -0,0 +1,289 @@
+"""
+Benchmark runner for Planetoids
+
+This module plays generated waves of growing size headlessly and reports, for each
+one, the frame rate, the time per frame spent in each phase of Wave.update and the 
+peak memory. Results are saved as JSON, and a later run can be compared with them
+to flag any scenario or phase that got slower.
+"""
+from consts import *
+from headless import *
+from runner import playwave
+from wave import *
+from benchmarks.generate import generate, save
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+
+# The asteroid counts of the default scenarios
+SCENARIOS = [10,100,1000,10000]
+# The asteroid counts of the default scenarios with --bounce (dense fields, as the
+# window is the same size)
+BOUNCE_SCENARIOS = [1000,2000,5000]
+# The number of frames each scenario plays
+BENCH_FRAMES = 300
+# The phases of Wave.update that are timed, and the Wave methods that make up each
+PHASES = [('movement',['moveship','asteroidwrapandvel']),('bounce',['bounce']),
+    ('fire',['fire']),
+    ('deletebullet',['deletebullet']),('detect',['detect']),('cleanup',['cleanup'])]
+# The slowdown (as a fraction of the baseline) past which a result is flagged
+TOLERANCE = 0.25
+# The smallest slowdown (in milliseconds per frame) that is ever flagged
+NOISE_MS = 0.02
+
+
+class PhaseTimer(object):
+    """
+    A class to time the phases of Wave.update.
+
+    Calling attach(wave) replaces the phase methods of that one wave with versions
+    that add their running time to a total. Nothing in Wave itself changes, so a
+    wave that is not attached runs at full speed.
+    """
+    # Attribute _totals: the total seconds spent in each phase
+    # Invariant: _totals is a dict mapping each phase name in PHASES to a float
+
+    def getTotals(self):
+        """
+        Returns a dictionary of the total seconds spent in each phase.
+        """
+        return dict(self._totals)
+
+    def __init__(self):
+        """
+        Creates a timer with every total at zero.
+        """
+        self._totals={}
+        for phase,methods in PHASES:
+            self._totals[phase]=0.0
+
+    def attach(self,wave):
+        """
+        Replaces the phase methods of the wave with timed versions.
+
+        Parameter wave: the wave to time
+        Precondition: wave is a Wave object
+        """
+        for phase,methods in PHASES:
+            for name in methods:
+                setattr(wave,name,self._timed(phase,getattr(wave,name)))
+
+    def _timed(self,phase,method):
+        """
+        Returns a version of method that adds its running time to the phase total.
+
+        Parameter phase: the phase to add to
+        Precondition: phase is a phase name in PHASES
+
+        Parameter method: the bound method to time
+        Precondition: method is callable
+        """
+        totals=self._totals
+        clock=time.perf_counter
+        def timed(*args):
+            start=clock()
+            result=method(*args)
+            totals[phase]+=clock()-start
+            return result
+        return timed
+
+
+def runscenario(data,frames=BENCH_FRAMES,script=None,memory=True):
+    """
+    Plays one wave for the given number of frames and returns its measurements.
+
+    The dictionary returned has the keys 'asteroids', 'frames', 'fps', 'frame_ms',
+    'phases' (a dictionary of milliseconds per frame for each phase), 'pairs' 
+    (the pairs tested per frame) and 'peak_kib' (the peak traced memory, or None
+    if memory is False). Memory is measured in a second run, as tracing slows 
+    everything down.
+
+    Parameter data: the wave to play
+    Precondition: data is a wave dictionary
+
+    Parameter frames: the number of frames to play
+    Precondition: frames is an int > 0
+
+    Parameter script: the keys down in each frame, or None for DEFAULT_SCRIPT
+    Precondition: script is None or a non-empty list of lists of key names
+
+    Parameter memory: whether to measure the peak memory
+    Precondition: memory is a bool
+    """
+    timer=PhaseTimer()
+    wave=Wave(data)
+    timer.attach(wave)
+    result=playwave(wave,frames,ScriptedInput(script),endless=True)
+    totals=timer.getTotals()
+    phases={}
+    for phase in totals:
+        phases[phase]=1000*totals[phase]/frames
+
+    peak=None
+    if memory:
+        tracemalloc.start()
+        playwave(Wave(data),frames,ScriptedInput(script),endless=True)
+        peak=tracemalloc.get_traced_memory()[1]/1024
+        tracemalloc.stop()
+    return {'asteroids':len(data['asteroids']),'frames':frames,'fps':result['fps'],
+        'frame_ms':1000*result['seconds']/frames,'phases':phases,
+        'pairs':wave.getPairCount()/frames,'peak_kib':peak}
+
+
+def runall(counts=SCENARIOS,frames=BENCH_FRAMES,seed=0,script=None,memory=True,
+    bounce=False):
+    """
+    Runs a scenario for each asteroid count and returns the results dictionary.
+
+    With bounce, the asteroids of every scenario bounce off each other (see
+    Wave.bounce), and the scenarios are named 'bounce-' rather than 'asteroids-'
+    and the count.
+
+    The dictionary has the keys 'python', 'platform', 'seed', 'frames' and 
+    'scenarios', which maps a scenario name to its measurements.
+
+    Parameter counts: the number of asteroids in each scenario
+    Precondition: counts is a list of ints >= 0
+
+    Parameter frames: the number of frames each scenario plays
+    Precondition: frames is an int > 0
+
+    Parameter seed: the seed for the generated waves
+    Precondition: seed is an int
+
+    Parameter script: the keys down in each frame, or None for DEFAULT_SCRIPT
+    Precondition: script is None or a non-empty list of lists of key names
+
+    Parameter memory: whether to measure the peak memory
+    Precondition: memory is a bool
+
+    Parameter bounce: whether the asteroids bounce off each other
+    Precondition: bounce is a bool
+    """
+    scenarios={}
+    name='bounce-%d' if bounce else 'asteroids-%d'
+    for count in counts:
+        scenarios[name % count]=runscenario(generate(count,seed,bounce),frames,
+            script,memory)
+    return {'python':platform.python_version(),'platform':platform.platform(),
+        'seed':seed,'frames':frames,'scenarios':scenarios}
+
+
+def compare(results,baseline,tolerance=TOLERANCE):
+    """
+    Returns a list of messages, one for each measurement slower than the baseline.
+
+    A frame time or phase time is flagged if it grew by more than the tolerance
+    and by more than NOISE_MS. Scenarios missing from either side are skipped.
+
+    Parameter results: the new results
+    Precondition: results is a results dictionary from runall()
+
+    Parameter baseline: the results to compare against
+    Precondition: baseline is a results dictionary from runall()
+
+    Parameter tolerance: the allowed slowdown as a fraction
+    Precondition: tolerance is a float >= 0
+    """
+    messages=[]
+    for name in results['scenarios']:
+        if name not in baseline['scenarios']:
+            continue
+        new=results['scenarios'][name]
+        old=baseline['scenarios'][name]
+        pairs=[('frame',new['frame_ms'],old['frame_ms'])]
+        for phase in new['phases']:
+            if phase in old['phases']:
+                pairs.append((phase,new['phases'][phase],old['phases'][phase]))
+        for what,now,then in pairs:
+            if now>then*(1+tolerance) and now-then>NOISE_MS:
+                messages.append('%s: %s %.3f ms/frame, baseline %.3f (+%.0f%%)' %
+                    (name,what,now,then,100*(now/then-1) if then>0 else 100))
+    return messages
+
+
+def report(results):
+    """
+    Returns the results as a table of text.
+
+    Parameter results: the results to show
+    Precondition: results is a results dictionary from runall()
+    """
+    names=[phase for phase,methods in PHASES]
+    lines=['%-18s %9s %9s' % ('scenario','fps','ms/frame')+
+        ''.join(' %12s' % name for name in names)+' %10s %10s' % ('pairs',
+        'peak KiB')]
+    for name in results['scenarios']:
+        scenario=results['scenarios'][name]
+        peak=scenario['peak_kib']
+        lines.append('%-18s %9.1f %9.3f' % (name,scenario['fps'],scenario['frame_ms'])+
+            ''.join(' %12.3f' % scenario['phases'].get(phase,0) for phase in names)+
+            ' %10.0f' % scenario.get('pairs',0)+
+            (' %10.0f' % peak if peak is not None else ' %10s' % '-'))
+    return '\n'.join(lines)
+
+
+def main(args=None):
+    """
+    Runs the benchmark command line and returns the exit status.
+
+    The exit status is 1 if a baseline was given and something got slower.
+
+    Parameter args: the command line arguments, or None to use sys.argv
+    Precondition: args is None or a list of strings
+    """
+    parser=argparse.ArgumentParser(prog='python -m benchmarks',
+        description='Benchmark Planetoids waves headlessly.')
+    commands=parser.add_subparsers(dest='command',required=True)
+
+    run=commands.add_parser('run',help='run the benchmark scenarios')
+    run.add_argument('--counts',type=int,nargs='+',
+        help='the asteroid count of each scenario (default: %s, or %s with '
+        '--bounce)' % (SCENARIOS,BOUNCE_SCENARIOS))
+    run.add_argument('--bounce',action='store_true',
+        help='make the asteroids bounce off each other')
+    run.add_argument('--frames',type=int,default=BENCH_FRAMES,
+        help='the frames played in each scenario (default: %(default)s)')
+    run.add_argument('--seed',type=int,default=0,
+        help='the seed for the generated waves (default: %(default)s)')
+    run.add_argument('--script',
+        help='a JSON file holding a list of the keys down in each frame')
+    run.add_argument('--no-memory',action='store_true',
+        help='skip the peak memory measurement')
+    run.add_argument('--output',help='the JSON file to save the results to')
+    run.add_argument('--baseline',help='a results JSON file to compare against')
+    run.add_argument('--tolerance',type=float,default=TOLERANCE,
+        help='the allowed slowdown as a fraction (default: %(default)s)')
+
+    gen=commands.add_parser('generate',help='write a generated wave JSON file')
+    gen.add_argument('count',type=int,help='the number of asteroids')
+    gen.add_argument('output',help='the JSON file to write')
+    gen.add_argument('--seed',type=int,default=0,
+        help='the seed for the generated wave (default: %(default)s)')
+    gen.add_argument('--bounce',action='store_true',
+        help='make the asteroids bounce off each other')
+    options=parser.parse_args(args)
+
+    if options.command=='generate':
+        save(generate(options.count,options.seed,options.bounce),options.output)
+        return 0
+
+    script=load_json(options.script) if options.script else None
+    counts=options.counts
+    if counts is None:
+        counts=BOUNCE_SCENARIOS if options.bounce else SCENARIOS
+    results=runall(counts,options.frames,options.seed,script,
+        not options.no_memory,options.bounce)
+    print(report(results))
+    if options.output:
+        with open(options.output,'w') as file:
+            json.dump(results,file,indent=1)
+    if options.baseline:
+        messages=compare(results,load_json(options.baseline),options.tolerance)
+        for message in messages:
+            print('SLOWER '+message)
+        if messages:
+            return 1
+    return 0
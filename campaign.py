@@ -0,0 +1,178 @@
+"""
+Multi-wave campaigns for Planetoids
+
+A campaign is a list of waves played one after another, with the lives left at the
+end of one wave carried into the next. It is given by a manifest: a JSON file with
+a list of wave JSON files under the key 'waves', such as
+
+    {"waves": ["wave1.json", "wave2.json", "wave3.json"]}
+
+The wave files are looked for next to the manifest first, and then as for any other
+wave (see findwave in compiler.py). A plain wave JSON file is a campaign of one wave.
+A file that is in the wave cache is known to be a wave without parsing it again.
+
+So that neither starting the game nor moving on to the next wave stalls it, the 
+manifest is read, and each wave is prepared, on a worker thread. The next wave is 
+prepared while the current one is played: its file is compiled (or read
+from the cache, see compiler.py) and its asteroid store is built. Only the ship, the
+one view object of a wave, is made on the main thread, when the wave is swapped in.
+A wave that is not in the cache yet is parsed while holding the interpreter lock,
+which can slow the game for that time, but this only happens the first time a wave
+file is played.
+"""
+from consts import *
+from compiler import cachename, findwave, load
+from wave import *
+import concurrent.futures
+import json
+import os
+
+# The key of the list of wave files in a campaign manifest
+MANIFEST_KEY = 'waves'
+
+
+def readmanifest(filename):
+    """
+    Returns the list of wave files of the campaign in the given file.
+
+    If the file is a manifest, this is its list of wave files, each found next to
+    the manifest if it is there. Otherwise the file is taken to be a wave, and the
+    list is just that file.
+
+    Parameter filename: the campaign manifest or wave JSON file
+    Precondition: filename is a string naming a JSON file (a ValueError is raised
+    if it is a manifest without a non-empty list of wave files)
+    """
+    path=findwave(filename)
+    with open(path,'rb') as file:
+        blob=file.read()
+    if os.path.exists(cachename(blob)):
+        return [filename]
+    data=json.loads(blob)
+    if type(data)!=dict or MANIFEST_KEY not in data:
+        return [filename]
+    waves=data[MANIFEST_KEY]
+    if (type(waves)!=list or waves==[] or
+        not all(type(wave)==str for wave in waves)):
+        raise ValueError('%s must have a non-empty list of wave files' % filename)
+    folder=os.path.dirname(path)
+    result=[]
+    for wave in waves:
+        nearby=os.path.join(folder,wave)
+        result.append(nearby if os.path.exists(nearby) else wave)
+    return result
+
+
+def preparewave(filename):
+    """
+    Returns a tuple (compiled, asteroids) of the given wave, ready to be played.
+
+    Here compiled is the compiled wave and asteroids is its asteroid store (see
+    buildasteroids in wave.py). This makes no view objects, so it can run on a
+    worker thread.
+
+    Parameter filename: the wave JSON file
+    Precondition: filename is a string naming a wave JSON file
+    """
+    compiled=load(filename)
+    return (compiled,buildasteroids(compiled))
+
+
+class Campaign(object):
+    """
+    A class to hand out the waves of a campaign in order, each prepared ahead of time.
+
+    The manifest is read on a worker thread as soon as the campaign is made. Each 
+    call to nextwave returns the next wave of the campaign and starts preparing the
+    one after it on the same thread. The first wave starts being prepared when
+    preload is called (or, at the latest, when it is first asked for). The getters
+    wait for the manifest if it has not been read yet.
+    """
+    # Attribute _manifest: the reading of the wave files of the campaign, in order
+    # Invariant: _manifest is a Future of readmanifest, whose result is a 
+    #            non-empty list of strings
+    #
+    # Attribute _index: the number of waves handed out so far
+    # Invariant: _index is an int between 0 and the number of waves
+    #
+    # Attribute _executor: the worker thread that reads the manifest and prepares
+    #     the waves
+    # Invariant: _executor is a ThreadPoolExecutor with one worker
+    #
+    # Attribute _pending: the preparation of wave _index
+    # Invariant: _pending is a Future of preparewave for wave _index, or None if
+    #            it has not been started or there are no waves left
+
+    # GETTERS
+    def getCount(self):
+        """Returns the number of waves in the campaign"""
+        return len(self._manifest.result())
+
+    def getIndex(self):
+        """Returns the number of waves handed out so far"""
+        return self._index
+
+    def hasnext(self):
+        """Returns True if there is a wave left to hand out"""
+        return self._index<self.getCount()
+
+    # INITIALIZER
+    def __init__(self,filename):
+        """
+        Creates a campaign from a manifest or a single wave file.
+
+        The file is read on the worker thread, so any error in it is raised by the
+        first method that needs the list of waves.
+
+        Parameter filename: the campaign manifest or wave JSON file
+        Precondition: filename is a string naming a JSON file (see readmanifest)
+        """
+        self._index=0
+        self._executor=concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._manifest=self._executor.submit(readmanifest,filename)
+        self._pending=None
+
+    def preload(self):
+        """
+        Starts preparing the next wave on the worker thread, if not started already.
+
+        This does not wait for the manifest, as the worker reads it first.
+        """
+        if self._pending is None and (not self._manifest.done() or self.hasnext()):
+            self._pending=self._executor.submit(self._prepare,self._index)
+
+    def nextwave(self):
+        """
+        Returns the next wave of the campaign and starts preparing the one after.
+
+        If the next wave is not ready yet, this waits for it. Any error raised
+        while reading the manifest or preparing it is raised here.
+
+        Precondition: hasnext() is True
+        """
+        self.preload()
+        compiled,asteroids=self._pending.result()
+        self._pending=None
+        self._index+=1
+        self.preload()
+        return Wave(compiled,asteroids)
+
+    def shutdown(self):
+        """
+        Stops the worker thread once any wave it is preparing is done.
+        """
+        self._executor.shutdown(wait=False)
+
+    # HELPER METHODS
+    def _prepare(self,index):
+        """
+        Returns preparewave for the wave with the given index, or None if there is
+        no such wave. This runs on the worker thread, after the manifest is read.
+
+        Parameter index: the index of the wave
+        Precondition: index is an int >= 0
+        """
+        waves=self._manifest.result()
+        if index>=len(waves):
+            return None
+        return preparewave(waves[index])
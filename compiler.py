@@ -0,0 +1,306 @@
+"""
+Wave compiler for Planetoids
+
+Reading a wave JSON file means parsing the text and then, for every asteroid, looking
+up its size and normalizing its direction. For a large wave this takes long enough
+to cause a visible hitch when a game starts. This module does that work once. It
+checks a wave JSON file and compiles it into a compact binary form: a header (see
+WAVE_HEADER) with the wave's flags and the ship's position and angle, followed by 
+one fixed-size record
+(see WAVE_RECORD) per asteroid holding its position, its starting velocity and its
+size class (see SIZE_NAMES in models.py).
+
+Compiled waves are cached on disk in WAVE_CACHE, under the SHA-256 digest of the
+JSON file and of the size tables baked into the records (see WAVE_TABLES). A file that has not changed is never parsed again: load() memory-maps its
+cached form, and Wave builds its arrays straight from the records.
+"""
+from consts import *
+from models import SIZE_NAMES, SIZE_SPEEDS
+import hashlib
+import json
+import numpy as np
+import os
+import struct
+
+# The magic bytes that start a compiled wave
+WAVE_MAGIC = b'PLWV'
+# The version of the compiled wave format
+WAVE_VERSION = 2
+# The compiled wave header: magic, version, flags, ship x, ship y, ship angle, 
+# asteroids
+WAVE_HEADER = struct.Struct('<4sBB2xdddI4x')
+# The flag set in the header of a wave whose asteroids bounce off each other
+WAVE_BOUNCE = 1
+# One asteroid in a compiled wave: position, starting velocity and size class
+WAVE_RECORD = np.dtype([('x','<f8'),('y','<f8'),('vx','<f8'),('vy','<f8'),
+    ('kind','<i8')])
+
+
+def tabledigest(names,speeds):
+    """
+    Returns the SHA-256 digest (as bytes) of the tables baked into compiled waves.
+
+    Parameter names: the name of each size class
+    Precondition: names is a list of strings
+
+    Parameter speeds: the speed of each size class
+    Precondition: speeds is a float NumPy array the same length as names
+    """
+    return hashlib.sha256(json.dumps(names).encode()+
+        np.asarray(speeds,dtype='<f8').tobytes()).digest()
+
+
+# The digest of the tables baked into compiled waves (the size names, which give
+# the size classes, and the speed of each size class), so that changing them
+# compiles every wave again
+WAVE_TABLES = tabledigest(SIZE_NAMES,SIZE_SPEEDS)
+
+
+class CompiledWave(object):
+    """
+    A class to hold a wave in compiled form.
+
+    A compiled wave can be given to Wave in place of the wave JSON. The asteroid
+    records may be a memory map of a cached file, so they must not be changed.
+    """
+    # Attribute _ship: the ship's starting position and angle, as (x, y, angle)
+    # Invariant: _ship is a tuple of three floats
+    #
+    # Attribute _asteroids: one record per asteroid
+    # Invariant: _asteroids is a NumPy array (or memory map) of WAVE_RECORD
+    #
+    # Attribute _bounce: whether the asteroids bounce off each other
+    # Invariant: _bounce is a bool
+    #
+    # Attribute _filename: the wave JSON file this was compiled from
+    # Invariant: _filename is a string, or None if compiled from a dictionary
+    #
+    # Attribute _data: the wave JSON, once it has been read
+    # Invariant: _data is a wave dictionary, or None if not read yet
+
+    # GETTERS
+    def getShip(self):
+        """Returns the ship's starting position and angle, as (x, y, angle)"""
+        return self._ship
+
+    def getAsteroids(self):
+        """Returns the asteroid records as a NumPy array of WAVE_RECORD"""
+        return self._asteroids
+
+    def getBounce(self):
+        """Returns True if the asteroids bounce off each other"""
+        return self._bounce
+
+    def getData(self):
+        """
+        Returns the wave JSON this was compiled from.
+
+        The file is only read the first time this is called, as it is only needed
+        for things like recording the player's input.
+        """
+        if self._data is None:
+            with open(self._filename) as file:
+                self._data=json.load(file)
+        return self._data
+
+    # INITIALIZER
+    def __init__(self,ship,asteroids,filename=None,data=None,bounce=False):
+        """
+        Creates a compiled wave.
+
+        Parameter ship: the ship's starting position and angle, as (x, y, angle)
+        Precondition: ship is a tuple of three numbers
+
+        Parameter asteroids: one record per asteroid
+        Precondition: asteroids is a NumPy array of WAVE_RECORD
+
+        Parameter filename: the wave JSON file, or None
+        Precondition: filename is None or a string; it is not None if data is None
+
+        Parameter data: the wave JSON, or None
+        Precondition: data is None or a wave dictionary
+
+        Parameter bounce: whether the asteroids bounce off each other
+        Precondition: bounce is a bool
+        """
+        self._ship=tuple(float(value) for value in ship)
+        self._asteroids=asteroids
+        self._bounce=bounce
+        self._filename=filename
+        self._data=data
+
+
+def findwave(filename):
+    """
+    Returns the path of the given wave JSON file.
+
+    The file is looked for as given first, and then in the Data directory next to
+    this module, as in load_json.
+
+    Parameter filename: the wave JSON file
+    Precondition: filename is a string
+    """
+    if not os.path.exists(filename):
+        filename=os.path.join(os.path.dirname(os.path.abspath(__file__)),'Data',
+            filename)
+    return filename
+
+
+def validate(data):
+    """
+    Checks that data is a well-formed wave dictionary.
+
+    It must have a 'ship' with a 'position' (two numbers) and an 'angle', and a
+    list of 'asteroids', each with a 'size' from SIZE_NAMES, a 'position' and a
+    'direction' (two numbers each). It may also have 'bounce', which must be a 
+    bool. A ValueError describing the first problem is raised if it does not.
+
+    Parameter data: the value to check
+    Precondition: NONE (data can be anything)
+    """
+    def ispair(value):
+        return (type(value)==list and len(value)==2 and
+            all(type(x) in [int,float] for x in value))
+
+    if type(data)!=dict or type(data.get('ship'))!=dict:
+        raise ValueError('a wave must have a ship')
+    ship=data['ship']
+    if not ispair(ship.get('position')) or type(ship.get('angle')) not in [int,float]:
+        raise ValueError('the ship must have a position and an angle')
+    if type(data.get('asteroids'))!=list:
+        raise ValueError('a wave must have a list of asteroids')
+    if type(data.get('bounce',False))!=bool:
+        raise ValueError('bounce must be true or false')
+    for i in range(len(data['asteroids'])):
+        item=data['asteroids'][i]
+        if (type(item)!=dict or item.get('size') not in SIZE_NAMES or
+            not ispair(item.get('position')) or not ispair(item.get('direction'))):
+            raise ValueError('asteroid %d must have a size, a position and a '
+                'direction' % i)
+
+
+def compilewave(data,filename=None):
+    """
+    Returns the given wave dictionary in compiled form.
+
+    The velocity of each asteroid is its direction made a unit vector and scaled
+    by the speed of its size class, exactly as Wave used to compute it. A zero
+    direction gives a zero velocity.
+
+    Parameter data: the wave JSON
+    Precondition: data is a wave dictionary (a ValueError is raised if not)
+
+    Parameter filename: the wave JSON file data was read from, or None
+    Precondition: filename is None or a string
+    """
+    validate(data)
+    ship=data['ship']
+    asteroids=data['asteroids']
+    records=np.zeros(len(asteroids),dtype=WAVE_RECORD)
+    if len(asteroids)!=0:
+        kind=np.array([SIZE_NAMES.index(item['size']) for item in asteroids])
+        position=np.array([item['position'] for item in asteroids],dtype=float)
+        direction=np.array([item['direction'] for item in asteroids],dtype=float)
+        dx=direction[:,0]
+        dy=direction[:,1]
+        length=np.sqrt(dx*dx+dy*dy)
+        moving=length!=0
+        length[~moving]=1
+        speed=SIZE_SPEEDS[kind]
+        records['x']=position[:,0]
+        records['y']=position[:,1]
+        records['vx']=np.where(moving,dx/length*speed,dx)
+        records['vy']=np.where(moving,dy/length*speed,dy)
+        records['kind']=kind
+    return CompiledWave((ship['position'][0],ship['position'][1],ship['angle']),
+        records,filename,data,data.get('bounce',False))
+
+
+def save(compiled,filename):
+    """
+    Writes a compiled wave to a file.
+
+    The file is written under a temporary name and then renamed, so a reader never
+    sees a partly written file.
+
+    Parameter compiled: the compiled wave
+    Precondition: compiled is a CompiledWave
+
+    Parameter filename: the file to write
+    Precondition: filename is a string
+    """
+    x,y,angle=compiled.getShip()
+    records=compiled.getAsteroids()
+    flags=WAVE_BOUNCE if compiled.getBounce() else 0
+    temporary='%s.%d.tmp' % (filename,os.getpid())
+    with open(temporary,'wb') as file:
+        file.write(WAVE_HEADER.pack(WAVE_MAGIC,WAVE_VERSION,flags,x,y,angle,
+            len(records)))
+        file.write(records.tobytes())
+    os.replace(temporary,filename)
+
+
+def read(filename,source=None):
+    """
+    Returns the compiled wave stored in a file, with its records memory-mapped.
+
+    Parameter filename: the compiled wave file
+    Precondition: filename is a string naming a file written by save
+
+    Parameter source: the wave JSON file it was compiled from, or None
+    Precondition: source is None or a string
+    """
+    with open(filename,'rb') as file:
+        header=file.read(WAVE_HEADER.size)
+    magic,version,flags,x,y,angle,count=WAVE_HEADER.unpack(header)
+    if magic!=WAVE_MAGIC or version!=WAVE_VERSION:
+        raise ValueError('%s is not a version %d compiled wave' %
+            (filename,WAVE_VERSION))
+    if count==0:
+        records=np.zeros(0,dtype=WAVE_RECORD)
+    else:
+        records=np.memmap(filename,dtype=WAVE_RECORD,mode='r',
+            offset=WAVE_HEADER.size,shape=(count,))
+    return CompiledWave((x,y,angle),records,source,None,bool(flags & WAVE_BOUNCE))
+
+
+def cachename(blob):
+    """
+    Returns the name of the cache file for a wave JSON file with the given contents.
+
+    The name is made from the SHA-256 digest of the contents and of WAVE_TABLES, 
+    and WAVE_VERSION. The file exists only if the wave has been compiled before.
+
+    Parameter blob: the contents of the wave JSON file
+    Precondition: blob is a bytes object
+    """
+    key=hashlib.sha256(WAVE_TABLES+blob).hexdigest()
+    return os.path.join(WAVE_CACHE,'%s.v%d.wave' % (key,WAVE_VERSION))
+
+
+def load(filename):
+    """
+    Returns the given wave JSON file in compiled form, using the cache if it can.
+
+    The cache entry is named by the SHA-256 digest of the file's contents and of
+    WAVE_TABLES, so an edited file, or a change to the size tables, means the 
+    wave is compiled again. If the cache cannot be written, the wave is
+    compiled in memory instead.
+
+    Parameter filename: the wave JSON file
+    Precondition: filename is a string naming a wave JSON file (a ValueError is
+    raised if it is not well-formed)
+    """
+    path=findwave(filename)
+    with open(path,'rb') as file:
+        blob=file.read()
+    cached=cachename(blob)
+    if os.path.exists(cached):
+        return read(cached,path)
+    compiled=compilewave(json.loads(blob),path)
+    try:
+        os.makedirs(WAVE_CACHE,exist_ok=True)
+        save(compiled,cached)
+    except OSError:
+        return compiled
+    return read(cached,path)
@@ -9,6 +9,7 @@ we separate the constants into their own module. This allows all modules to acce
 # DATE COMPLETED HERE
 """
 import introcs
+import os
 import sys
 
 ### WINDOW CONSTANTS (all coordinates are in pixels) ###
@@ -82,6 +83,10 @@ BULLET_SPEED  = 10
 BULLET_RATE   = 30
 # The color of a bullet
 BULLET_COLOR   = 'red'
+# The number of frames a bullet lasts (long enough to cross the whole window)
+BULLET_LIFETIME = 128
+# The number of bullets that can be in play at once (the size of the bullet pool)
+BULLET_POOL = BULLET_LIFETIME//BULLET_RATE+1
 
 ### GAME CONSTANTS ###
 
@@ -116,7 +121,7 @@ MESSAGE_OFFSET = -70
 
 ### JSON FILES ###
 
-# The default wave
+# The default wave, or campaign manifest listing several waves (see campaign.py)
 DEFAULT_WAVE  = 'wave1.json'
 
 ### USE COMMAND LINE ARGUMENTS TO CHANGE DEFAULT LEVEL FILE
@@ -129,9 +134,18 @@ everything after the word python. So if you start the game typing
 Python puts ['planetoids', 'default.json'] into sys.argv. Below, we take advantage of 
 this fact to change the constant DEFAULT_LEVEL. This is the level file to be used when 
 you start the game.  
+
+Arguments starting with - are options rather than level files. Options listed in
+VALUE_OPTIONS are followed by a value, which is not a level file either.
 """
+# The command line options that are followed by a value
+VALUE_OPTIONS = ['--frames','--script','--speed','--record','--replay',
+    '--profile','--memory','--memory-budget']
+
 try:
-    file = sys.argv[1]
+    args = sys.argv[1:]
+    file = [arg for i, arg in enumerate(args) if arg[:1] != '-' and 
+        (i == 0 or args[i-1] not in VALUE_OPTIONS)][0]
     if file[-5:].lower() == '.json':
         DEFAULT_WAVE = file
     else:
@@ -140,3 +154,95 @@ except:
     pass # Use original value
 
 ### ADD MORE CONSTANTS (PROPERLY COMMENTED) AS NECESSARY ###
+
+### HEADLESS CONSTANTS ###
+
+# Whether to run the simulation without game2d/Kivy (see headless.py and runner.py).
+# Tools that import the game modules set PLANETOIDS_HEADLESS before doing so.
+HEADLESS = '--headless' in sys.argv or os.environ.get('PLANETOIDS_HEADLESS','')!=''
+# The number of frames a headless run plays unless told otherwise
+HEADLESS_FRAMES = 3600
+# The time step (in seconds) a headless run passes to Wave.update each frame
+HEADLESS_DT = 1/60
+# The time (in seconds) of one frame when a headless run is paced against the clock
+HEADLESS_FRAME_TIME = 1/60
+# The most frames the random bot player holds the same keys for
+RANDOM_HOLD = 30
+
+### REPLAY CONSTANTS ###
+
+# The file to record the player's input to (given with --record), or None
+RECORD_FILE = None
+if '--record' in sys.argv[:-1]:
+    RECORD_FILE = sys.argv[sys.argv.index('--record')+1]
+# The keys that are recorded each tick, in bit order
+REPLAY_KEYS = ['left','right','up','spacebar']
+
+### PHYSICS CONSTANTS ###
+
+# The number of physics ticks per second (speeds and frame counts are per tick)
+TICK_RATE = 60
+# The time (in seconds) of one physics tick
+TICK_TIME = 1/TICK_RATE
+# The most ticks one call to Wave.update may run at normal speed when catching up
+MAX_TICKS = 5
+
+# The width of the wrapped world (the window plus the dead zone on each side)
+WORLD_WIDTH  = GAME_WIDTH+2*DEAD_ZONE
+# The height of the wrapped world (the window plus the dead zone on each side)
+WORLD_HEIGHT = GAME_HEIGHT+2*DEAD_ZONE
+# The number of slots a Bodies store starts with (it grows as needed)
+BODIES_CAPACITY = 64
+# The smallest width and height of a collision grid cell. It must be at least the
+# largest distance at which two things can touch (LARGE_RADIUS+SHIP_RADIUS), and 
+# at least the largest distance at which a bullet can end a tick after touching an
+# asteroid during it (LARGE_RADIUS+BULLET_RADIUS+BULLET_SPEED+SMALL_SPEED).
+GRID_CELL = max(2*LARGE_RADIUS,LARGE_RADIUS+BULLET_RADIUS+BULLET_SPEED+SMALL_SPEED)
+# About the most asteroid pairs tested in one tick in a wave where asteroids bounce
+# off each other. Past this, the pairs are shared out over several ticks. This 
+# keeps Wave.bounce to a few milliseconds a tick (see its specification).
+BOUNCE_PAIRS = 1<<15
+
+### WAVE CACHE CONSTANTS ###
+
+# The directory where compiled waves are cached (see compiler.py)
+WAVE_CACHE = os.environ.get('PLANETOIDS_CACHE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)),'.wavecache'))
+
+### PROFILER CONSTANTS ###
+
+# The file to write the profile to (see profiler.py), or None to not profile. It is
+# set with --profile or PLANETOIDS_PROFILE. A .json file gets a Chrome trace, and
+# any other file a text summary.
+PROFILE_FILE = os.environ.get('PLANETOIDS_PROFILE') or None
+if '--profile' in sys.argv[:-1]:
+    PROFILE_FILE = sys.argv[sys.argv.index('--profile')+1]
+# The number of most recent frames the profiler keeps
+PROFILE_FRAMES = 1024
+# The number of most recent timed calls the profiler keeps
+PROFILE_EVENTS = 65536
+
+### MEMORY REPORT CONSTANTS ###
+
+# The file to write the memory report to (see memory.py), or None for no report. It
+# is set with --memory or PLANETOIDS_MEMORY. A .json file gets the report as JSON,
+# and any other file as text.
+MEMORY_FILE = os.environ.get('PLANETOIDS_MEMORY') or None
+if '--memory' in sys.argv[:-1]:
+    MEMORY_FILE = sys.argv[sys.argv.index('--memory')+1]
+# The most traced bytes per live entity a headless run may use before it fails, or
+# None for no limit. It is set with --memory-budget or PLANETOIDS_MEMORY_BUDGET, and
+# left as a string here: the runner's argument parser turns it into a number, so a
+# bad value is reported as a usage error rather than breaking this import.
+MEMORY_BUDGET = os.environ.get('PLANETOIDS_MEMORY_BUDGET') or None
+if '--memory-budget' in sys.argv[:-1]:
+    MEMORY_BUDGET = sys.argv[sys.argv.index('--memory-budget')+1]
+# The number of most recent frames the memory report keeps
+MEMORY_FRAMES = 1024
+# The number of lines shown in each snapshot difference
+MEMORY_TOP = 10
+
+### TEXTURE CONSTANTS ###
+
+# The images whose textures are loaded once, when the game starts
+TEXTURE_IMAGES = [LARGE_IMAGE,MEDIUM_IMAGE,SMALL_IMAGE,SHIP_IMAGE,SHIELD_IMAGE]
@@ -0,0 +1,128 @@
+"""
+Frame recording for Planetoids
+
+This module has the part that the profiler (profiler.py) and the memory report
+(memory.py) share: starting a frame at the start of every update, and keeping the
+values of the last few frames in NumPy ring buffers. Each of them records its own
+values in each frame.
+"""
+import numpy as np
+
+
+class FrameRecorder(object):
+    """
+    A base class for the tools that record values for each frame of a game.
+
+    A frame starts with each call to beginframe. Once attachapp has been called,
+    that happens at the start of every Planetoids.update; until then it happens at
+    the start of every Wave.update, which is what a headless run wants.
+
+    Only the last few frames are kept, each in one row of the subclass's ring
+    buffers. A subclass records a frame in the methods _endframe, which is given
+    the row of the frame that has finished, and _startframe, which is given the row
+    of the frame that starts.
+    """
+    # Attribute _wave: the wave being recorded
+    # Invariant: _wave is a Wave object, or None if none is attached yet
+    #
+    # Attribute _app: the application whose updates start frames
+    # Invariant: _app is a Planetoids object, or None if frames start with
+    #            Wave.update
+    #
+    # Attribute _size: the number of frames kept
+    # Invariant: _size is an int > 0
+    #
+    # Attribute _frames: the number of frames finished
+    # Invariant: _frames is an int >= 0
+    #
+    # Attribute _started: whether the first frame has started
+    # Invariant: _started is a bool
+
+    # GETTERS
+    def getFrames(self):
+        """Returns the number of frames finished"""
+        return self._frames
+
+    # INITIALIZER
+    def __init__(self,size):
+        """
+        Creates a recorder that keeps the given number of frames.
+
+        Parameter size: the number of frames kept
+        Precondition: size is an int > 0
+        """
+        self._wave=None
+        self._app=None
+        self._size=size
+        self._frames=0
+        self._started=False
+
+    # ATTACHING
+    def attach(self,wave):
+        """
+        Records the given wave from now on, starting a new frame with every
+        Wave.update until attachapp is called.
+
+        Parameter wave: the wave to record
+        Precondition: wave is a Wave object
+        """
+        self._wave=wave
+        update=wave.update
+        def frame(*args):
+            if self._app is None:
+                self.beginframe()
+            return update(*args)
+        wave.update=frame
+
+    def attachapp(self,app):
+        """
+        Starts a new frame with every Planetoids.update.
+
+        Each wave the application plays must still be given to attach.
+
+        Parameter app: the application to record
+        Precondition: app is a Planetoids object
+        """
+        self._app=app
+        update=app.update
+        def frame(*args):
+            self.beginframe()
+            return update(*args)
+        app.update=frame
+
+    # RECORDING
+    def beginframe(self):
+        """
+        Finishes the current frame, if any, and starts a new one.
+        """
+        if self._started:
+            self._endframe(self._frames % self._size)
+            self._frames+=1
+        self._started=True
+        self._startframe(self._frames % self._size)
+
+    # HELPER METHODS
+    def _endframe(self,row):
+        """
+        Records the frame that has just finished.
+
+        Parameter row: the row of the frame in the ring buffers
+        Precondition: row is an int in 0.._size-1
+        """
+        pass
+
+    def _startframe(self,row):
+        """
+        Records the start of a new frame.
+
+        Parameter row: the row of the frame in the ring buffers
+        Precondition: row is an int in 0.._size-1
+        """
+        pass
+
+    def _rows(self):
+        """
+        Returns the rows of the kept frames, oldest first.
+        """
+        count=min(self._frames,self._size)
+        return (np.arange(self._frames-count,self._frames) % self._size)
@@ -0,0 +1,240 @@
+"""
+Headless support module for Planetoids
+
+This module lets the models and Wave run without game2d or Kivy. It contains plain
+stand-ins for GImage and GEllipse that keep the position and size attributes the
+models use, but carry no view or texture state. It also contains stand-ins for
+GInput that play back scripted key presses or press random keys.
+
+The stand-ins are only used when the game is started with the --headless flag (see
+HEADLESS in consts.py). The runner that plays a wave with them is in runner.py.
+"""
+from consts import *
+import json
+import os
+import random
+
+
+class GObject(object):
+    """
+    A plain game object with a position and a size.
+
+    This class replaces GObject from game2d when running headless. It keeps the
+    attributes that the models read and write, but it has nothing to draw.
+    """
+    # Attribute x: the horizontal coordinate of the object center
+    # Invariant: x is an int or float
+    #
+    # Attribute y: the vertical coordinate of the object center
+    # Invariant: y is an int or float
+    #
+    # Attribute width: the width of the object
+    # Invariant: width is an int or float >= 0
+    #
+    # Attribute height: the height of the object
+    # Invariant: height is an int or float >= 0
+    #
+    # Attribute angle: the angle of rotation about the center (in degrees)
+    # Invariant: angle is an int or float
+
+    def __init__(self,**keywords):
+        """
+        Creates a new object from the given keywords.
+
+        The keywords are the same as those of GObject in game2d. Any keyword that is
+        not one of x, y, width, height or angle is stored as an attribute as is.
+        """
+        self.x=0
+        self.y=0
+        self.width=1
+        self.height=1
+        self.angle=0
+        for key in keywords:
+            setattr(self,key,keywords[key])
+
+    def draw(self,view):
+        """
+        Does nothing, as there is no view when running headless.
+
+        Parameter view: the view to draw to
+        Precondition: view is None or a GView
+        """
+        pass
+
+
+class GImage(GObject):
+    """
+    A plain stand-in for GImage from game2d.
+
+    The source file name is remembered, but the image is never loaded.
+    """
+    # Attribute source: the image file name
+    # Invariant: source is a string or None
+
+    def __init__(self,**keywords):
+        """
+        Creates a new image object from the given keywords.
+        """
+        self.source=None
+        super().__init__(**keywords)
+
+
+class GEllipse(GObject):
+    """
+    A plain stand-in for GEllipse from game2d.
+
+    The fill color is remembered, but it is never turned into a color object.
+    """
+    # Attribute fillcolor: the fill color name
+    # Invariant: fillcolor is a string or None
+
+    def __init__(self,**keywords):
+        """
+        Creates a new ellipse object from the given keywords.
+        """
+        self.fillcolor=None
+        super().__init__(**keywords)
+
+
+# The script used when no other script is given: turn and fire, then thrust and fire
+DEFAULT_SCRIPT = [['left','spacebar']]*45+[['up','spacebar']]*15
+
+
+class ScriptedInput(object):
+    """
+    A stand-in for GInput that plays back a script of key presses.
+
+    The script is a list with one entry per frame. Each entry is a list of the keys
+    held down during that frame. When the script runs out it starts over from the
+    beginning, so a short script can drive a run of any length.
+
+    The runner must call advance() once at the end of every frame.
+    """
+    # Attribute _script: the keys down in each frame of the script
+    # Invariant: _script is a non-empty list of frozensets of strings
+    #
+    # Attribute _frame: the number of frames played so far
+    # Invariant: _frame is an int >= 0
+    #
+    # Attribute _keys: the keys down in the current frame
+    # Invariant: _keys is an element of _script
+
+    @property
+    def key_count(self):
+        """
+        The number of keys currently held down.
+        """
+        return len(self._keys)
+
+    def getFrame(self):
+        """
+        Returns the number of frames played so far.
+        """
+        return self._frame
+
+    def __init__(self,script=None):
+        """
+        Creates a scripted input.
+
+        Parameter script: the keys down in each frame, or None for DEFAULT_SCRIPT
+        Precondition: script is None or a non-empty list of lists of key names
+        """
+        if script is None:
+            script=DEFAULT_SCRIPT
+        self._script=[frozenset(keys) for keys in script]
+        self._frame=0
+        self._keys=self._script[0]
+
+    def is_key_down(self,key):
+        """
+        Returns True if the key is held down in the current frame.
+
+        Parameter key: the key to test
+        Precondition: key is a string
+        """
+        return key in self._keys
+
+    def advance(self):
+        """
+        Moves the script on to the next frame.
+        """
+        self._frame+=1
+        self._keys=self._script[self._frame % len(self._script)]
+
+
+class RandomInput(object):
+    """
+    A stand-in for GInput that presses random keys, as a simple bot player.
+
+    Every so often it picks a new set of keys from REPLAY_KEYS, each with an even
+    chance, and holds them for between 1 and RANDOM_HOLD frames. The same seed
+    always gives the same presses.
+
+    The runner must call advance() once at the end of every frame.
+    """
+    # Attribute _random: the random number generator
+    # Invariant: _random is a random.Random
+    #
+    # Attribute _keys: the keys down in the current frame
+    # Invariant: _keys is a frozenset of strings
+    #
+    # Attribute _hold: the number of frames left before new keys are picked
+    # Invariant: _hold is an int >= 1
+
+    @property
+    def key_count(self):
+        """
+        The number of keys currently held down.
+        """
+        return len(self._keys)
+
+    def __init__(self,seed=0):
+        """
+        Creates a random input.
+
+        Parameter seed: the seed for the random choices
+        Precondition: seed is an int
+        """
+        self._random=random.Random(seed)
+        self._pick()
+
+    def is_key_down(self,key):
+        """
+        Returns True if the key is held down in the current frame.
+
+        Parameter key: the key to test
+        Precondition: key is a string
+        """
+        return key in self._keys
+
+    def advance(self):
+        """
+        Moves on to the next frame, picking new keys when the hold runs out.
+        """
+        self._hold-=1
+        if self._hold==0:
+            self._pick()
+
+    def _pick(self):
+        """
+        Picks a new set of keys and how long to hold them.
+        """
+        self._keys=frozenset(key for key in REPLAY_KEYS if self._random.random()<0.5)
+        self._hold=self._random.randint(1,RANDOM_HOLD)
+
+
+def load_json(filename):
+    """
+    Returns the dictionary stored in the given JSON file.
+
+    This replaces GameApp.load_json when running headless. The file is looked for
+    as given first, and then in the Data directory next to this module.
+
+    Parameter filename: the JSON file to load
+    Precondition: filename is a string naming an existing JSON file
+    """
+    if not os.path.exists(filename):
+        filename=os.path.join(os.path.dirname(os.path.abspath(__file__)),'Data',
+            filename)
+    with open(filename) as file:
+        return json.load(file)
@@ -0,0 +1,278 @@
+"""
+Memory report for Planetoids
+
+This module measures the memory used by a game, so that a process that grows over a
+long session can be explained. It reports three things:
+
+    - the number and estimated bytes of each type of entity (Ship, Asteroid,
+      Bullet and GLabel, see Wave.getEntityMemory),
+    - for each frame, the bytes allocated at its high point and the bytes still
+      held at its end (the allocation and retention rates), and the change in the
+      number of memory blocks Python has allocated,
+    - a tracemalloc snapshot difference for each wave, showing the lines of code
+      whose memory grew the most between the start of the wave and the start of
+      the next one (or the end of the game).
+
+The report is off unless MEMORY_FILE is set, with --memory FILE on the command line
+or the PLANETOIDS_MEMORY environment variable, as tracemalloc slows every allocation
+down. It is saved as JSON if the file ends in .json, and otherwise as text.
+
+A headless run may also be given a budget with --memory-budget BYTES. The run then
+fails if the traced memory per live entity over the frames played is over the
+budget. This is the traced bytes summed over the frames divided by the entities
+summed over the frames, so that the few frames at the end of a wave, where a 
+handful of entities share all the fixed costs, do not decide it.
+"""
+from consts import *
+from frames import FrameRecorder
+from models import objectsize
+import json
+import numpy as np
+import sys
+import tracemalloc
+
+# The entity types counted, in the order they are reported
+MEMORY_TYPES = ['Ship','Asteroid','Bullet','GLabel']
+# The values measured in each frame
+MEMORY_COUNTERS = ['entities','traced','allocated','retained','blocks']
+# The files left out of the snapshot differences
+MEMORY_IGNORE = [__file__,tracemalloc.__file__,'<frozen importlib._bootstrap>',
+    '<frozen importlib._bootstrap_external>','<unknown>']
+
+
+class MemoryReport(FrameRecorder):
+    """
+    A class to measure the memory used by the entities and each frame of a game.
+
+    Creating a report starts tracemalloc, if it is not running already, so only
+    the memory allocated after that is traced. Frames start and are kept as in
+    FrameRecorder, MEMORY_FRAMES at a time, and the labels of the application given
+    to attachapp are counted as entities. Calling finish ends the last frame and
+    wave, and stops tracemalloc if this report started it.
+    """
+    # Attribute _tracing: whether this report started tracemalloc
+    # Invariant: _tracing is a bool
+    #
+    # Attribute _counts: the counters of each kept frame, in the order of
+    #     MEMORY_COUNTERS (bytes for traced, allocated and retained)
+    # Invariant: _counts is an int NumPy array of shape (MEMORY_FRAMES,
+    #            len(MEMORY_COUNTERS))
+    #
+    # Attribute _totals: the sum over all frames of the live entities and of the
+    #     traced bytes at the end of the frame
+    # Invariant: _totals is a list of two ints >= 0
+    #
+    # Attribute _start: the traced bytes and allocated blocks when the current
+    #     frame started
+    # Invariant: _start is a list of two ints, or None before the first frame
+    #
+    # Attribute _snapshot: the snapshot taken when the current wave started
+    # Invariant: _snapshot is a tracemalloc Snapshot, or None before any wave
+    #
+    # Attribute _waves: the number of waves attached so far
+    # Invariant: _waves is an int >= 0
+    #
+    # Attribute _diffs: the snapshot difference of each wave that has ended
+    # Invariant: _diffs is a list of pairs (title, lines), where lines is a list of
+    #            at most MEMORY_TOP strings
+
+    # GETTERS
+    def getBytesPerEntity(self):
+        """
+        Returns the traced bytes per live entity, averaged over all frames.
+
+        This is the traced bytes at the end of each frame, summed over the frames,
+        divided by the live entities of each frame, summed the same way. It is 0
+        if no frame has had any entities.
+        """
+        if self._totals[0]==0:
+            return 0.0
+        return self._totals[1]/self._totals[0]
+
+    # INITIALIZER
+    def __init__(self):
+        """
+        Creates a report with empty ring buffers and starts tracemalloc.
+        """
+        super().__init__(MEMORY_FRAMES)
+        self._tracing=not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start()
+        self._counts=np.zeros((MEMORY_FRAMES,len(MEMORY_COUNTERS)),dtype=np.int64)
+        self._totals=[0,0]
+        self._start=None
+        self._snapshot=None
+        self._waves=0
+        self._diffs=[]
+
+    # ATTACHING
+    def attach(self,wave):
+        """
+        Measures the given wave from now on, ending the snapshot difference of the
+        wave before it, if any.
+
+        Parameter wave: the wave to measure
+        Precondition: wave is a Wave object
+        """
+        self._endwave()
+        super().attach(wave)
+        self._waves+=1
+        self._snapshot=tracemalloc.take_snapshot()
+
+    # RECORDING
+    def finish(self):
+        """
+        Finishes the current frame and wave, and stops tracemalloc if this report
+        started it.
+
+        Nothing more is measured after this.
+        """
+        if tracemalloc.is_tracing():
+            self.beginframe()
+            self._endwave()
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing=False
+
+    def entities(self):
+        """
+        Returns the number and estimated bytes of each type of entity in play.
+
+        The result is a dictionary from each name in MEMORY_TYPES to a list [count,
+        bytes] (see Wave.getEntityMemory). The labels are those the application
+        has built, and there are none when running headless.
+        """
+        result={}
+        for name in MEMORY_TYPES:
+            result[name]=[0,0]
+        if self._wave is not None:
+            result.update(self._wave.getEntityMemory())
+        if self._app is not None:
+            labels=self._app.getLabels()
+            result['GLabel']=[len(labels),sum(objectsize(label) for label in labels)]
+        return result
+
+    def overbudget(self,budget):
+        """
+        Returns True if the traced bytes per live entity is over budget.
+
+        Parameter budget: the most bytes per live entity allowed
+        Precondition: budget is a number > 0
+        """
+        return self.getBytesPerEntity()>budget
+
+    # EXPORTING
+    def report(self):
+        """
+        Returns the report as a dictionary that can be saved as JSON.
+
+        It has the keys 'frames', 'bytes_per_entity', 'entities' (see entities),
+        'per_frame' (a dictionary with the mean, p50, p99 and largest value of each
+        counter over the kept frames) and 'waves' (a list of dictionaries with the
+        'title' and 'lines' of each snapshot difference).
+        """
+        rows=self._rows()
+        frames={}
+        if len(rows)!=0:
+            for i in range(len(MEMORY_COUNTERS)):
+                values=self._counts[rows,i]
+                frames[MEMORY_COUNTERS[i]]={'mean':float(values.mean()),
+                    'p50':float(np.percentile(values,50)),
+                    'p99':float(np.percentile(values,99)),'max':int(values.max())}
+        return {'frames':self._frames,'bytes_per_entity':self.getBytesPerEntity(),
+            'entities':self.entities(),'per_frame':frames,
+            'waves':[{'title':title,'lines':lines} for title,lines in self._diffs]}
+
+    def summary(self):
+        """
+        Returns the report as text.
+        """
+        report=self.report()
+        lines=['%d frames measured, %d kept' % (self._frames,len(self._rows())),
+            'traced bytes per live entity: %.1f' % report['bytes_per_entity'],'',
+            '%-20s %10s %12s %12s' % ('entity','count','bytes','bytes each')]
+        for name in MEMORY_TYPES:
+            count,size=report['entities'][name]
+            lines.append('%-20s %10d %12d %12.1f' % (name,count,size,
+                size/count if count!=0 else 0.0))
+        if report['per_frame']!={}:
+            lines.append('')
+            lines.append('%-20s %10s %10s %10s %10s' % ('per frame','mean','p50',
+                'p99','max'))
+            for name in MEMORY_COUNTERS:
+                values=report['per_frame'][name]
+                lines.append('%-20s %10.1f %10.1f %10.1f %10d' % (name,values['mean'],
+                    values['p50'],values['p99'],values['max']))
+        for title,diff in self._diffs:
+            lines.append('')
+            lines.append(title)
+            lines.extend('  '+line for line in diff)
+        return '\n'.join(lines)
+
+    def save(self,filename):
+        """
+        Saves the report: as JSON if filename ends in .json, and otherwise as text.
+
+        Parameter filename: the file to write
+        Precondition: filename is a string
+        """
+        with open(filename,'w') as file:
+            if filename.lower().endswith('.json'):
+                json.dump(self.report(),file,indent=1)
+            else:
+                file.write(self.summary()+'\n')
+
+    # HELPER METHODS
+    def _endwave(self):
+        """
+        Adds the snapshot difference of the current wave, if there is one.
+        """
+        if self._snapshot is None or not tracemalloc.is_tracing():
+            return
+        filters=[tracemalloc.Filter(False,name) for name in MEMORY_IGNORE]
+        snapshot=tracemalloc.take_snapshot().filter_traces(filters)
+        stats=snapshot.compare_to(self._snapshot.filter_traces(filters),'lineno')
+        title='wave %d (to frame %d)' % (self._waves,self._frames)
+        self._diffs.append((title,[str(stat) for stat in stats[:MEMORY_TOP]]))
+        self._snapshot=None
+
+    def _endframe(self,row):
+        """
+        Records the entities, memory and blocks of the frame that has just
+        finished.
+
+        Parameter row: the row of the frame in the ring buffers
+        Precondition: row is an int in 0..MEMORY_FRAMES-1
+        """
+        traced,peak=tracemalloc.get_traced_memory()
+        entities=self._livecount()
+        counts=self._counts[row]
+        counts[0]=entities
+        counts[1]=traced
+        counts[2]=peak-self._start[0]
+        counts[3]=traced-self._start[0]
+        counts[4]=sys.getallocatedblocks()-self._start[1]
+        self._totals[0]+=entities
+        self._totals[1]+=traced
+
+    def _startframe(self,row):
+        """
+        Notes the traced bytes and allocated blocks when the new frame started.
+
+        Parameter row: the row of the frame in the ring buffers
+        Precondition: row is an int in 0..MEMORY_FRAMES-1
+        """
+        tracemalloc.reset_peak()
+        self._start=[tracemalloc.get_traced_memory()[0],sys.getallocatedblocks()]
+
+    def _livecount(self):
+        """
+        Returns the number of entities in play, without measuring their bytes.
+        """
+        count=0
+        if self._wave is not None:
+            count+=(self._wave.getAsteroidCount()+self._wave.getBulletCount()+
+                (0 if self._wave.isshipnone() else 1))
+        if self._app is not None:
+            count+=len(self._app.getLabels())
+        return count
@@ -18,9 +18,15 @@ make a new class or not, please ask on Ed Discussions.
 # DATE COMPLETED HERE
 """
 from consts import *
-from game2d import *
+if HEADLESS:
+    from headless import GImage, GEllipse
+else:
+    from game2d import *
 from introcs import *
+import numpy as np
+import functools
 import math
+import sys
 
 # PRIMARY RULE: Models are not allowed to access anything in any module other than
 # consts.py. If you need extra information from Gameplay, then it should be a 
@@ -39,75 +45,38 @@ def degToRad(deg):
     return math.pi*deg/180
 # END REMOVE
 
+# The cosine and sine of each whole angle from 0 to 359 degrees
+ANGLE_COS = [math.cos(degToRad(deg)) for deg in range(360)]
+ANGLE_SIN = [math.sin(degToRad(deg)) for deg in range(360)]
+
 
 class Bullet(GEllipse):
     """
     A class representing a bullet from the ship
     
     Bullets are typically just white circles (ellipses). The size of the bullet is 
-    determined by constants in consts.py. However, we MUST subclass GEllipse, because 
-    we need to add an extra attribute for the velocity of the bullet.
-    
-    The class Wave will need to look at this velocity, so you will need getters for
-    the velocity components. However, it is possible to write this assignment with no 
-    setters for the velocities. That is because the velocity is fixed and cannot change 
-    once the bolt is fired.
+    determined by constants in consts.py. We subclass GEllipse so that a bullet can be
+    drawn.
     
-    In addition to the getters, you need to write the __init__ method to set the starting
-    velocity. This __init__ method will need to call the __init__ from GEllipse as a
-    helper. This init will need a parameter to set the direction of the velocity.
-    
-    You also want to create a method to update the bolt. You update the bolt by adding
-    the velocity to the position. While it is okay to add a method to detect collisions
-    in this class, you may find it easier to process collisions in wave.py.
+    A bullet is only a sprite. Its position, velocity and whether it is still in 
+    play are kept by Wave in a Bodies object, together with those of all other 
+    bullets. When Wave draws, it takes a bullet from a SpritePool for each bullet in
+    view and moves it into place, so a bullet object is not tied to any one shot.
     """
     # LIST ANY ATTRIBUTES (AND THEIR INVARIANTS) HERE IF NECESSARY
 
-    #Attribute _deleted: whether or not a bullet should be deleted
-    #Invariant: _deleted is a boolean
-
-    #Attribute _velocity: the velocity of the bullet
-    #Invariant: _velocity is a Vector2 object
-    
-    # GETTERS AND SETTERS (ONLY ADD IF YOU NEED THEM)
-
-    def getVelocity(self):
-        """Returns the bullets's velocity attribute"""
-        return self._velocity
-
-    def getDeleted(self):
-        """Returns the bullet's deleted attribute."""
-        return self._deleted
-
-    def setDeleted(self,state):
-        """
-        Sets the attribute deleted to valid state. State can be either
-        True, if the bullet should be deleted from a list, and False otherwise.
-        Parameter state: the state to set attribute deleted to
-        Precondition: state is a boolean- either True or False
-        """
-        self._deleted=state
-
-    def getPosition(self):
-        """Returns a list of the bullet's position as 
-        a list of [x-coordinate, y-coordinate].
-        """
-        return [self.x,self.y]
-
-    # INITIALIZER TO SET THE POSITION AND VELOCITY
-    def __init__(self,facing,x,y,width,height,fillcolor=BULLET_COLOR):               
+    # INITIALIZER TO SET THE POSITION
+    def __init__(self,x,y,width=2*BULLET_RADIUS,height=2*BULLET_RADIUS,
+        fillcolor=BULLET_COLOR):
         """
         Creates a new bullet. 
 
-        Has facing, x, y coordinates, width, height and fillcolor.
+        Has x, y coordinates, width, height and fillcolor.
 
-        Precondition: facing is a Vector2 object, x and y are floats, width and 
-        height, fillcolor are appropriate constants from consts.py.
+        Precondition: x and y are floats, width and height, fillcolor are 
+        appropriate constants from consts.py.
         """
         super().__init__(x=x,y=y,fillcolor=BULLET_COLOR,width=width,height=height)
-        facing.normalize()
-        self._velocity=facing*BULLET_SPEED
-        self._deleted=False
     
     # ADDITIONAL METHODS (MOVEMENT, COLLISIONS, ETC)
 
@@ -140,6 +109,9 @@ class Ship(GImage):
 
     #Attribute _facing: the facing of the ship
     #Invariant: _facing is a Vector2 object
+    #
+    # Both vectors are changed in place as the ship turns and thrusts, so a frame
+    # of play makes no new objects.
      
     # GETTERS AND SETTERS (ONLY ADD IF YOU NEED THEM)
 
@@ -171,35 +143,89 @@ class Ship(GImage):
         """
         super().__init__(x=x,y=y,angle=angle,width=2*SHIP_RADIUS,
             height=2*SHIP_RADIUS,source=SHIP_IMAGE)
-        self._velocity=Vector2(x=0, y=0)
-        self._facing=Vector2(math.cos(degToRad(angle)),math.sin(degToRad(angle)))      
+        self.reset(x,y,angle)
      
     # ADDITIONAL METHODS (MOVEMENT, COLLISIONS, ETC)
+    def reset(self,x,y,angle):
+        """
+        Puts the ship back at the given position and angle, at rest.
+
+        This lets Wave reuse one ship for every life, rather than making a new 
+        image each time.
+
+        Parameter x, y: the position of the ship
+        Precondition: x and y are floats
+
+        Parameter angle: the angle of the ship (in degrees)
+        Precondition: angle is a float
+        """
+        self.x=x
+        self.y=y
+        self.angle=angle
+        self._velocity=Vector2(x=0, y=0)
+        self._facing=Vector2(x=0, y=0)
+        self.face()
+
+    def restore(self,x,y,angle,vx,vy):
+        """
+        Puts the ship at the given position and angle, moving at the given velocity.
+
+        Parameter x, y: the position of the ship
+        Precondition: x and y are floats
+
+        Parameter angle: the angle of the ship (in degrees)
+        Precondition: angle is a float
+
+        Parameter vx, vy: the velocity of the ship
+        Precondition: vx and vy are floats
+        """
+        self.reset(x,y,angle)
+        self._velocity.x=vx
+        self._velocity.y=vy
+
+    def face(self):
+        """
+        Sets the facing vector in place from the ship's angle.
+
+        A whole angle (which is all SHIP_TURN_RATE gives from a whole starting 
+        angle) is looked up in ANGLE_COS and ANGLE_SIN; any other angle is worked 
+        out with math.cos and math.sin.
+        """
+        angle=self.angle
+        if angle==int(angle):
+            deg=int(angle)%360
+            self._facing.x=ANGLE_COS[deg]
+            self._facing.y=ANGLE_SIN[deg]
+        else:
+            self._facing.x=math.cos(degToRad(angle))
+            self._facing.y=math.sin(degToRad(angle))
+
     def turn(self,da):
         """
         Turns the ship by da degrees.
         Parameter da: the number of degrees to turn by.
         Precondition: da is an integer.
         """
-        self.angle+=da
-        self._facing=Vector2(math.cos(degToRad(self.angle)),
-            math.sin(degToRad(self.angle)))        
+        if da!=0:
+            self.angle+=da
+            self.face()
 
     def impulse(self):
         """
         This method sets the ship's velocity according to the impulse.
         If the resulting velocity is greater than SHIP_MAX_SPEED, then it is set
         to SHIP_MAX_SPEED.
-        """
-        impls=self._facing*SHIP_IMPULSE
-        v=self._velocity+impls
-     
-        if v.length()>=SHIP_MAX_SPEED:
-            self._velocity=v.normalize()
-            self._velocity*=SHIP_MAX_SPEED
 
-        else:
-            self._velocity+=impls
+        The velocity is changed in place, with no temporary vectors.
+        """
+        vx=self._velocity.x+self._facing.x*SHIP_IMPULSE
+        vy=self._velocity.y+self._facing.y*SHIP_IMPULSE
+        length=math.sqrt(vx*vx+vy*vy)
+        if length>=SHIP_MAX_SPEED:
+            vx=vx/length*SHIP_MAX_SPEED
+            vy=vy/length*SHIP_MAX_SPEED
+        self._velocity.x=vx
+        self._velocity.y=vy
 
     def turnship(self,input):
         """
@@ -235,214 +261,767 @@ class Asteroid(GImage):
     
     Asteroids are typically are represented by images. Asteroids come in three 
     different sizes (SMALL_ASTEROID, MEDIUM_ASTEROID, and LARGE_ASTEROID) that 
-    determine the choice of image and asteroid radius. We MUST subclass GImage, because 
-    we need extra attributes for both the size and the velocity of the asteroid.
-    
-    The class Wave will need to look at the size and velocity, so you will need getters 
-    for them.  However, it is possible to write this assignment with no setters for 
-    either of these. That is because they are fixed and cannot change when the planetoid 
-    is created. 
+    determine the choice of image and asteroid radius. We subclass GImage so that an
+    asteroid can be drawn.
     
-    In addition to the getters, you need to write the __init__ method to set the size
-    and starting velocity. Note that the SPEED of an asteroid is defined in const.py,
-    so the only thing that differs is the velocity direction.
-    
-    You also want to create a method to update the asteroid. You update the asteroid 
-    by adding the velocity to the position. While it is okay to add a method to detect 
-    collisions in this class, you may find it easier to process collisions in wave.py.
+    An asteroid is only a sprite. Its position, velocity and size are kept by Wave 
+    in a Bodies object, together with those of all other asteroids, and asteroids 
+    are broken up there in bulk by fragments(). When Wave draws, it takes an 
+    asteroid of the right size from a SpritePool for each asteroid in view and 
+    moves it into place, so there are only ever as many Asteroid objects as are 
+    drawn at once.
     """
     # LIST ANY ATTRIBUTES (AND THEIR INVARIANTS) HERE IF NECESSARY
     
-    #Attribute _deleted: whether or not an asteroid should be deleted
-    #Invariant: _deleted is a boolean
+    # GETTERS AND SETTERS (ONLY ADD IF YOU NEED THEM)
+    # The size and speed of each size class are in SIZE_RADII and SIZE_SPEEDS
+    
+    # INITIALIZER TO CREATE A NEW ASTEROID
+    def __init__(self,x,y,width,height,source):
+        """
+        Creates a new asteroid.
+        
+        Has x, y coordinate, width, height and source.
 
-    #Attribute _velocity: the velocity of the asteroid
-    #Invariant: _velocity is a Vector2 object
+        Precondition: x, y are floats, width, height, source are taken from 
+        consts.py.
+        """
+        super().__init__(x=x,y=y,width=width,height=height,source=source)
 
-    #Attribute _direction: the direction of the asteroid
-    #Invariant: _direction is a Vector2 object
-    
-    # GETTERS AND SETTERS (ONLY ADD IF YOU NEED THEM)
 
-    def getVelocity(self):
-        """Returns the asteroid's velocity attribute"""
-        return self._velocity
+# IF YOU NEED ADDITIONAL MODEL CLASSES, THEY GO HERE
 
-    def getDeleted(self):
-        """Returns the asteroid's deleted attribute"""
-        return self._deleted
+class Bodies(object):
+    """
+    A class to store moving circles as a structure of arrays.
 
-    def setDeleted(self,state):
-        """Sets the attribute deleted to valid state. State can be either
-        True, if the bullet should be deleted from a list, and False otherwise.
+    Asteroids and bullets do not keep their own position and velocity. Instead Wave
+    keeps one Bodies object for the asteroids and one for the bullets, and slot i of
+    the arrays belongs to element i of the matching list of views. Keeping these
+    numbers in contiguous NumPy arrays lets a whole list of bodies move and wrap in
+    one vectorized step each frame.
 
-        Parameter state: the state to set attribute deleted to
-        Precondition: state is a boolean- either True or False
-        """
-        self._deleted=state
+    The arrays have room for more bodies than are in use, and grow when they are
+    full. Only the first getCount() slots hold live data, and the getters return
+    views of just those slots.
+    """
+    __slots__=('_x','_y','_vx','_vy','_radius','_alive','_age','_count')
+    # Attribute _x: the horizontal position of each body
+    # Invariant: _x is a float NumPy array with len(_x) >= _count
+    #
+    # Attribute _y: the vertical position of each body
+    # Invariant: _y is a float NumPy array the same length as _x
+    #
+    # Attribute _vx: the horizontal velocity of each body
+    # Invariant: _vx is a float NumPy array the same length as _x
+    #
+    # Attribute _vy: the vertical velocity of each body
+    # Invariant: _vy is a float NumPy array the same length as _x
+    #
+    # Attribute _radius: the radius of each body
+    # Invariant: _radius is a float NumPy array the same length as _x
+    #
+    # Attribute _alive: whether each body is still in play
+    # Invariant: _alive is a bool NumPy array the same length as _x
+    #
+    # Attribute _age: the number of times each body has moved since it was added
+    # Invariant: _age is an int NumPy array the same length as _x
+    #
+    # Attribute _count: the number of slots in use
+    # Invariant: _count is an int >= 0
+
+    # GETTERS AND SETTERS
+    def getCount(self):
+        """Returns the number of bodies in the store"""
+        return self._count
+
+    def getX(self):
+        """Returns the horizontal positions as a NumPy array view"""
+        return self._x[:self._count]
+
+    def getY(self):
+        """Returns the vertical positions as a NumPy array view"""
+        return self._y[:self._count]
+
+    def getVX(self):
+        """Returns the horizontal velocities as a NumPy array view"""
+        return self._vx[:self._count]
+
+    def getVY(self):
+        """Returns the vertical velocities as a NumPy array view"""
+        return self._vy[:self._count]
+
+    def getRadius(self):
+        """Returns the radii as a NumPy array view"""
+        return self._radius[:self._count]
+
+    def getAlive(self):
+        """Returns the alive flags as a NumPy array view"""
+        return self._alive[:self._count]
+
+    def getAge(self):
+        """Returns the ages (in moves) as a NumPy array view"""
+        return self._age[:self._count]
+
+    def getBytes(self):
+        """Returns the number of bytes held by the arrays, counting every slot"""
+        return sum(column.nbytes for column in self._columns())
 
     def setVelocity(self,velocity):
-        """ 
-        Sets the velocity of an asteroid a given velocity.
+        """
+        Sets the velocity of every body to the given velocity.
 
         Parameter velocity: the velocity to set to.
         Precondition: velocity is a list of velocity x and y coordinates.
         """
-        v=Vector2(velocity[0],velocity[1])
-        self._velocity=v
-    
-    # INITIALIZER TO CREATE A NEW ASTEROID
-    def __init__(self,x,y,width,height,source,direction):
+        self._vx[:self._count]=velocity[0]
+        self._vy[:self._count]=velocity[1]
+
+    # INITIALIZER TO CREATE AN EMPTY STORE
+    def __init__(self,capacity=BODIES_CAPACITY):
         """
-        Creates a new asteroid.
-        
-        Has x, y coordinate, width, height, source, direction.
+        Creates an empty store.
 
-        Precondition: x, y are floats, width, height, source are taken from 
-        consts.py and direction is loaded from a json under key 
-        ['asteroids']['direction'].
-        """
-        super().__init__(x=x,y=y,width=width,height=height,source=source) 
-        self._deleted=False
-        self._direction=direction 
-        if direction.length()==0:
-            self._velocity=Vector2(0,0)
-        else:
-            if source==SMALL_IMAGE:
-                direction.normalize()
-                self._velocity=direction*SMALL_SPEED
-            if source==MEDIUM_IMAGE:
-                direction.normalize()
-                self._velocity=direction*MEDIUM_SPEED
-            if source==LARGE_IMAGE:
-                direction.normalize()
-                self._velocity=direction*LARGE_SPEED
+        Parameter capacity: the number of slots to start with
+        Precondition: capacity is an int > 0
+        """
+        self._x=np.zeros(capacity)
+        self._y=np.zeros(capacity)
+        self._vx=np.zeros(capacity)
+        self._vy=np.zeros(capacity)
+        self._radius=np.zeros(capacity)
+        self._alive=np.zeros(capacity,dtype=bool)
+        self._age=np.zeros(capacity,dtype=int)
+        self._count=0
 
-    # ADDITIONAL METHODS (MOVEMENT, COLLISIONS, ETC)
-    def wrapasteroid(self):
-        """ 
-        This method ''wraps'' the asteroid when it exits the window.
+    # ADDITIONAL METHODS
+    def add(self,x,y,vx,vy,radius):
         """
-        if self.x<-DEAD_ZONE:
-            self.x+=GAME_WIDTH+2*DEAD_ZONE
-        if self.x>GAME_WIDTH+DEAD_ZONE:
-            self.x-=GAME_WIDTH+2*DEAD_ZONE
-        if self.y<-DEAD_ZONE:
-            self.y+=GAME_HEIGHT+2*DEAD_ZONE
-        if self.y>GAME_HEIGHT+DEAD_ZONE:
-            self.y-=GAME_HEIGHT+2*DEAD_ZONE
+        Adds a live body at the end of the store and returns its slot.
+
+        Parameter x, y: the position of the body
+        Precondition: x and y are floats
+
+        Parameter vx, vy: the velocity of the body
+        Precondition: vx and vy are floats
 
-    def collideshp(self,position):
+        Parameter radius: the radius of the body
+        Precondition: radius is a float > 0
         """
-        This method returns True if the ship and asteroid collide,
-        False otherwise.
-        Parameter position: the position of the ship at the moment of collision.
-        Precondition: position is a list of x and y coordinates of the ship.
+        if self._count==len(self._x):
+            self._grow()
+        i=self._count
+        self._x[i]=x
+        self._y[i]=y
+        self._vx[i]=vx
+        self._vy[i]=vy
+        self._radius[i]=radius
+        self._alive[i]=True
+        self._age[i]=0
+        self._count+=1
+        return i
+
+    def extend(self,x,y,vx,vy,radius):
         """
-        x=position[0]
-        y=position[1]
-        distship=math.sqrt((self.x-x)**2+(self.y-y)**2)
-        if distship<SHIP_RADIUS+self.width/2:               
-            return True
-        else:
-            return False
-    
-    def collideblt(self,position):
-        """
-        This method returns True if the asteroid and a bullet collide, False
-        otherwise.
-        Parameter position: the position of the bullet at the moment of 
-        collision.
-        Precondition: position is a list of x and y coordinates of the bullet.
-        """
-        x=position[0]
-        y=position[1]
-        distbullet=math.sqrt((self.x-x)**2+(self.y-y)**2)
-        if distbullet<BULLET_RADIUS+self.width/2:     
-            return True
-        else:
-            return False
-
-    def breakupblt(self,velocity):
-        """
-        This method returns a list of new asteroids that are generated after a 
-        collision with a bullet.
-        Parameter velocity: the bullet's velocity at the moment of collision.
-        Precondition: velocity is a valid bullet velocity.
-        """
-        radii=[SMALL_RADIUS,MEDIUM_RADIUS,LARGE_RADIUS]
-        images=[SMALL_IMAGE,MEDIUM_IMAGE,LARGE_IMAGE]
-        speeds=[SMALL_SPEED,MEDIUM_SPEED,LARGE_SPEED]
-        cv=velocity.normalize()
-        if self.width/2!=radii[0]:
-            rad=radii[radii.index(self.width/2)-1]
-            img=images[radii.index(self.width/2)-1]
-            speed=speeds[radii.index(self.width/2)-1]
-            new1=Vector2(self.x,self.y)+cv*rad
-            cv2=cv.rotation(math.pi*2/3)
-            new2=Vector2(self.x,self.y)+cv2*rad
-            cv3=cv.rotation(-math.pi*2/3)
-            new3=Vector2(self.x,self.y)+cv3*rad
-            asteroids=[Asteroid(new1.x,new1.y,rad*2,rad*2,img,cv),
-                Asteroid(new2.x,new2.y,rad*2,rad*2,img,cv2),
-                Asteroid(new3.x,new3.y,rad*2,rad*2,img,cv3)]
-            for i in range(len(asteroids)):
-                asteroids[i]._velocity=speed*asteroids[i]._direction
-            return asteroids 
-        else:
-            return []
+        Adds live bodies at the end of the store, all in one step.
+
+        Parameter x, y: the positions of the bodies
+        Precondition: x and y are float NumPy arrays of the same length
+
+        Parameter vx, vy: the velocities of the bodies
+        Precondition: vx and vy are float NumPy arrays the same length as x
 
-    def breakupshp(self,velocity,facing):
+        Parameter radius: the radii of the bodies
+        Precondition: radius is a float NumPy array the same length as x
         """
-        This method returns a list of new asteroids that are generated after a 
-        collision with a ship.
+        n=len(x)
+        while self._count+n>len(self._x):
+            self._grow()
+        i=self._count
+        self._x[i:i+n]=x
+        self._y[i:i+n]=y
+        self._vx[i:i+n]=vx
+        self._vy[i:i+n]=vy
+        self._radius[i:i+n]=radius
+        self._alive[i:i+n]=True
+        self._age[i:i+n]=0
+        self._count+=n
 
-        Parameter velocity: the ship's velocity at the moment of collision.
-        Precondition: velocity is a valid ship velocity.
-        Parameter facing: the ship's facing at the moment of collision.
-        Precondition: facing is a valid ship facing.
+    def kill(self,i):
         """
-        radii=[SMALL_RADIUS,MEDIUM_RADIUS,LARGE_RADIUS]
-        images=[SMALL_IMAGE,MEDIUM_IMAGE,LARGE_IMAGE]
-        speeds=[SMALL_SPEED,MEDIUM_SPEED,LARGE_SPEED]
-        if velocity.length()!=0:
-            cv=velocity.normalize()
-        else:
-            cv=facing
-        if self.width/2!=radii[0]:
-            rad=radii[radii.index(self.width/2)-1]
-            img=images[radii.index(self.width/2)-1]
-            speed=speeds[radii.index(self.width/2)-1]
-            new1=Vector2(self.x,self.y)+cv*rad
-            cv2=cv.rotation(math.pi*2/3)
-            new2=Vector2(self.x,self.y)+cv2*rad
-            cv3=cv.rotation(-math.pi*2/3)
-            new3=Vector2(self.x,self.y)+cv3*rad
-            asteroids=[Asteroid(new1.x,new1.y,rad*2,rad*2,img,cv),
-                Asteroid(new2.x,new2.y,rad*2,rad*2,img,cv2),
-                Asteroid(new3.x,new3.y,rad*2,rad*2,img,cv3)]
-            for i in range(len(asteroids)):
-                    asteroids[i]._velocity=speed*asteroids[i]._direction
-            return asteroids 
+        Marks the body in slot i (or the bodies in slots i) as no longer in play.
+
+        Parameter i: the slot or slots to mark
+        Precondition: i is an int with 0 <= i < getCount(), or an int NumPy array
+        of such slots
+        """
+        self._alive[i]=False
+
+    def compact(self,keep):
+        """
+        Removes every body not marked in keep, in one pass.
+
+        The bodies that are kept move down to fill the gaps, in the same order as
+        before, so slot i of the store still matches element i of a list of views
+        filtered with the same flags.
+
+        Parameter keep: whether to keep the body in each slot
+        Precondition: keep is a bool NumPy array of length getCount()
+        """
+        n=self._count
+        keep=np.array(keep,dtype=bool)
+        m=int(np.count_nonzero(keep))
+        if m==n:
+            return
+        for column in self._columns():
+            column[:m]=column[:n][keep]
+        self._count=m
+
+    def move(self,wrap=True):
+        """
+        Adds the velocity to the position of every body.
+
+        If wrap is True, a body that has left the window and the DEAD_ZONE around 
+        it comes back in on the other side, as a ship does in Ship.wrapship.
+
+        Parameter wrap: whether to wrap the bodies around the window
+        Precondition: wrap is a bool
+        """
+        n=self._count
+        x=self._x[:n]
+        y=self._y[:n]
+        x+=self._vx[:n]
+        y+=self._vy[:n]
+        self._age[:n]+=1
+        if wrap:
+            x+=DEAD_ZONE
+            np.mod(x,WORLD_WIDTH,out=x)
+            x-=DEAD_ZONE
+            y+=DEAD_ZONE
+            np.mod(y,WORLD_HEIGHT,out=y)
+            y-=DEAD_ZONE
+
+    def pack(self,out):
+        """
+        Copies the bodies in the store into out, one column after another.
+
+        The columns are the positions x and y, the velocities vx and vy, the radii,
+        the alive flags and the ages, each getCount() long, so 7*getCount() values 
+        are written in all. Flags and ages are stored as floats, which hold them 
+        exactly.
+
+        Parameter out: the array to copy into
+        Precondition: out is a float NumPy array of length 7*getCount()
+        """
+        n=self._count
+        columns=self._columns()
+        for i in range(len(columns)):
+            out[i*n:(i+1)*n]=columns[i][:n]
+
+    def unpack(self,values):
+        """
+        Replaces the bodies in the store with those packed into values by pack.
+
+        Parameter values: the packed bodies
+        Precondition: values is a float NumPy array whose length is a multiple of 7,
+        as written by pack
+        """
+        columns=self._columns()
+        n=len(values)//len(columns)
+        while n>len(self._x):
+            self._grow()
+            columns=self._columns()
+        for i in range(len(columns)):
+            columns[i][:n]=values[i*n:(i+1)*n]
+        self._count=n
+
+    def _columns(self):
+        """
+        Returns the list of all the arrays in the store.
+        """
+        return [self._x,self._y,self._vx,self._vy,self._radius,self._alive,
+            self._age]
+
+    def _grow(self):
+        """
+        Doubles the number of slots in the store, keeping the bodies in it.
+        """
+        capacity=2*len(self._x)
+        (self._x,self._y,self._vx,self._vy,self._radius,self._alive,
+            self._age)=[np.resize(column,capacity) for column in self._columns()]
+
+
+class SpritePool(object):
+    """
+    A class to lend out reusable sprites for drawing.
+
+    Asteroids and bullets keep no sprite of their own. Each frame, Wave gives each
+    pool the positions of all the things it draws with that pool's texture, and 
+    the pool moves one sprite to each position and draws it. Drawing every sprite
+    of one texture together lets the renderer keep that texture bound. A new sprite
+    is only made when a frame needs more than any frame before it, so the pool 
+    never holds more sprites than were ever drawn at once.
+    """
+    __slots__=('_make','_sprites')
+    # Attribute _make: the function that makes a new sprite
+    # Invariant: _make is callable with no arguments and returns a GObject
+    #
+    # Attribute _sprites: the sprites made so far
+    # Invariant: _sprites is a list of GObject
+
+    # GETTERS
+    def getSize(self):
+        """Returns the number of sprites made so far"""
+        return len(self._sprites)
+
+    def getBytes(self):
+        """Returns an estimate of the bytes held by the sprites (see objectsize)"""
+        return sum(objectsize(sprite) for sprite in self._sprites)
+
+    # INITIALIZER TO CREATE AN EMPTY POOL
+    def __init__(self,make):
+        """
+        Creates an empty pool.
+
+        Parameter make: the function that makes a new sprite
+        Precondition: make is callable with no arguments and returns a GObject
+        """
+        self._make=make
+        self._sprites=[]
+
+    # ADDITIONAL METHODS
+    def draw(self,view,x,y,angle=None):
+        """
+        Draws one sprite at each of the given positions, making sprites as needed.
+
+        Each sprite is left where it is drawn, as the view renders it only after 
+        this returns.
+
+        Parameter view: the view to draw to
+        Precondition: view is a GView
+
+        Parameter x, y: the positions to draw at
+        Precondition: x and y are lists of floats of the same length
+
+        Parameter angle: the angle of each sprite (in degrees), or None to leave 
+        the angles as they are
+        Precondition: angle is None or a list of floats the same length as x
+        """
+        while len(self._sprites)<len(x):
+            self._sprites.append(self._make())
+        if angle is not None:
+            for sprite,turn in zip(self._sprites,angle):
+                sprite.angle=turn
+        for sprite,xs,ys in zip(self._sprites,x,y):
+            sprite.x=xs
+            sprite.y=ys
+            sprite.draw(view)
+
+
+# The sprite pools shared by every wave, by image file name (or 'bullet')
+SPRITES = {}
+# The Kivy cache categories that hold the images and textures loaded from files
+TEXTURE_CACHES = ['kv.image','kv.texture']
+
+
+def loadtextures(images=TEXTURE_IMAGES):
+    """
+    Loads the texture of each image once and keeps it for the rest of the run.
+
+    Kivy keeps the images and textures it loads in a cache, by file name, and every
+    image made from a file looks there before reading the file. But an entry is 
+    normally dropped after a minute without use, and the next sprite made from 
+    that file (say, when a SpritePool grows) reads it from disk again. This makes 
+    the entries in TEXTURE_CACHES never expire and then loads each image into the
+    cache, so every sprite made during play finds its texture in memory. When
+    running headless there are no textures, and this does nothing.
+
+    Parameter images: the image files to load
+    Precondition: images is a list of image file names in the Images directory
+    """
+    if HEADLESS:
+        return
+    from kivy.cache import Cache
+    from kivy.core.image import Image
+    from kivy.resources import resource_find
+    for category in TEXTURE_CACHES:
+        Cache.register(category,limit=None,timeout=None)
+    for name in images:
+        Image(resource_find(name) or name)
+
+
+def spritepool(name):
+    """
+    Returns the shared sprite pool for the given asteroid image, the ship image,
+    or bullets.
+
+    The pools are made once and shared by every wave in the process, so a new wave
+    or a new fragment only makes a sprite when more are on screen at once than 
+    ever before.
+
+    Parameter name: the asteroid image, the ship image, or 'bullet'
+    Precondition: name is in SIZE_IMAGES, is SHIP_IMAGE or is 'bullet'
+    """
+    if name not in SPRITES:
+        if name=='bullet':
+            make=functools.partial(Bullet,0,0)
+        elif name==SHIP_IMAGE:
+            make=functools.partial(GImage,x=0,y=0,width=2*SHIP_RADIUS,
+                height=2*SHIP_RADIUS,source=SHIP_IMAGE)
         else:
-            return []
-       
+            width=2*float(SIZE_RADII[SIZE_IMAGES.index(name)])
+            make=functools.partial(Asteroid,0,0,width,width,name)
+        SPRITES[name]=SpritePool(make)
+    return SPRITES[name]
 
-# IF YOU NEED ADDITIONAL MODEL CLASSES, THEY GO HERE
 
+# The column and row offsets of a grid cell and its eight neighbours
+GRID_NEIGHBOURS = (np.array([-1,-1,-1,0,0,0,1,1,1]),np.array([-1,0,1,-1,0,1,-1,0,1]))
+# The column and row offsets of a grid cell and four of its neighbours, chosen so 
+# that of any two neighbouring cells, exactly one has the other among these
+GRID_FORWARD = (np.array([0,1,-1,0,1]),np.array([0,0,1,1,1]))
 
-        
 
-        
-    
-        
+class Grid(object):
+    """
+    A class to find the bodies that may touch, using a uniform grid.
 
+    The wrapped world (the window and its DEAD_ZONE) is cut into cells that are at 
+    least GRID_CELL wide and high. After build() sorts a set of bodies into the 
+    cells, candidates() returns, for each query point, only the bodies in its own 
+    cell and the eight cells around it. As the world wraps, cells on one edge are 
+    neighbours of the cells on the opposite edge. The cost of both steps grows 
+    linearly with the number of bodies and queries, rather than with their product.
 
+    The candidates still have to be tested with an exact distance, such as the one
+    from wrapdistance2().
+    """
+    __slots__=('_cols','_rows','_cellwidth','_cellheight','_celltype','_order',
+        '_starts')
+    # Attribute _cols: the number of columns of cells
+    # Invariant: _cols is an int >= 3
+    #
+    # Attribute _rows: the number of rows of cells
+    # Invariant: _rows is an int >= 3
+    #
+    # Attribute _cellwidth: the width of a cell
+    # Invariant: _cellwidth is a float >= GRID_CELL
+    #
+    # Attribute _cellheight: the height of a cell
+    # Invariant: _cellheight is a float >= GRID_CELL
+    #
+    # Attribute _celltype: the integer type the cell numbers are sorted as, the 
+    #     smallest that holds every cell number (a 16-bit sort is a fast radix sort)
+    # Invariant: _celltype is np.int16 or np.intp
+    #
+    # Attribute _order: the indices of the bodies, sorted by cell
+    # Invariant: _order is an int NumPy array
+    #
+    # Attribute _starts: where each cell begins in _order (the last entry is the end)
+    # Invariant: _starts is an int NumPy array of length _cols*_rows+1
+
+    # INITIALIZER TO CREATE AN EMPTY GRID
+    def __init__(self,cellsize=GRID_CELL):
+        """
+        Creates an empty grid over the wrapped world.
 
+        Parameter cellsize: the smallest width and height of a cell
+        Precondition: cellsize is a number > 0 and at most a third of WORLD_HEIGHT
+        """
+        self._cols=int(WORLD_WIDTH//cellsize)
+        self._rows=int(WORLD_HEIGHT//cellsize)
+        self._cellwidth=WORLD_WIDTH/self._cols
+        self._cellheight=WORLD_HEIGHT/self._rows
+        self._celltype=(np.int16 if self._cols*self._rows<=np.iinfo(np.int16).max
+            else np.intp)
+        self._order=np.zeros(0,dtype=np.intp)
+        self._starts=np.zeros(self._cols*self._rows+1,dtype=np.intp)
 
+    # ADDITIONAL METHODS
+    def build(self,x,y):
+        """
+        Sorts the bodies at the given positions into the cells of the grid.
 
+        Parameter x, y: the positions of the bodies
+        Precondition: x and y are float NumPy arrays of the same length
+        """
+        col,row=self._colrow(x,y)
+        cells=row*self._cols+col
+        self._order=np.argsort(cells.astype(self._celltype),kind='stable')
+        counts=np.bincount(cells,minlength=self._cols*self._rows)
+        self._starts[1:]=np.cumsum(counts)
 
+    def candidates(self,x,y):
+        """
+        Returns the pairs of query points and bodies that are in neighbouring cells.
 
+        The value returned is a tuple (q, b) of int NumPy arrays of the same length,
+        where query point q[j] may touch body b[j]. The pairs are sorted by q.
 
-        
+        Parameter x, y: the positions of the query points
+        Precondition: x and y are float NumPy arrays of the same length
+        """
+        col,row=self._colrow(x,y)
+        cells=self._neighbours(col,row,GRID_NEIGHBOURS)
+        starts=self._starts[cells]
+        q,b=self._gather(starts,self._starts[cells+1]-starts)
+        return (q//9,b)
+
+    def pairs(self,x,y,limit,turn=0):
+        """
+        Returns the pairs of bodies in the grid that are in the same or neighbouring
+        cells, each pair once.
+
+        The value returned is a tuple (i, j) of int NumPy arrays of the same length,
+        where body i[k] may touch body j[k] and i[k] != j[k]. The bodies must be 
+        those the grid was built from.
+
+        Each body is paired with the bodies after it in its own cell and with all 
+        the bodies in four of its neighbouring cells (see GRID_FORWARD). The pairs 
+        are counted from the cell sizes before any is made. If there are more than
+        limit, only every s-th body (for the smallest s that gives at most about 
+        limit pairs) makes its pairs, starting with body turn % s, so calling this
+        with turn = 0, 1, 2, ... covers every pair once every s calls. The time 
+        taken therefore grows with the number of bodies plus at most limit pairs.
+
+        Parameter x, y: the positions of the bodies
+        Precondition: x and y are float NumPy arrays of the same length, as given
+        to build
+
+        Parameter limit: about the most pairs to return
+        Precondition: limit is an int > 0
+
+        Parameter turn: which share of the bodies makes its pairs, if limited
+        Precondition: turn is an int >= 0
+        """
+        col,row=self._colrow(x,y)
+        cells=self._neighbours(col,row,GRID_FORWARD)
+        starts=self._starts[cells]
+        counts=self._starts[cells+1]-starts
+        total=int(counts.sum())
+        query=np.arange(len(x))
+        if total>limit:
+            share=-(-total//limit)
+            query=query[turn % share::share]
+            rows=np.arange(len(cells)).reshape(len(x),5)[query].ravel()
+            starts=starts[rows]
+            counts=counts[rows]
+        q,j=self._gather(starts,counts)
+        slot=q%5
+        i=query[q//5]
+        keep=(slot!=0) | (j>i)
+        return (i[keep],j[keep])
+
+    def _neighbours(self,col,row,offsets):
+        """
+        Returns the cells at the given offsets from each cell, one row per cell.
+
+        The cells are flattened into a single int NumPy array, len(offsets[0]) 
+        cells for each given cell in turn.
+
+        Parameter col, row: the column and row of each cell
+        Precondition: col and row are int NumPy arrays of the same length
+
+        Parameter offsets: the column and row offsets
+        Precondition: offsets is a tuple of two int NumPy arrays of the same length
+        """
+        col=(col[:,np.newaxis]+offsets[0])%self._cols
+        row=(row[:,np.newaxis]+offsets[1])%self._rows
+        return (row*self._cols+col).ravel()
 
+    def _gather(self,starts,counts):
+        """
+        Returns a tuple (q, b) listing the bodies in each of a list of cells.
+
+        Here b[k] is a body in cell q[k], where the cells are numbered by their 
+        place in the list; q is sorted.
+
+        Parameter starts: where each cell begins in the sorted order of the bodies
+        Precondition: starts is an int NumPy array
+
+        Parameter counts: the number of bodies in each cell
+        Precondition: counts is an int NumPy array the same length as starts
+        """
+        ends=np.cumsum(counts)
+        total=int(ends[-1]) if len(ends)!=0 else 0
+        offsets=np.arange(total)-np.repeat(ends-counts,counts)
+        q=np.repeat(np.arange(len(counts)),counts)
+        b=self._order[np.repeat(starts,counts)+offsets]
+        return (q,b)
+
+    def _colrow(self,x,y):
+        """
+        Returns a tuple (col, row) of the cell column and row of each position.
+
+        Parameter x, y: the positions to look up
+        Precondition: x and y are float NumPy arrays of the same length
+        """
+        col=((x+DEAD_ZONE)//self._cellwidth).astype(np.intp)%self._cols
+        row=((y+DEAD_ZONE)//self._cellheight).astype(np.intp)%self._rows
+        return (col,row)
+
+
+def objectsize(obj):
+    """
+    Returns an estimate of the number of bytes used by obj.
+
+    This is the size of the object, of its attribute dictionary (if it has one) and
+    of each attribute value, but not of anything those values refer to. It is an
+    estimate for comparing entities, not an exact count.
+
+    Parameter obj: the object to measure
+    Precondition: obj is any object
+    """
+    size=sys.getsizeof(obj)
+    attributes=getattr(obj,'__dict__',None)
+    if attributes is not None:
+        size+=sys.getsizeof(attributes)
+        for value in attributes.values():
+            size+=sys.getsizeof(value)
+    return size
+
+
+def wrapoffset(dx,dy):
+    """
+    Returns the offset (dx,dy) between two points, measured across the wrapped
+    world.
+
+    Going off one edge of the world (the window and its DEAD_ZONE) comes back in on
+    the opposite edge, so the offset returned is the shortest of the wrapped ones.
+
+    Parameter dx, dy: the offset between the points, without wrapping
+    Precondition: both are floats or float NumPy arrays of matching shapes
+    """
+    return (dx-WORLD_WIDTH*np.round(dx/WORLD_WIDTH),
+        dy-WORLD_HEIGHT*np.round(dy/WORLD_HEIGHT))
+
+
+def wrapdistance2(x1,y1,x2,y2):
+    """
+    Returns the squared distance between points, measured across the wrapped world
+    (see wrapoffset).
+
+    Parameter x1, y1, x2, y2: the coordinates of the points
+    Precondition: all are floats or float NumPy arrays of matching shapes
+    """
+    dx,dy=wrapoffset(x1-x2,y1-y2)
+    return dx*dx+dy*dy
+
+
+def impacttime(x1,y1,vx1,vy1,x2,y2,vx2,vy2,reach):
+    """
+    Returns when in the last tick each pair of moving circles first touched.
+
+    The positions are those at the end of the tick, and each body is taken to have
+    moved in a straight line at its velocity during the tick. The result is the 
+    fraction of the tick (from 0 to 1) at which the two centers first came within
+    reach of each other, or infinity if they did not touch during the tick. A pair 
+    already touching at the start of the tick gives 0. As in wrapdistance2, the 
+    positions are compared across the wrapped world.
+
+    This sweeps the whole path of each body, so a fast body cannot pass through a
+    small one between the ends of a tick.
+
+    Parameter x1, y1, x2, y2: the coordinates of the bodies at the end of the tick
+    Precondition: all are floats or float NumPy arrays of matching shapes
+
+    Parameter vx1, vy1, vx2, vy2: the velocities of the bodies (per tick)
+    Precondition: all are floats or float NumPy arrays of matching shapes
+
+    Parameter reach: the distance between centers at which they touch
+    Precondition: reach is a float or float NumPy array of matching shape
+    """
+    dx,dy=wrapoffset(x1-x2,y1-y2)
+    dvx=vx1-vx2
+    dvy=vy1-vy2
+    dx-=dvx
+    dy-=dvy
+    a=dvx*dvx+dvy*dvy
+    b=dx*dvx+dy*dvy
+    c=dx*dx+dy*dy-reach*reach
+    disc=b*b-a*c
+    with np.errstate(divide='ignore',invalid='ignore'):
+        t=(-b-np.sqrt(disc))/a
+    t=np.where((a>0) & (disc>=0) & (t>=0) & (t<=1),t,np.inf)
+    return np.where(c<=0,0.0,t)
+
+
+def inworld(x,y):
+    """
+    Returns whether each point is inside the wrapped world.
+
+    The wrapped world is the window and the DEAD_ZONE around it.
+
+    Parameter x, y: the coordinates of the points
+    Precondition: x and y are float NumPy arrays of the same length
+    """
+    return ((-DEAD_ZONE<=x) & (x<GAME_WIDTH+DEAD_ZONE) & 
+        (-DEAD_ZONE<=y) & (y<GAME_HEIGHT+DEAD_ZONE))
+
+
+# The asteroid size names, from the smallest size class (0) to the largest
+SIZE_NAMES = [SMALL_ASTEROID,MEDIUM_ASTEROID,LARGE_ASTEROID]
+# The image of each size class
+SIZE_IMAGES = [SMALL_IMAGE,MEDIUM_IMAGE,LARGE_IMAGE]
+# The radius of each size class
+SIZE_RADII = np.array([SMALL_RADIUS,MEDIUM_RADIUS,LARGE_RADIUS],dtype=float)
+# The speed of each size class
+SIZE_SPEEDS = np.array([SMALL_SPEED,MEDIUM_SPEED,LARGE_SPEED],dtype=float)
+# The cosine and sine of the turn from the first fragment to each of the three
+FRAGMENT_TURNS = np.array([[1.0,0.0],[math.cos(math.pi*2/3),math.sin(math.pi*2/3)],
+    [math.cos(-math.pi*2/3),math.sin(-math.pi*2/3)]])
+
+
+def sizeclass(radius):
+    """
+    Returns the size class of each radius (see SIZE_RADII).
+
+    Parameter radius: the radii to look up
+    Precondition: radius is a float NumPy array of values in SIZE_RADII
+    """
+    return np.searchsorted(SIZE_RADII,radius)
+
+
+def fragments(kind,x,y,dx,dy):
+    """
+    Returns the fragments of broken asteroids as a tuple (kind, x, y, vx, vy).
+
+    An asteroid of size class k > 0 breaks into three of class k-1, which move away
+    from its center along (dx, dy) and along it turned by plus and minus 120 
+    degrees. An asteroid of class 0 has no fragments. The arrays returned hold the 
+    fragments of the first asteroid, then those of the second, and so on.
+
+    Parameter kind: the size class of each broken asteroid
+    Precondition: kind is an int NumPy array
+
+    Parameter x, y: the center of each broken asteroid
+    Precondition: x and y are float NumPy arrays the same length as kind
+
+    Parameter dx, dy: the direction of the first fragment of each asteroid
+    Precondition: dx and dy are float NumPy arrays the same length as kind, and 
+    each (dx, dy) is a unit vector
+    """
+    split=kind>0
+    child=np.repeat(kind[split]-1,3)
+    dx=dx[split,np.newaxis]
+    dy=dy[split,np.newaxis]
+    fx=(dx*FRAGMENT_TURNS[:,0]-dy*FRAGMENT_TURNS[:,1]).ravel()
+    fy=(dx*FRAGMENT_TURNS[:,1]+dy*FRAGMENT_TURNS[:,0]).ravel()
+    radius=SIZE_RADII[child]
+    speed=SIZE_SPEEDS[child]
+    return (child,np.repeat(x[split],3)+fx*radius,np.repeat(y[split],3)+fy*radius,
+        fx*speed,fy*speed)
+
+
+def visible(x,y,radius):
+    """
+    Returns a bool NumPy array of whether each circle overlaps the window.
+
+    Parameter x, y: the centers of the circles
+    Precondition: x and y are float NumPy arrays of the same length
+
+    Parameter radius: the radius of each circle
+    Precondition: radius is a float or a float NumPy array the same length as x
+    """
+    return ((x+radius>0) & (x-radius<GAME_WIDTH) & (y+radius>0) &
+        (y-radius<GAME_HEIGHT))
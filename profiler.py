@@ -0,0 +1,281 @@
+"""
+Frame profiler for Planetoids
+
+This module times each phase of a frame and counts what happened in it, so that a
+dropped frame in the field can be explained afterwards. The phases are the calls
+listed in PROFILE_PHASES: Wave.update and the steps of each tick, Ship.turnship,
+Wave.draw and Planetoids.draw. For each frame it also records the asteroids and
+bullets in play, the collision pairs tested, the asteroid fragments added, and the
+change in the number of memory blocks Python has allocated.
+
+Profiling is off unless PROFILE_FILE is set, with --profile FILE on the command line
+or the PLANETOIDS_PROFILE environment variable. When it is off nothing is changed,
+so it costs nothing. When it is on, attach() replaces the phase methods of one wave
+(and its ship) with timed versions, in the same way as PhaseTimer in the benchmarks.
+
+Only the last PROFILE_FRAMES frames and PROFILE_EVENTS timed calls are kept, in
+NumPy ring buffers. The profile is saved as a Chrome trace (a .json file, to open
+in chrome://tracing or Perfetto) or as a text summary with the p50 and p99 times.
+"""
+from consts import *
+from frames import FrameRecorder
+import json
+import numpy as np
+import sys
+import time
+
+# The phases that are timed: the name in the profile and the method timed
+PROFILE_PHASES = [('update','Wave.update'),('turnship','Ship.turnship'),
+    ('moveship','Wave.moveship'),('asteroidwrapandvel','Wave.asteroidwrapandvel'),
+    ('bounce','Wave.bounce'),('fire','Wave.fire'),('deletebullet','Wave.deletebullet'),
+    ('detect','Wave.detect'),('cleanup','Wave.cleanup'),('wave.draw','Wave.draw'),
+    ('app.draw','Planetoids.draw')]
+# The values counted in each frame
+PROFILE_COUNTERS = ['asteroids','bullets','pairs','fragments','blocks']
+
+
+class Profiler(FrameRecorder):
+    """
+    A class to time and count the work done in each frame.
+
+    Frames start and are kept as in FrameRecorder, PROFILE_FRAMES at a time.
+    """
+    # Attribute _framestart: when each kept frame started (perf_counter seconds)
+    # Invariant: _framestart is a float NumPy array of length PROFILE_FRAMES
+    #
+    # Attribute _frametime: how long each kept frame lasted (in seconds)
+    # Invariant: _frametime is a float NumPy array of length PROFILE_FRAMES
+    #
+    # Attribute _phasetime: the time spent in each phase in each kept frame
+    # Invariant: _phasetime is a float NumPy array of shape (PROFILE_FRAMES,
+    #            len(PROFILE_PHASES))
+    #
+    # Attribute _counts: the counters of each kept frame
+    # Invariant: _counts is an int NumPy array of shape (PROFILE_FRAMES,
+    #            len(PROFILE_COUNTERS))
+    #
+    # Attribute _events: the number of timed calls so far
+    # Invariant: _events is an int >= 0
+    #
+    # Attribute _eventphase: the phase of each kept call
+    # Invariant: _eventphase is an int NumPy array of length PROFILE_EVENTS
+    #
+    # Attribute _eventstart: when each kept call started (perf_counter seconds)
+    # Invariant: _eventstart is a float NumPy array of length PROFILE_EVENTS
+    #
+    # Attribute _eventtime: how long each kept call lasted (in seconds)
+    # Invariant: _eventtime is a float NumPy array of length PROFILE_EVENTS
+    #
+    # Attribute _start: when the current frame started, or None before the first
+    # Invariant: _start is a float or None
+    #
+    # Attribute _last: the wave pair count, fragment count and allocated blocks
+    #     when the current frame started
+    # Invariant: _last is a list of three ints
+
+    # INITIALIZER
+    def __init__(self):
+        """
+        Creates a profiler with empty ring buffers.
+        """
+        super().__init__(PROFILE_FRAMES)
+        self._framestart=np.zeros(PROFILE_FRAMES)
+        self._frametime=np.zeros(PROFILE_FRAMES)
+        self._phasetime=np.zeros((PROFILE_FRAMES,len(PROFILE_PHASES)))
+        self._counts=np.zeros((PROFILE_FRAMES,len(PROFILE_COUNTERS)),dtype=np.int64)
+        self._events=0
+        self._eventphase=np.zeros(PROFILE_EVENTS,dtype=np.int16)
+        self._eventstart=np.zeros(PROFILE_EVENTS)
+        self._eventtime=np.zeros(PROFILE_EVENTS)
+        self._start=None
+        self._last=[0,0,0]
+
+    # ATTACHING
+    def attach(self,wave):
+        """
+        Replaces the phase methods of the wave (and of each of its ships) with
+        timed versions, and counts the wave's entities from now on.
+
+        Parameter wave: the wave to profile
+        Precondition: wave is a Wave object
+        """
+        self._last[0]=wave.getPairCount()
+        self._last[1]=wave.getFragmentCount()
+        wave.update=self._timed('update',wave.update)
+        super().attach(wave)
+        for name in ['moveship','asteroidwrapandvel','bounce','fire','deletebullet',
+            'detect','cleanup']:
+            setattr(wave,name,self._timed(name,getattr(wave,name)))
+        wave.draw=self._timed('wave.draw',wave.draw)
+        newship=wave.newship
+        def timedship():
+            newship()
+            self._attachship(wave)
+        wave.newship=timedship
+        self._attachship(wave)
+
+    def attachapp(self,app):
+        """
+        Times Planetoids.draw and starts a new frame with every Planetoids.update.
+
+        Each wave the application plays must still be given to attach.
+
+        Parameter app: the application to profile
+        Precondition: app is a Planetoids object
+        """
+        super().attachapp(app)
+        app.draw=self._timed('app.draw',app.draw)
+
+    # EXPORTING
+    def summary(self):
+        """
+        Returns a text summary of the kept frames.
+
+        It gives the number of frames, the mean, p50, p99 and largest frame times,
+        and then the same for the time spent in each phase and for each counter.
+        """
+        rows=self._rows()
+        lines=['%d frames profiled, %d kept' % (self._frames,len(rows))]
+        if len(rows)==0:
+            return lines[0]
+        lines.append('%-20s %10s %10s %10s %10s' % ('','mean','p50','p99','max'))
+        def line(name,values,scale,unit):
+            values=values*scale
+            lines.append('%-20s %10.3f %10.3f %10.3f %10.3f  %s' % (name,
+                values.mean(),np.percentile(values,50),np.percentile(values,99),
+                values.max(),unit))
+        line('frame',self._frametime[rows],1000,'ms')
+        for i in range(len(PROFILE_PHASES)):
+            line(PROFILE_PHASES[i][0],self._phasetime[rows,i],1000,'ms')
+        for i in range(len(PROFILE_COUNTERS)):
+            line(PROFILE_COUNTERS[i],self._counts[rows,i],1,'per frame')
+        return '\n'.join(lines)
+
+    def trace(self):
+        """
+        Returns the kept frames and calls as a Chrome trace dictionary.
+
+        Each timed call is a complete ('X') event, each frame is an event on a
+        second track, and the counters are counter ('C') events at the start of
+        each frame. Times are in microseconds.
+        """
+        events=[]
+        origin=self._origin()
+        for i in self._eventrows():
+            events.append({'name':PROFILE_PHASES[self._eventphase[i]][0],
+                'cat':'phase','ph':'X','pid':0,'tid':0,
+                'ts':(self._eventstart[i]-origin)*1e6,'dur':self._eventtime[i]*1e6})
+        for row in self._rows():
+            ts=(self._framestart[row]-origin)*1e6
+            events.append({'name':'frame','cat':'frame','ph':'X','pid':0,'tid':1,
+                'ts':ts,'dur':self._frametime[row]*1e6})
+            counts=self._counts[row]
+            events.append({'name':'entities','ph':'C','pid':0,'ts':ts,
+                'args':{'asteroids':int(counts[0]),'bullets':int(counts[1])}})
+            events.append({'name':'work','ph':'C','pid':0,'ts':ts,
+                'args':{'pairs':int(counts[2]),'fragments':int(counts[3]),
+                'blocks':int(counts[4])}})
+        return {'traceEvents':events,'displayTimeUnit':'ms'}
+
+    def save(self,filename):
+        """
+        Saves the profile: a Chrome trace if filename ends in .json, and otherwise
+        the text summary.
+
+        Parameter filename: the file to write
+        Precondition: filename is a string
+        """
+        with open(filename,'w') as file:
+            if filename.lower().endswith('.json'):
+                json.dump(self.trace(),file)
+            else:
+                file.write(self.summary()+'\n')
+
+    # HELPER METHODS
+    def _endframe(self,row):
+        """
+        Records the time and counters of the frame that has just finished.
+
+        Parameter row: the row of the frame in the ring buffers
+        Precondition: row is an int in 0..PROFILE_FRAMES-1
+        """
+        self._framestart[row]=self._start
+        self._frametime[row]=time.perf_counter()-self._start
+        counts=self._counts[row]
+        if self._wave is not None:
+            pairs=self._wave.getPairCount()
+            fragments=self._wave.getFragmentCount()
+            counts[0]=self._wave.getAsteroidCount()
+            counts[1]=self._wave.getBulletCount()
+            counts[2]=pairs-self._last[0]
+            counts[3]=fragments-self._last[1]
+            self._last[0]=pairs
+            self._last[1]=fragments
+        counts[4]=sys.getallocatedblocks()-self._last[2]
+
+    def _startframe(self,row):
+        """
+        Notes when the new frame started and clears its phase times.
+
+        Parameter row: the row of the frame in the ring buffers
+        Precondition: row is an int in 0..PROFILE_FRAMES-1
+        """
+        self._start=time.perf_counter()
+        self._last[2]=sys.getallocatedblocks()
+        self._phasetime[row]=0
+
+    def _timed(self,phase,method):
+        """
+        Returns a version of method that records each call in the ring buffers.
+
+        Parameter phase: the phase name
+        Precondition: phase is a name in PROFILE_PHASES
+
+        Parameter method: the bound method to time
+        Precondition: method is callable
+        """
+        index=[name for name,label in PROFILE_PHASES].index(phase)
+        clock=time.perf_counter
+        def timed(*args):
+            start=clock()
+            try:
+                return method(*args)
+            finally:
+                elapsed=clock()-start
+                event=self._events % PROFILE_EVENTS
+                self._eventphase[event]=index
+                self._eventstart[event]=start
+                self._eventtime[event]=elapsed
+                self._events+=1
+                self._phasetime[self._frames % PROFILE_FRAMES,index]+=elapsed
+        return timed
+
+    def _attachship(self,wave):
+        """
+        Times Ship.turnship on the wave's current ship, if it has one and it is not
+        timed already (a wave reuses its ship for every life).
+
+        Parameter wave: the wave whose ship to time
+        Precondition: wave is a Wave object
+        """
+        ship=wave.getShip()
+        if ship is not None and 'turnship' not in vars(ship):
+            ship.turnship=self._timed('turnship',ship.turnship)
+
+    def _eventrows(self):
+        """
+        Returns the rows of the kept calls, oldest first.
+        """
+        count=min(self._events,PROFILE_EVENTS)
+        return (np.arange(self._events-count,self._events) % PROFILE_EVENTS).tolist()
+
+    def _origin(self):
+        """
+        Returns the earliest time in the kept data, which is time zero in the trace.
+        """
+        times=[]
+        if self._frames!=0:
+            times.append(self._framestart[self._rows()].min())
+        if self._events!=0:
+            times.append(self._eventstart[self._eventrows()].min())
+        return min(times) if times!=[] else 0.0
@@ -0,0 +1,245 @@
+"""
+Input recording and replay for Planetoids
+
+A wave is deterministic: given the same wave JSON, the same keys held down in each
+tick, and the same calls to newship, setLives and setAsteroidsvelocity between ticks,
+it always ends in exactly the same state. This module records those inputs while a
+wave is played, saves them to a compact binary log, and replays a log headlessly to
+reproduce the final state.
+
+A log file holds, in order:
+
+    a header (see LOG_HEADER): the magic bytes, the format version, the number of
+        ticks, the number of runs, the sizes of the two blocks that follow, and the
+        SHA-256 digest of the final state (see Wave.getDigest)
+    the wave JSON, compressed with zlib
+    the control calls as a JSON list of [tick, name, arguments], compressed with zlib
+    the runs of key states, each a key mask (one bit per key in REPLAY_KEYS) and the
+        number of ticks it was held for (see LOG_RUN)
+
+Record a game with "python planetoids --record session.rec", or a headless run with
+"python -m planetoids --headless wave1.json --record session.rec". Replay it with
+"python -m planetoids --headless --replay session.rec".
+"""
+from consts import *
+from wave import *
+import json
+import struct
+import zlib
+
+# The magic bytes that start a log file
+LOG_MAGIC = b'PLRP'
+# The version of the log format
+LOG_VERSION = 1
+# The log header: magic, version, ticks, runs, wave size, call size, digest
+LOG_HEADER = struct.Struct('<4sB3xIIII32s')
+# One run of key states: the key mask and the number of ticks it lasted
+LOG_RUN = struct.Struct('<BH')
+# The longest run that fits in LOG_RUN
+LOG_MAX_RUN = 65535
+
+
+class InputRecorder(object):
+    """
+    A class to record the inputs of a wave, tick by tick.
+
+    Give it to Wave.setRecorder and the wave calls capture at the start of every
+    tick and event whenever newship, setLives or setAsteroidsvelocity is called.
+    Key states are stored as runs, so a long stretch of holding the same keys takes
+    only a few bytes.
+    """
+    # Attribute _data: the wave JSON the recorded wave was made from
+    # Invariant: _data is a wave dictionary
+    #
+    # Attribute _runs: the runs of key states, each a list [mask, ticks]
+    # Invariant: _runs is a list of lists of two ints; ticks <= LOG_MAX_RUN
+    #
+    # Attribute _ticks: the number of ticks recorded
+    # Invariant: _ticks is an int >= 0
+    #
+    # Attribute _calls: the control calls, each a list [tick, name, arguments]
+    # Invariant: _calls is a list of lists
+
+    def getTicks(self):
+        """
+        Returns the number of ticks recorded.
+        """
+        return self._ticks
+
+    def __init__(self,data):
+        """
+        Creates an empty recorder for a wave made from the given data.
+
+        Parameter data: the wave JSON the wave was made from
+        Precondition: data is a wave dictionary
+        """
+        self._data=data
+        self._runs=[]
+        self._ticks=0
+        self._calls=[]
+
+    def capture(self,input):
+        """
+        Records the keys held down in the input for one tick.
+
+        Parameter input: the input the tick is about to read
+        Precondition: input is an instance of GInput or a stand-in for it
+        """
+        mask=0
+        for bit in range(len(REPLAY_KEYS)):
+            if input.is_key_down(REPLAY_KEYS[bit]):
+                mask|=1<<bit
+        if self._runs!=[] and self._runs[-1][0]==mask and (
+            self._runs[-1][1]<LOG_MAX_RUN):
+            self._runs[-1][1]+=1
+        else:
+            self._runs.append([mask,1])
+        self._ticks+=1
+
+    def event(self,tick,name,*arguments):
+        """
+        Records a control call made after the given number of ticks.
+
+        Parameter tick: the number of ticks run before the call
+        Precondition: tick is an int >= 0
+
+        Parameter name: the name of the Wave method called
+        Precondition: name is 'newship', 'setLives' or 'setAsteroidsvelocity'
+
+        Parameter arguments: the arguments of the call
+        Precondition: arguments can be written as JSON
+        """
+        self._calls.append([tick,name,list(arguments)])
+
+    def save(self,filename,digest):
+        """
+        Writes the recording to a log file.
+
+        Parameter filename: the file to write
+        Precondition: filename is a string
+
+        Parameter digest: the digest of the wave state at the end of the recording
+        Precondition: digest is a hex string from Wave.getDigest
+        """
+        wave=zlib.compress(json.dumps(self._data,separators=(',',':')).encode())
+        calls=zlib.compress(json.dumps(self._calls,separators=(',',':')).encode())
+        with open(filename,'wb') as file:
+            file.write(LOG_HEADER.pack(LOG_MAGIC,LOG_VERSION,self._ticks,
+                len(self._runs),len(wave),len(calls),bytes.fromhex(digest)))
+            file.write(wave)
+            file.write(calls)
+            for mask,ticks in self._runs:
+                file.write(LOG_RUN.pack(mask,ticks))
+
+
+class ReplayInput(object):
+    """
+    A stand-in for GInput that plays back the key states of a log, tick by tick.
+
+    The replay must call advance() once after every tick.
+    """
+    # Attribute _masks: the key mask of every tick
+    # Invariant: _masks is a bytes object
+    #
+    # Attribute _tick: the tick being played
+    # Invariant: _tick is an int >= 0
+    #
+    # Attribute _mask: the key mask of the tick being played (0 past the end)
+    # Invariant: _mask is an int >= 0
+
+    @property
+    def key_count(self):
+        """
+        The number of keys currently held down.
+        """
+        return bin(self._mask).count('1')
+
+    def __init__(self,masks):
+        """
+        Creates a replay input starting at the first tick.
+
+        Parameter masks: the key mask of every tick
+        Precondition: masks is a bytes object
+        """
+        self._masks=masks
+        self._tick=0
+        self._mask=masks[0] if len(masks)!=0 else 0
+
+    def is_key_down(self,key):
+        """
+        Returns True if the key was held down in the current tick.
+
+        Parameter key: the key to test
+        Precondition: key is a string
+        """
+        return key in REPLAY_KEYS and (self._mask>>REPLAY_KEYS.index(key))&1==1
+
+    def advance(self):
+        """
+        Moves on to the next tick.
+        """
+        self._tick+=1
+        self._mask=self._masks[self._tick] if self._tick<len(self._masks) else 0
+
+
+def load(filename):
+    """
+    Reads a log file and returns a tuple (data, masks, calls, digest).
+
+    Here data is the wave JSON, masks a bytes object with the key mask of every
+    tick, calls the list of control calls and digest the final state digest.
+
+    Parameter filename: the log file to read
+    Precondition: filename is a string naming a log written by InputRecorder.save
+    """
+    with open(filename,'rb') as file:
+        blob=file.read()
+    magic,version,ticks,runs,wavesize,callsize,digest=LOG_HEADER.unpack_from(blob)
+    if magic!=LOG_MAGIC or version!=LOG_VERSION:
+        raise ValueError('%s is not a version %d replay log' % (filename,LOG_VERSION))
+    at=LOG_HEADER.size
+    data=json.loads(zlib.decompress(blob[at:at+wavesize]))
+    at+=wavesize
+    calls=json.loads(zlib.decompress(blob[at:at+callsize]))
+    at+=callsize
+    masks=bytearray()
+    for mask,count in LOG_RUN.iter_unpack(blob[at:at+runs*LOG_RUN.size]):
+        masks+=bytes([mask])*count
+    if len(masks)!=ticks:
+        raise ValueError('%s is truncated' % filename)
+    return (data,bytes(masks),calls,digest.hex())
+
+
+def replay(filename):
+    """
+    Replays a log headlessly and returns a tuple (wave, expected digest).
+
+    The wave is left in its final state, so wave.getDigest() should equal the
+    expected digest.
+
+    Only the control calls InputRecorder records (newship, setLives and 
+    setAsteroidsvelocity) are replayed; a log with any other call raises a 
+    ValueError, so a log cannot call any other method of the wave.
+
+    Parameter filename: the log file to replay
+    Precondition: filename is a string naming a log written by InputRecorder.save
+    """
+    data,masks,calls,digest=load(filename)
+    wave=Wave(data)
+    methods={'newship':wave.newship,'setLives':wave.setLives,
+        'setAsteroidsvelocity':wave.setAsteroidsvelocity}
+    for call in calls:
+        if (type(call)!=list or len(call)!=3 or type(call[0])!=int or
+            call[1] not in methods or type(call[2])!=list):
+            raise ValueError('%s has a control call that cannot be replayed: %r' %
+                (filename,call))
+    input=ReplayInput(masks)
+    at=0
+    for tick in range(len(masks)+1):
+        while at<len(calls) and calls[at][0]==tick:
+            methods[calls[at][1]](*calls[at][2])
+            at+=1
+        if tick<len(masks):
+            wave.tick(input)
+            input.advance()
+    return (wave,digest)
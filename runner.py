@@ -0,0 +1,211 @@
+"""
+Headless runner for Planetoids
+
+This module plays a wave without a window, using the plain models from headless.py
+and a ScriptedInput in place of GInput. It follows the same rules as Planetoids: a
+destroyed ship costs a life and is replaced at once, the wave is lost when the ship
+is destroyed with no lives left, and it is won when all asteroids are gone.
+
+It is started from __main__.py when the game is run as
+
+    python -m planetoids --headless wave1.json --frames 10000
+
+Add --memory-budget BYTES to fail the run (with exit status 1) if it uses more
+memory per live entity than that (see memory.py). Run with --help for the other options.
+"""
+from consts import *
+from headless import *
+from memory import MemoryReport
+from profiler import Profiler
+from replay import *
+from wave import *
+import argparse
+import json
+import sys
+import time
+
+
+def play(data,frames=HEADLESS_FRAMES,input=None,dt=HEADLESS_DT):
+    """
+    Plays a wave headlessly and returns a dictionary describing the outcome.
+
+    The dictionary is the one described in playwave().
+
+    Parameter data: the wave to play
+    Precondition: data is a dictionary loaded from a wave JSON file
+
+    Parameter frames: the maximum number of frames to play
+    Precondition: frames is an int >= 0
+
+    Parameter input: the input to play with, or None for a default ScriptedInput
+    Precondition: input is None or a stand-in for GInput with an advance method
+
+    Parameter dt: the time step to pass to Wave.update
+    Precondition: dt is a float > 0
+    """
+    return playwave(Wave(data),frames,input,dt)
+
+
+def playwave(wave,frames=HEADLESS_FRAMES,input=None,dt=HEADLESS_DT,endless=False,
+    speed=None,timings=None):
+    """
+    Plays an existing wave headlessly and returns a dictionary describing the outcome.
+
+    The dictionary has the keys 'outcome' ('won', 'lost' or 'running'), 'frames',
+    'ticks', 'lives', 'asteroids', 'bullets', 'seconds' and 'fps'.
+
+    Normally every frame passes dt to Wave.update and frames run as fast as they 
+    can. If speed is given, frames are instead paced against the clock, one every 
+    HEADLESS_FRAME_TIME seconds, each passing the real time since the last one, and
+    the wave runs speed times faster than real time. This is a soak test of the 
+    fixed-timestep loop.
+
+    If timings is a list, the time (in seconds) that Wave.update took in each frame
+    is appended to it.
+
+    If endless is True, a destroyed ship is always replaced without losing a life 
+    and winning does not stop the run, so exactly the given number of frames is 
+    played. This is what the benchmarks use.
+
+    Parameter wave: the wave to play
+    Precondition: wave is a Wave object
+
+    Parameter frames: the maximum number of frames to play
+    Precondition: frames is an int >= 0
+
+    Parameter input: the input to play with, or None for a default ScriptedInput
+    Precondition: input is None or a stand-in for GInput with an advance method
+
+    Parameter dt: the time step to pass to Wave.update
+    Precondition: dt is a float > 0
+
+    Parameter endless: whether to keep playing whatever happens
+    Precondition: endless is a bool
+
+    Parameter speed: how many times faster than real time to run, or None
+    Precondition: speed is None or a number > 0
+
+    Parameter timings: the list to append the time of each frame to, or None
+    Precondition: timings is None or a list
+    """
+    if input is None:
+        input=ScriptedInput()
+    if speed is not None:
+        wave.setTimeScale(speed)
+    outcome='running'
+    start=time.perf_counter()
+    last=start
+    frame=0
+    while frame<frames and outcome=='running':
+        if speed is not None:
+            wait=last+HEADLESS_FRAME_TIME-time.perf_counter()
+            if wait>0:
+                time.sleep(wait)
+            now=time.perf_counter()
+            dt=now-last
+            last=now
+        if timings is None:
+            wave.update(input,dt)
+        else:
+            before=time.perf_counter()
+            wave.update(input,dt)
+            timings.append(time.perf_counter()-before)
+        input.advance()
+        frame+=1
+        if endless:
+            if wave.isshipnone():
+                wave.newship()
+        elif wave.win():
+            outcome='won'
+        elif wave.isshipnone():
+            lives=wave.getLives()
+            if lives==0:
+                outcome='lost'
+            else:
+                wave.setLives(lives-1)
+                wave.newship()
+    seconds=time.perf_counter()-start
+    return {'outcome':outcome,'frames':frame,'ticks':wave.getTicks(),
+        'lives':wave.getLives(),
+        'asteroids':wave.getAsteroidCount(),'bullets':wave.getBulletCount(),
+        'seconds':seconds,'fps':frame/seconds if seconds>0 else 0.0}
+
+
+def main(args=None):
+    """
+    Runs the headless command line and returns the exit status.
+
+    Parameter args: the command line arguments, or None to use sys.argv
+    Precondition: args is None or a list of strings
+    """
+    parser=argparse.ArgumentParser(prog='planetoids --headless',
+        description='Play a Planetoids wave without a window.')
+    parser.add_argument('--headless',action='store_true',help=argparse.SUPPRESS)
+    parser.add_argument('wave',nargs='?',default=DEFAULT_WAVE,
+        help='the wave JSON file (default: %(default)s)')
+    parser.add_argument('--frames',type=int,default=HEADLESS_FRAMES,
+        help='the maximum number of frames to play (default: %(default)s)')
+    parser.add_argument('--speed',type=float,
+        help='pace frames against the clock and run this many times real time')
+    parser.add_argument('--script',
+        help='a JSON file holding a list of the keys down in each frame')
+    parser.add_argument('--record',
+        help='record the input of the run to this replay log')
+    parser.add_argument('--replay',
+        help='replay this log instead and check that the final state matches')
+    parser.add_argument('--profile',default=PROFILE_FILE,
+        help='profile every frame and save it to this file (a Chrome trace if it '
+        'ends in .json, and otherwise a text summary)')
+    parser.add_argument('--memory',default=MEMORY_FILE,
+        help='measure memory and save the report to this file (JSON if it ends '
+        'in .json, and otherwise text)')
+    parser.add_argument('--memory-budget',type=float,default=MEMORY_BUDGET,
+        metavar='BYTES',help='fail if the traced bytes per live entity go over '
+        'this')
+    parser.add_argument('--json',action='store_true',
+        help='print the outcome as JSON')
+    options=parser.parse_args(args)
+
+    if options.replay:
+        wave,digest=replay(options.replay)
+        print('ticks:     %d' % wave.getTicks())
+        print('digest:    %s' % wave.getDigest())
+        print('expected:  %s' % digest)
+        print('match:     %s' % (wave.getDigest()==digest))
+        return 0 if wave.getDigest()==digest else 1
+
+    script=load_json(options.script) if options.script else None
+    data=load_json(options.wave)
+    wave=Wave(data)
+    if options.record:
+        recorder=InputRecorder(data)
+        wave.setRecorder(recorder)
+    if options.profile:
+        profiler=Profiler()
+        profiler.attach(wave)
+    memory=None
+    if options.memory or options.memory_budget is not None:
+        memory=MemoryReport()
+        memory.attach(wave)
+    result=playwave(wave,options.frames,ScriptedInput(script),speed=options.speed)
+    if options.profile:
+        profiler.beginframe()
+        profiler.save(options.profile)
+    if memory is not None:
+        memory.finish()
+        result['bytes_per_entity']=memory.getBytesPerEntity()
+        if options.memory:
+            memory.save(options.memory)
+    if options.record:
+        recorder.save(options.record,wave.getDigest())
+    if options.json:
+        print(json.dumps(result))
+    else:
+        for key in result:
+            print('%-10s %s' % (key+':',result[key]))
+    if memory is not None and options.memory_budget is not None:
+        if memory.overbudget(options.memory_budget):
+            print('memory budget exceeded: %.1f bytes per live entity, over %.1f' %
+                (memory.getBytesPerEntity(),options.memory_budget),file=sys.stderr)
+            return 1
+    return 0
@@ -0,0 +1,12 @@
+"""
+Test setup for Planetoids
+
+The tests run headless, so they need neither game2d nor Kivy, and import the game
+modules from the package folder. Run them from the package folder with
+
+    python -m pytest tests
+"""
+import os
+import sys
+os.environ['PLANETOIDS_HEADLESS']='1'
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,102 @@
+"""
+Tests for asteroids bouncing off each other (see Wave.bounce in wave.py)
+"""
+from benchmarks.generate import generate
+from wave import *
+import numpy as np
+
+
+def velocities(wave):
+    """
+    Returns (vx, vy, radius) of the asteroids of the wave, read from a snapshot.
+    """
+    snapshot=wave.snapshot()
+    n=wave.getAsteroidCount()
+    at=len(SNAPSHOT_HEADER)
+    return (snapshot[at+2*n:at+3*n],snapshot[at+3*n:at+4*n],
+        snapshot[at+4*n:at+5*n])
+
+
+def test_head_on():
+    """
+    Two asteroids of the same size that meet head on swap velocities.
+    """
+    wave=Wave({'ship':{'position':[450,600],'angle':90},'bounce':True,
+        'asteroids':[{'size':'large','position':[200,200],'direction':[1,0]},
+        {'size':'large','position':[327,200],'direction':[-1,0]}]})
+    vx,vy,r=velocities(wave)
+    wave.bounce()
+    after=velocities(wave)
+    assert np.allclose(after[0],vx[::-1])
+    assert np.allclose(after[1],vy[::-1])
+
+
+def test_dense_field():
+    """
+    In a crowded field, bouncing keeps momentum and energy, so no asteroid can
+    move faster than it would with all the energy of the field.
+    """
+    wave=Wave(generate(1000,seed=0,bounce=True))
+    vx,vy,r=velocities(wave)
+    mass=r*r
+    energy=(mass*(vx*vx+vy*vy)).sum()
+    momentum=((mass*vx).sum(),(mass*vy).sum())
+    bounced=0
+    for tick in range(100):
+        wave.asteroidwrapandvel()
+        wave.bounce()
+        ux,uy,r=velocities(wave)
+        bounced+=(ux!=vx).sum()
+        vx,vy=ux,uy
+    assert bounced>0
+    assert np.isclose((mass*(vx*vx+vy*vy)).sum(),energy)
+    assert np.allclose(((mass*vx).sum(),(mass*vy).sum()),momentum)
+    assert np.hypot(vx,vy).max()<=np.sqrt(energy/mass.min())
+
+
+def test_one_collision_each():
+    """
+    The pairs chosen in one tick never share an asteroid, and every pair left out
+    shares one with a pair chosen before it.
+    """
+    rng=np.random.default_rng(3)
+    n=50
+    i=rng.integers(0,n,400)
+    j=(i+rng.integers(1,n,400))%n
+    wave=Wave(generate(1,seed=0))
+    chosen=wave._matchpairs(i,j,n)
+    ends=np.concatenate((i[chosen],j[chosen]))
+    assert len(np.unique(ends))==len(ends)
+    for k in range(len(i)):
+        if k not in chosen:
+            earlier=chosen[chosen<k]
+            assert (i[k] in i[earlier] or i[k] in j[earlier] or
+                j[k] in i[earlier] or j[k] in j[earlier])
+
+
+def test_grid_reused(monkeypatch):
+    """
+    A tick that bounces builds the grid once, and plays the same as one that
+    builds it again to detect collisions.
+    """
+    from runner import playwave
+    data=generate(300,seed=4,bounce=True)
+    builds=[0]
+    build=Grid.build
+    def counted(self,x,y):
+        builds[0]+=1
+        build(self,x,y)
+    monkeypatch.setattr(Grid,'build',counted)
+    wave=Wave(data)
+    playwave(wave,frames=200,endless=True)
+    assert builds[0]==wave.getTicks()
+
+    rebuilt=Wave(data)
+    bounce=rebuilt.bounce
+    def stale():
+        bounce()
+        rebuilt._gridready=False
+    rebuilt.bounce=stale
+    playwave(rebuilt,frames=200,endless=True)
+    assert rebuilt.getTicks()==wave.getTicks()
+    assert rebuilt.getDigest()==wave.getDigest()
@@ -0,0 +1,48 @@
+"""
+Tests for multi-wave campaigns (see campaign.py)
+"""
+from benchmarks.generate import generate
+import campaign
+import compiler
+import json
+
+
+def write(path,data):
+    """
+    Writes data as JSON to the file path and returns its name.
+    """
+    with open(str(path),'w') as file:
+        json.dump(data,file)
+    return str(path)
+
+
+def test_manifest(tmp_path,monkeypatch):
+    """
+    The waves of a manifest are handed out in order.
+    """
+    monkeypatch.setattr(compiler,'WAVE_CACHE',str(tmp_path/'cache'))
+    write(tmp_path/'a.json',generate(3,seed=1))
+    write(tmp_path/'b.json',generate(7,seed=2))
+    manifest=write(tmp_path/'camp.json',{'waves':['a.json','b.json']})
+    game=campaign.Campaign(manifest)
+    try:
+        assert game.getCount()==2
+        assert game.nextwave().getAsteroidCount()==3
+        assert game.hasnext()
+        assert game.nextwave().getAsteroidCount()==7
+        assert not game.hasnext()
+    finally:
+        game.shutdown()
+
+
+def test_cached_wave_not_parsed(tmp_path,monkeypatch):
+    """
+    A wave file that is in the cache is known to be a wave without parsing it.
+    """
+    monkeypatch.setattr(compiler,'WAVE_CACHE',str(tmp_path/'cache'))
+    wave=write(tmp_path/'wave.json',generate(20,seed=3))
+    compiler.load(wave)
+    def parse(blob):
+        raise AssertionError('the wave was parsed')
+    monkeypatch.setattr(campaign.json,'loads',parse)
+    assert campaign.readmanifest(wave)==[wave]
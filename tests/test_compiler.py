@@ -0,0 +1,44 @@
+"""
+Tests for the wave compiler and its cache (see compiler.py)
+"""
+from benchmarks.generate import generate
+import compiler
+import json
+import numpy as np
+
+
+def test_cache(tmp_path,monkeypatch):
+    """
+    A cached wave has the same records as one compiled straight from the JSON.
+    """
+    monkeypatch.setattr(compiler,'WAVE_CACHE',str(tmp_path/'cache'))
+    data=generate(40,seed=5)
+    wave=str(tmp_path/'wave.json')
+    with open(wave,'w') as file:
+        json.dump(data,file)
+    first=compiler.load(wave)
+    again=compiler.load(wave)
+    assert len(list((tmp_path/'cache').iterdir()))==1
+    expected=compiler.compilewave(data).getAsteroids()
+    assert (again.getAsteroids()==expected).all()
+    assert (first.getAsteroids()==expected).all()
+
+
+def test_tables_in_key(tmp_path,monkeypatch):
+    """
+    Changing the speed of a size class compiles the wave again, rather than 
+    reading velocities made with the old speed from the cache.
+    """
+    monkeypatch.setattr(compiler,'WAVE_CACHE',str(tmp_path/'cache'))
+    wave=str(tmp_path/'wave.json')
+    with open(wave,'w') as file:
+        json.dump(generate(40,seed=5),file)
+    before=compiler.load(wave).getAsteroids()
+    speeds=compiler.SIZE_SPEEDS*2
+    monkeypatch.setattr(compiler,'SIZE_SPEEDS',speeds)
+    monkeypatch.setattr(compiler,'WAVE_TABLES',
+        compiler.tabledigest(compiler.SIZE_NAMES,speeds))
+    after=compiler.load(wave).getAsteroids()
+    assert len(list((tmp_path/'cache').iterdir()))==2
+    assert np.allclose(after['vx'],2*before['vx'])
+    assert np.allclose(after['vy'],2*before['vy'])
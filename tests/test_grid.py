@@ -0,0 +1,74 @@
+"""
+Tests for Grid (see models.py), checked against a brute-force search
+"""
+from models import *
+import numpy as np
+import pytest
+
+
+def scatter(count,seed):
+    """
+    Returns random positions (x, y) all over the wrapped world.
+    """
+    rng=np.random.default_rng(seed)
+    return (rng.uniform(-DEAD_ZONE,GAME_WIDTH+DEAD_ZONE,count),
+        rng.uniform(-DEAD_ZONE,GAME_HEIGHT+DEAD_ZONE,count))
+
+
+def close(x1,y1,x2,y2,reach):
+    """
+    Returns the set of pairs (a, b) with a point a of x1, y1 within reach of a 
+    point b of x2, y2, across the wrapped world.
+    """
+    a,b=np.nonzero(wrapdistance2(x1[:,np.newaxis],y1[:,np.newaxis],x2,y2)<
+        reach*reach)
+    return set(zip(a.tolist(),b.tolist()))
+
+
+@pytest.mark.parametrize('cellsize',[GRID_CELL,40,4])
+def test_candidates(cellsize):
+    """
+    Every body within one cell size of a query point is a candidate.
+    """
+    x,y=scatter(600,1)
+    qx,qy=scatter(200,2)
+    grid=Grid(cellsize)
+    grid.build(x,y)
+    q,b=grid.candidates(qx,qy)
+    found=set(zip(q.tolist(),b.tolist()))
+    assert len(found)==len(q)
+    assert close(qx,qy,x,y,cellsize)<=found
+
+
+@pytest.mark.parametrize('cellsize',[GRID_CELL,40,4])
+def test_pairs(cellsize):
+    """
+    Every two bodies within one cell size of each other are a pair, once.
+    """
+    x,y=scatter(600,3)
+    grid=Grid(cellsize)
+    grid.build(x,y)
+    i,j=grid.pairs(x,y,len(x)**2)
+    found={(min(a,b),max(a,b)) for a,b in zip(i.tolist(),j.tolist())}
+    assert len(found)==len(i)
+    assert (i!=j).all()
+    expected={(a,b) for a,b in close(x,y,x,y,cellsize) if a<b}
+    assert expected<=found
+
+
+def test_pairs_limited():
+    """
+    With a limit, the calls for turns 0, 1, 2, ... together cover every pair.
+    """
+    x,y=scatter(600,4)
+    grid=Grid()
+    grid.build(x,y)
+    i,j=grid.pairs(x,y,len(x)**2)
+    everything={(min(a,b),max(a,b)) for a,b in zip(i.tolist(),j.tolist())}
+    limit=len(i)//5
+    found=set()
+    for turn in range(6):
+        i,j=grid.pairs(x,y,limit,turn)
+        assert len(i)<=2*limit
+        found|={(min(a,b),max(a,b)) for a,b in zip(i.tolist(),j.tolist())}
+    assert found==everything
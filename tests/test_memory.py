@@ -0,0 +1,55 @@
+"""
+Tests for the memory report (see memory.py)
+"""
+from benchmarks.generate import generate
+from runner import main
+import json
+import pytest
+
+
+def makewave(tmp_path):
+    """
+    Returns the name of a 500 asteroid wave file written to tmp_path.
+    """
+    wave=str(tmp_path/'wave.json')
+    with open(wave,'w') as file:
+        json.dump(generate(500,seed=0),file)
+    return wave
+
+
+def test_budget(tmp_path,capsys):
+    """
+    A run fails with status 1 when it uses more memory per entity than its budget,
+    and passes when the budget is generous.
+    """
+    wave=makewave(tmp_path)
+    assert main([wave,'--frames','200','--memory-budget','1'])==1
+    assert 'budget' in capsys.readouterr().err
+    assert main([wave,'--frames','200','--memory-budget','1e6'])==0
+
+
+def test_bad_budget(tmp_path):
+    """
+    A budget that is not a number is a usage error.
+    """
+    with pytest.raises(SystemExit):
+        main([makewave(tmp_path),'--memory-budget','lots'])
+
+
+def test_report(tmp_path,capsys):
+    """
+    --memory saves a JSON report of every frame played and of the entities left.
+    """
+    wave=makewave(tmp_path)
+    report=str(tmp_path/'memory.json')
+    assert main([wave,'--frames','200','--memory',report,'--json'])==0
+    result=json.loads(capsys.readouterr().out)
+    with open(report) as file:
+        data=json.load(file)
+    assert data['frames']==result['frames']
+    assert data['bytes_per_entity']>0
+    assert set(data['per_frame'])=={'entities','traced','allocated','retained',
+        'blocks'}
+    assert data['entities']['Asteroid'][0]==result['asteroids']
+    assert data['entities']['GLabel']==[0,0]
+    assert len(data['waves'])==1
@@ -0,0 +1,37 @@
+"""
+Tests for recording and replaying input (see replay.py)
+"""
+from benchmarks.generate import generate
+from replay import *
+from runner import main
+import pytest
+
+
+def test_roundtrip(tmp_path):
+    """
+    A recorded headless run replays to the same final state.
+    """
+    wave=str(tmp_path/'wave.json')
+    log=str(tmp_path/'run.rec')
+    with open(wave,'w') as file:
+        json.dump(generate(30,seed=2),file)
+    assert main([wave,'--frames','600','--record',log])==0
+    replayed,digest=replay(log)
+    assert replayed.getTicks()>0
+    assert replayed.getDigest()==digest
+    assert main(['--replay',log])==0
+
+
+def test_unknown_call(tmp_path):
+    """
+    A log with a control call the recorder never writes is not replayed.
+    """
+    data=generate(5,seed=2)
+    wave=Wave(data)
+    recorder=InputRecorder(data)
+    wave.setRecorder(recorder)
+    recorder.event(0,'restore',[0.0])
+    log=str(tmp_path/'bad.rec')
+    recorder.save(log,wave.getDigest())
+    with pytest.raises(ValueError):
+        replay(log)
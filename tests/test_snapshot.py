@@ -0,0 +1,90 @@
+"""
+Tests for wave snapshots (see Wave.snapshot and Wave.restore in wave.py)
+"""
+from benchmarks.generate import generate
+from headless import ScriptedInput
+from wave import *
+import numpy as np
+import pytest
+
+
+def played(count=50,ticks=120):
+    """
+    Returns a wave of count asteroids after the given number of ticks.
+    """
+    wave=Wave(generate(count,seed=0))
+    input=ScriptedInput()
+    for tick in range(ticks):
+        wave.tick(input)
+        input.advance()
+        if wave.isshipnone():
+            wave.newship()
+    return wave
+
+
+def test_roundtrip(tmp_path):
+    """
+    A snapshot saved under a name without .npy loads back and restores the wave.
+    """
+    wave=played()
+    snapshot=wave.snapshot()
+    digest=wave.getDigest()
+    filename=str(tmp_path/'checkpoint')
+    savesnapshot(filename,snapshot)
+    other=Wave(generate(50,seed=0))
+    other.restore(loadsnapshot(filename))
+    assert other.getDigest()==digest
+
+
+def test_truncated():
+    """
+    A snapshot with values cut off, or added, is rejected.
+    """
+    wave=played()
+    snapshot=wave.snapshot()
+    with pytest.raises(ValueError):
+        wave.restore(snapshot[:-100])
+    with pytest.raises(ValueError):
+        wave.restore(np.concatenate((snapshot,snapshot[-7:])))
+
+
+def test_truncated_file(tmp_path):
+    """
+    A file holding a cut off snapshot is rejected when it is loaded.
+    """
+    filename=str(tmp_path/'checkpoint.npy')
+    savesnapshot(filename,played().snapshot()[:-100])
+    with pytest.raises(ValueError):
+        loadsnapshot(filename)
+
+
+def test_wrong_version():
+    """
+    A snapshot of another version is rejected.
+    """
+    wave=played()
+    snapshot=wave.snapshot()
+    snapshot[0]=SNAPSHOT_VERSION+1
+    with pytest.raises(ValueError):
+        wave.restore(snapshot)
+
+
+@pytest.mark.parametrize('count',[np.inf,np.nan,-1.0,2.5])
+def test_bad_counts(count):
+    """
+    A snapshot whose asteroid count is not a whole number >= 0 is rejected.
+    """
+    wave=played()
+    snapshot=wave.snapshot()
+    snapshot[11]=count
+    with pytest.raises(ValueError):
+        wave.restore(snapshot)
+
+
+def test_oversized():
+    """
+    A snapshot with more asteroids than the wave can ever hold is rejected.
+    """
+    small=Wave(generate(2,seed=0))
+    with pytest.raises(ValueError):
+        small.restore(played().snapshot())
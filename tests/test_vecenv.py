@@ -0,0 +1,31 @@
+"""
+Tests for the vectorized environments (see vecenv.py)
+"""
+from benchmarks.generate import generate
+from compiler import compilewave
+from vecenv import VecWave
+import numpy as np
+import pytest
+
+
+def test_step():
+    """
+    A step returns an observation, a reward and a done flag for every wave.
+    """
+    env=VecWave(generate(20,seed=1),8)
+    observations,rewards,done=env.step(np.zeros((8,4),dtype=bool))
+    assert observations.shape==(8,env.getObservationSize())
+    assert rewards.shape==(8,)
+    assert done.shape==(8,)
+
+
+def test_bounce_refused():
+    """
+    A wave whose asteroids bounce is refused, whether compiled or not, rather than
+    played without the bounces.
+    """
+    data=generate(20,seed=1,bounce=True)
+    with pytest.raises(ValueError):
+        VecWave(data,4)
+    with pytest.raises(ValueError):
+        VecWave([generate(20,seed=1),compilewave(data)],4)
@@ -0,0 +1,481 @@
+"""
+Vectorized environments for training Planetoids agents
+
+This module steps many independent waves at once. Instead of one Wave object per
+game, a VecWave keeps the ship, asteroids and bullets of all N waves in shared NumPy
+arrays (one row per wave), and a single call to step advances every wave by one tick
+with whole-array operations.
+
+Actions are an N x 4 array of flags, one column for each key in REPLAY_KEYS: turn
+left, turn right, thrust and fire. They have the same meaning as the keys read by
+Ship.turnship and Wave.fire. Each step returns an N x OBSERVATION_SIZE array of
+observations (the ship state followed by the nearest asteroids), an array of rewards
+and an array of done flags. A wave that is done is reset at once from its wave JSON,
+so the observation returned for it is the first of a new game.
+
+The physics follows Wave.tick: every asteroid and every bullet is used up by at most
+one contact per tick. The ship's contact is handled first, then each bullet in turn
+takes the asteroid it reaches first during the tick (the lowest numbered on a tie)
+that is not taken yet. Asteroids never bounce off each other, so a wave that sets
+'bounce' (see Wave.bounce) is refused. A destroyed ship costs a life and is replaced
+at once, as in runner.py.
+
+The time of a step grows with the number of waves times their asteroid capacity
+(the most asteroids a wave can hold, see getCapacity), as the ship and each live
+bullet are tested against every asteroid slot of their wave. On one machine, with
+1000 to 4000 waves, a wave of 4 asteroids (capacity 22) ran at about 220k steps a 
+second, and a wave of 20 (capacity 106) at about 65k.
+
+This module runs headless; it does not need game2d or Kivy.
+"""
+import os
+
+# The environments always run without game2d/Kivy (see HEADLESS in consts.py)
+os.environ.setdefault('PLANETOIDS_HEADLESS','1')
+
+from consts import *
+from compiler import CompiledWave, compilewave
+from models import SIZE_RADII
+from models import fragments, impacttime, inworld, wrapdistance2, wrapoffset
+import numpy as np
+
+# The number of nearest asteroids in each observation
+VEC_NEAREST = 8
+# The number of values describing the ship in an observation
+SHIP_FEATURES = 9
+# The number of values describing each asteroid in an observation
+ASTEROID_FEATURES = 6
+
+# The reward for each asteroid hit by a bullet
+ASTEROID_REWARD = 1.0
+# The reward (a penalty) for losing the ship
+DEATH_REWARD = -5.0
+# The reward for destroying every asteroid
+WIN_REWARD = 10.0
+
+
+class VecWave(object):
+    """
+    A class to step many independent waves at once.
+
+    Every wave has room for the most asteroids it could ever hold at once: each
+    large asteroid can become nine small ones and each medium one three. Dead
+    asteroids and bullets keep their slots, marked as not alive, so the arrays never
+    change shape.
+    """
+    # Attribute _data: the wave JSON each wave is reset from
+    # Invariant: _data is a non-empty list of wave dictionaries or CompiledWaves
+    #
+    # Attribute _count: the number of waves
+    # Invariant: _count is an int > 0
+    #
+    # Attribute _nearest: the number of nearest asteroids in each observation
+    # Invariant: _nearest is an int > 0
+    #
+    # Attribute _source: the index in _data of the wave JSON of each wave
+    # Invariant: _source is an int array of length _count
+    #
+    # Attribute _start: the starting state of every wave JSON, as a dictionary of
+    #     arrays with one row per entry in _data
+    # Invariant: _start has the same keys as _state
+    #
+    # Attribute _state: the current state of every wave, as a dictionary of arrays
+    #     with one row per wave. The keys are 'x', 'y', 'vx', 'vy', 'kind' and
+    #     'alive' for the asteroids (each count x capacity), 'bx', 'by', 'bvx',
+    #     'bvy', 'bage' and 'balive' for the bullets (each count x BULLET_POOL),
+    #     and 'sx', 'sy', 'svx', 'svy', 'angle', 'lives' and 'firerate' for the ship.
+    # Invariant: _state is a dictionary of NumPy arrays as described
+    #
+    # Attribute _won: whether each wave was won in the last step
+    # Invariant: _won is a bool array of length _count
+
+    # GETTERS
+    def getCount(self):
+        """Returns the number of waves"""
+        return self._count
+
+    def getCapacity(self):
+        """Returns the number of asteroid slots in each wave"""
+        return self._state['x'].shape[1]
+
+    def getObservationSize(self):
+        """Returns the number of values in each observation"""
+        return SHIP_FEATURES+ASTEROID_FEATURES*self._nearest
+
+    def getWon(self):
+        """Returns a bool array of whether each wave was won in the last step"""
+        return self._won
+
+    # INITIALIZER
+    def __init__(self,data,count,nearest=VEC_NEAREST):
+        """
+        Creates count waves and resets them all.
+
+        If data is a list of wave dictionaries, wave i is played from entry i
+        modulo the length of the list.
+
+        Parameter data: the wave JSON to play
+        Precondition: data is a wave dictionary or CompiledWave, or a non-empty list
+        of them, none of which sets bounce (a ValueError is raised otherwise)
+
+        Parameter count: the number of waves
+        Precondition: count is an int > 0
+
+        Parameter nearest: the number of nearest asteroids in each observation
+        Precondition: nearest is an int > 0
+        """
+        self._data=data if isinstance(data,list) else [data]
+        self._count=count
+        self._nearest=nearest
+        self._source=np.arange(count)%len(self._data)
+        waves=[item if isinstance(item,CompiledWave) else compilewave(item)
+            for item in self._data]
+        for i in range(len(waves)):
+            if waves[i].getBounce():
+                raise ValueError('wave %d sets bounce, which VecWave does not '
+                    'simulate' % i)
+        capacity=max(self._capacity(wave) for wave in waves)
+        self._start=self._makestart(waves,capacity)
+        self._state={}
+        for key in self._start:
+            shape=(count,)+self._start[key].shape[1:]
+            self._state[key]=np.zeros(shape,dtype=self._start[key].dtype)
+        self._won=np.zeros(count,dtype=bool)
+        self.reset()
+
+    # STEPPING
+    def reset(self,mask=None):
+        """
+        Resets waves to their start and returns the observations of all waves.
+
+        Parameter mask: which waves to reset, or None for all of them
+        Precondition: mask is None or a bool array of length getCount()
+        """
+        rows=np.arange(self._count) if mask is None else np.flatnonzero(mask)
+        source=self._source[rows]
+        for key in self._state:
+            self._state[key][rows]=self._start[key][source]
+        return self._observe()
+
+    def step(self,actions):
+        """
+        Advances every wave by one tick and returns (observations, rewards, dones).
+
+        The observations are a float32 array of shape (getCount(),
+        getObservationSize()), and rewards and dones are arrays of length
+        getCount(). Waves that are done have already been reset.
+
+        Parameter actions: the keys held down in each wave, in REPLAY_KEYS order
+        Precondition: actions is an array-like of shape (getCount(), 4) of flags
+        """
+        actions=np.asarray(actions,dtype=bool)
+        s=self._state
+        rewards=np.zeros(self._count)
+        self._moveship(actions[:,0],actions[:,1],actions[:,2])
+        self._moveasteroids()
+        self._fire(actions[:,3])
+        events,hits=self._detect()
+        rewards+=ASTEROID_REWARD*hits
+        self._breakup(events)
+
+        dead=events[4]
+        self._won=~s['alive'].any(axis=1)
+        lost=np.zeros(self._count,dtype=bool)
+        lost[dead]=s['lives'][dead]==0
+        lost&=~self._won
+        rewards[dead]+=DEATH_REWARD
+        rewards[self._won]+=WIN_REWARD
+        respawn=np.zeros(self._count,dtype=bool)
+        respawn[dead]=True
+        respawn&=~lost & ~self._won
+        s['lives'][respawn]-=1
+        self._newship(respawn)
+
+        dones=self._won | lost
+        if dones.any():
+            self.reset(dones)
+        return (self._observe(),rewards,dones)
+
+    # HELPER METHODS
+    def _capacity(self,wave):
+        """
+        Returns the most asteroids the wave could ever hold at once.
+
+        Parameter wave: the compiled wave
+        Precondition: wave is a CompiledWave
+        """
+        pieces=np.array([1,3,9])
+        return max(1,int(pieces[wave.getAsteroids()['kind']].sum()))
+
+    def _makestart(self,waves,capacity):
+        """
+        Returns the starting state of every wave JSON as a dictionary of arrays.
+
+        Parameter waves: the compiled form of each entry in _data
+        Precondition: waves is a list of CompiledWave the same length as _data
+
+        Parameter capacity: the number of asteroid slots in each wave
+        Precondition: capacity is an int > 0
+        """
+        count=len(waves)
+        start={}
+        for key in ['x','y','vx','vy']:
+            start[key]=np.zeros((count,capacity))
+        start['kind']=np.zeros((count,capacity),dtype=int)
+        start['alive']=np.zeros((count,capacity),dtype=bool)
+        for key in ['bx','by','bvx','bvy']:
+            start[key]=np.zeros((count,BULLET_POOL))
+        start['bage']=np.zeros((count,BULLET_POOL),dtype=int)
+        start['balive']=np.zeros((count,BULLET_POOL),dtype=bool)
+        for key in ['sx','sy','svx','svy','angle']:
+            start[key]=np.zeros(count)
+        start['lives']=np.full(count,SHIP_LIVES)
+        start['firerate']=np.zeros(count,dtype=int)
+
+        for row in range(count):
+            start['sx'][row],start['sy'][row],start['angle'][row]=(
+                waves[row].getShip())
+            records=waves[row].getAsteroids()
+            n=len(records)
+            for key in ['x','y','vx','vy','kind']:
+                start[key][row,:n]=records[key]
+            start['alive'][row,:n]=True
+        return start
+
+    def _newship(self,mask):
+        """
+        Puts a new ship at the starting position of each wave in the mask.
+
+        Parameter mask: which waves get a new ship
+        Precondition: mask is a bool array of length getCount()
+        """
+        s=self._state
+        source=self._source[mask]
+        for key in ['sx','sy','angle']:
+            s[key][mask]=self._start[key][source]
+        s['svx'][mask]=0
+        s['svy'][mask]=0
+
+    def _moveship(self,left,right,thrust):
+        """
+        Turns, thrusts, moves and wraps every ship, as Wave.moveship does.
+
+        Parameter left, right, thrust: whether each key is down in each wave
+        Precondition: left, right and thrust are bool arrays of length getCount()
+        """
+        s=self._state
+        s['angle']+=SHIP_TURN_RATE*(left.astype(int)-right.astype(int))
+        radians=np.radians(s['angle'])
+        fx=np.cos(radians)
+        fy=np.sin(radians)
+        vx=s['svx']+fx*SHIP_IMPULSE
+        vy=s['svy']+fy*SHIP_IMPULSE
+        speed=np.hypot(vx,vy)
+        fast=speed>=SHIP_MAX_SPEED
+        scale=np.where(fast,SHIP_MAX_SPEED/np.maximum(speed,1e-12),1)
+        s['svx']=np.where(thrust,vx*scale,s['svx'])
+        s['svy']=np.where(thrust,vy*scale,s['svy'])
+        for key,velocity,size in [('sx','svx',GAME_WIDTH),('sy','svy',GAME_HEIGHT)]:
+            position=s[key]
+            position+=s[velocity]
+            position[position<-DEAD_ZONE]+=size+2*DEAD_ZONE
+            position[position>size+DEAD_ZONE]-=size+2*DEAD_ZONE
+
+    def _moveasteroids(self):
+        """
+        Moves and wraps every asteroid, as Bodies.move does.
+        """
+        s=self._state
+        for key,velocity,size in [('x','vx',WORLD_WIDTH),('y','vy',WORLD_HEIGHT)]:
+            position=s[key]
+            position+=s[velocity]
+            position+=DEAD_ZONE
+            np.mod(position,size,out=position)
+            position-=DEAD_ZONE
+
+    def _fire(self,fire):
+        """
+        Fires a bullet where allowed, then moves and expires every bullet.
+
+        This follows Wave.fire and Wave.deletebullet.
+
+        Parameter fire: whether the fire key is down in each wave
+        Precondition: fire is a bool array of length getCount()
+        """
+        s=self._state
+        free=~s['balive']
+        shoot=fire & (s['firerate']>=BULLET_RATE) & free.any(axis=1)
+        rows=np.flatnonzero(shoot)
+        slots=free[rows].argmax(axis=1)
+        radians=np.radians(s['angle'][rows])
+        fx=np.cos(radians)
+        fy=np.sin(radians)
+        s['bx'][rows,slots]=fx*SHIP_RADIUS+s['sx'][rows]
+        s['by'][rows,slots]=fy*SHIP_RADIUS+s['sy'][rows]
+        s['bvx'][rows,slots]=fx*BULLET_SPEED
+        s['bvy'][rows,slots]=fy*BULLET_SPEED
+        s['bage'][rows,slots]=0
+        s['balive'][rows,slots]=True
+        s['firerate'][rows]=0
+        s['firerate']+=1
+
+        s['bx']+=s['bvx']
+        s['by']+=s['bvy']
+        s['bage']+=1
+        s['balive']&=inworld(s['bx'],s['by']) & (s['bage']<BULLET_LIFETIME)
+
+    def _detect(self):
+        """
+        Finds the contacts of this tick and returns (events, hits).
+
+        The events are a tuple (waves, asteroids, dx, dy, dead) where the first
+        four are arrays with one entry per destroyed asteroid: its wave, its slot,
+        and the direction its first fragment moves in. The array dead holds the
+        waves whose ship was destroyed. The array hits counts the asteroids hit by
+        bullets in each wave. Used up bullets are marked as not alive.
+
+        Only live bullets are tested, each against the asteroid slots of its own
+        wave, and only the pairs close enough to have touched during the tick are
+        swept with impacttime.
+        """
+        s=self._state
+        alive=s['alive']
+        reach=(SHIP_RADIUS+SIZE_RADII[s['kind']])**2
+        touch=(wrapdistance2(s['x'],s['y'],s['sx'][:,np.newaxis],
+            s['sy'][:,np.newaxis])<reach) & alive
+        dead=np.flatnonzero(touch.any(axis=1))
+        first=touch[dead].argmax(axis=1)
+        used=np.zeros(alive.shape,dtype=bool)
+        used[dead,first]=True
+        vx=s['svx'][dead]
+        vy=s['svy'][dead]
+        speed=np.hypot(vx,vy)
+        radians=np.radians(s['angle'][dead])
+        moving=speed!=0
+        waves=[dead]
+        slots=[first]
+        dxs=[np.where(moving,vx/np.where(moving,speed,1),np.cos(radians))]
+        dys=[np.where(moving,vy/np.where(moving,speed,1),np.sin(radians))]
+
+        hits=np.zeros(self._count)
+        # Only live bullets, and only the asteroids close enough to have touched
+        # them during the tick, are swept
+        bw,bk=np.nonzero(s['balive'])
+        radius=BULLET_RADIUS+SIZE_RADII[s['kind'][bw]]
+        near=(wrapdistance2(s['x'][bw],s['y'][bw],s['bx'][bw,bk][:,np.newaxis],
+            s['by'][bw,bk][:,np.newaxis])<(radius+BULLET_SPEED+SMALL_SPEED)**2)
+        near&=alive[bw]
+        b,i=np.nonzero(near)
+        impact=impacttime(s['bx'][bw[b],bk[b]],s['by'][bw[b],bk[b]],
+            s['bvx'][bw[b],bk[b]],s['bvy'][bw[b],bk[b]],s['x'][bw[b],i],
+            s['y'][bw[b],i],s['vx'][bw[b],i],s['vy'][bw[b],i],radius[b,i])
+        hit=np.isfinite(impact)
+        b=b[hit]
+        i=i[hit]
+        impact=impact[hit]
+        # Each bullet slot in turn, and within it each wave, takes the asteroid
+        # it reaches first (the lowest numbered on a tie) that is not used yet
+        order=np.lexsort((i,impact,bw[b],bk[b]))
+        b=b[order]
+        i=i[order]
+        for bullet in np.unique(bk[b]).tolist():
+            mine=bk[b]==bullet
+            rows=bw[b[mine]]
+            targets=i[mine]
+            free=~used[rows,targets]
+            rows,first=np.unique(rows[free],return_index=True)
+            first=targets[free][first]
+            used[rows,first]=True
+            s['balive'][rows,bullet]=False
+            hits[rows]+=1
+            vx=s['bvx'][rows,bullet]
+            vy=s['bvy'][rows,bullet]
+            speed=np.hypot(vx,vy)
+            waves.append(rows)
+            slots.append(first)
+            dxs.append(vx/speed)
+            dys.append(vy/speed)
+        events=(np.concatenate(waves),np.concatenate(slots),np.concatenate(dxs),
+            np.concatenate(dys),dead)
+        return (events,hits)
+
+    def _breakup(self,events):
+        """
+        Removes the destroyed asteroids and adds their fragments.
+
+        The fragments are made by fragments() in models.py, as in Wave.breakup.
+
+        Parameter events: the events from _detect
+        Precondition: events is a tuple as returned by _detect
+        """
+        s=self._state
+        waves,slots,dx,dy,dead=events
+        s['alive'][waves,slots]=False
+        kind=s['kind'][waves,slots]
+        child,x,y,vx,vy=fragments(kind,s['x'][waves,slots],s['y'][waves,slots],
+            dx,dy)
+        if len(child)==0:
+            return
+        fwaves=np.repeat(waves[kind>0],3)
+
+        order=np.argsort(fwaves,kind='stable')
+        fwaves=fwaves[order]
+        rows,starts=np.unique(fwaves,return_index=True)
+        rank=np.arange(len(fwaves))-np.repeat(starts,np.diff(np.append(starts,
+            len(fwaves))))
+        free=np.argsort(s['alive'][rows],axis=1,kind='stable')
+        slots=free[np.searchsorted(rows,fwaves),rank]
+        s['x'][fwaves,slots]=x[order]
+        s['y'][fwaves,slots]=y[order]
+        s['vx'][fwaves,slots]=vx[order]
+        s['vy'][fwaves,slots]=vy[order]
+        s['kind'][fwaves,slots]=child[order]
+        s['alive'][fwaves,slots]=True
+
+    def _observe(self):
+        """
+        Returns the observations of every wave as a float32 array.
+
+        The first SHIP_FEATURES values are the ship position (as a fraction of the
+        window), its velocity (as a fraction of SHIP_MAX_SPEED), its facing,
+        whether it can fire, its lives (as a fraction of SHIP_LIVES) and a 1. Then
+        come ASTEROID_FEATURES values for each of the nearest asteroids, closest
+        first: the wrapped offset from the ship (as a fraction of the window), the
+        velocity (as a fraction of SMALL_SPEED), the radius (as a fraction of
+        LARGE_RADIUS) and a 1. Missing asteroids are all zeros.
+        """
+        s=self._state
+        obs=np.zeros((self._count,self.getObservationSize()),dtype=np.float32)
+        radians=np.radians(s['angle'])
+        obs[:,0]=s['sx']/GAME_WIDTH
+        obs[:,1]=s['sy']/GAME_HEIGHT
+        obs[:,2]=s['svx']/SHIP_MAX_SPEED
+        obs[:,3]=s['svy']/SHIP_MAX_SPEED
+        obs[:,4]=np.cos(radians)
+        obs[:,5]=np.sin(radians)
+        obs[:,6]=s['firerate']>=BULLET_RATE
+        obs[:,7]=s['lives']/SHIP_LIVES
+        obs[:,8]=1
+
+        dx=s['x']-s['sx'][:,np.newaxis]
+        dy=s['y']-s['sy'][:,np.newaxis]
+        dx,dy=wrapoffset(dx,dy)
+        distance=np.where(s['alive'],dx*dx+dy*dy,np.inf)
+        k=min(self._nearest,distance.shape[1])
+        if k<distance.shape[1]:
+            nearest=np.argpartition(distance,k-1,axis=1)[:,:k]
+        else:
+            nearest=np.tile(np.arange(k),(self._count,1))
+        order=np.argsort(np.take_along_axis(distance,nearest,axis=1),axis=1)
+        nearest=np.take_along_axis(nearest,order,axis=1)
+        present=np.take_along_axis(s['alive'],nearest,axis=1)
+        features=np.stack([np.take_along_axis(dx,nearest,axis=1)/GAME_WIDTH,
+            np.take_along_axis(dy,nearest,axis=1)/GAME_HEIGHT,
+            np.take_along_axis(s['vx'],nearest,axis=1)/SMALL_SPEED,
+            np.take_along_axis(s['vy'],nearest,axis=1)/SMALL_SPEED,
+            SIZE_RADII[np.take_along_axis(s['kind'],nearest,axis=1)]/LARGE_RADIUS,
+            np.ones(nearest.shape)],axis=2)
+        features*=present[:,:,np.newaxis]
+        obs[:,SHIP_FEATURES:SHIP_FEATURES+ASTEROID_FEATURES*k]=features.reshape(
+            self._count,-1)
+        return obs
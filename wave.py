@@ -16,16 +16,110 @@ issue.  If you do not know, ask on Ed Discussions and we will answer.
 # YOUR NAME(S) AND NETID(S) HERE
 # DATE COMPLETED HERE
 """
-from game2d import *
 from consts import *
+if not HEADLESS:
+    from game2d import *
 from models import *
-import random
-import datetime
+from compiler import CompiledWave, compilewave
+import hashlib
+import math
+import struct
 
 # PRIMARY RULE: Wave can only access attributes in models.py via getters/setters
 # Level is NOT allowed to access anything in app.py (Subcontrollers are not permitted
 # to access anything in their parent. To see why, take CS 3152)
 
+# The version of the snapshot layout (see Wave.snapshot)
+SNAPSHOT_VERSION = 1
+# The values at the start of a snapshot, in order. They are followed by the packed
+# asteroids and then the packed bullets (see Bodies.pack).
+SNAPSHOT_HEADER = ['version','lives','firerate','ticks','accumulator','ship','x','y',
+    'angle','vx','vy','asteroids','bullets']
+
+def buildasteroids(compiled):
+    """
+    Returns a new asteroid store holding the asteroids of a compiled wave.
+
+    This makes no view objects, so it is safe to call on a worker thread while 
+    another wave is played (see campaign.py).
+
+    Parameter compiled: the compiled wave
+    Precondition: compiled is a CompiledWave
+    """
+    records=compiled.getAsteroids()
+    bodies=Bodies(max(BODIES_CAPACITY,len(records)))
+    bodies.extend(records['x'],records['y'],records['vx'],records['vy'],
+        SIZE_RADII[records['kind']])
+    return bodies
+
+
+def loadsprites():
+    """
+    Loads the textures of all the game images, once for the whole run.
+
+    Planetoids calls this in its start method, so that no image file is read 
+    during play (see loadtextures in models.py).
+    """
+    loadtextures()
+
+
+def savesnapshot(filename,snapshot):
+    """
+    Saves a snapshot of a wave to a file, as a checkpoint.
+
+    The file is in NumPy's .npy format, and is written under exactly the given
+    name (np.save would add .npy to a name without it).
+
+    Parameter filename: the file to write
+    Precondition: filename is a string
+
+    Parameter snapshot: the snapshot to save
+    Precondition: snapshot is a float NumPy array returned by Wave.snapshot
+    """
+    with open(filename,'wb') as file:
+        np.save(file,snapshot,allow_pickle=False)
+
+
+def loadsnapshot(filename):
+    """
+    Returns the snapshot of a wave saved in a file by savesnapshot.
+
+    Parameter filename: the file to read
+    Precondition: filename is a string naming a file written by savesnapshot (a 
+    ValueError is raised if it holds no whole snapshot of this version)
+    """
+    snapshot=np.load(filename,allow_pickle=False)
+    checksnapshot(snapshot,filename)
+    return snapshot
+
+
+def checksnapshot(snapshot,name='snapshot'):
+    """
+    Raises a ValueError if snapshot is not a whole snapshot of this version.
+
+    The snapshot must be a flat float array of version SNAPSHOT_VERSION, its 
+    asteroid and bullet counts must be whole numbers >= 0, with at most 
+    BULLET_POOL bullets, and it must be exactly long enough to hold them.
+
+    Parameter snapshot: the snapshot to check
+    Precondition: snapshot is a NumPy array
+
+    Parameter name: the name of the snapshot in the error message
+    Precondition: name is a string
+    """
+    header=len(SNAPSHOT_HEADER)
+    if (snapshot.dtype!=float or snapshot.ndim!=1 or len(snapshot)<header or
+        snapshot[0]!=SNAPSHOT_VERSION):
+        raise ValueError('%s is not a version %d snapshot' % (name,SNAPSHOT_VERSION))
+    if not np.isfinite(snapshot[11:13]).all():
+        raise ValueError('%s is truncated or corrupt' % name)
+    n=snapshot[11]
+    m=snapshot[12]
+    if (n<0 or m<0 or n!=int(n) or m!=int(m) or m>BULLET_POOL or
+        len(snapshot)!=header+7*int(n+m)):
+        raise ValueError('%s is truncated or corrupt' % name)
+
+
 class Wave(object):
     """
     This class controls a single level or wave of Planetoids.
@@ -33,8 +127,9 @@ class Wave(object):
     This subcontroller has a reference to the ship, asteroids, and any bullets on screen.
     It animates all of these by adding the velocity to the position at each step. It
     checks for collisions between bullets and asteroids or asteroids and the ship 
-    (asteroids can safely pass through each other). A bullet collision either breaks
-    up or removes a asteroid. A ship collision kills the player. 
+    (asteroids can safely pass through each other, unless the wave JSON sets
+    'bounce', see the method bounce). A bullet collision either breaks up or
+    removes a asteroid. A ship collision kills the player.
     
     The player wins once all asteroids are destroyed.  The player loses if they run out
     of lives. When the wave is complete, you should create a NEW instance of Wave 
@@ -53,23 +148,67 @@ class Wave(object):
     """
     # LIST ANY ATTRIBUTES (AND THEIR INVARIANTS) HERE IF NECESSARY
     # THE ATTRIBUTES LISTED ARE SUGGESTIONS ONLY AND CAN BE CHANGED AS YOU SEE FIT
-    # Attribute _data: The data from the wave JSON, for reloading 
-    # Invariant: _data is a dict loaded from a JSON file
+    # Attribute _data: The data from the wave JSON, compiled, for reloading 
+    # Invariant: _data is a CompiledWave (see compiler.py)
     #
     # Attribute _ship: The player ship to control 
-    # Invariant: _ship is a Ship object
+    # Invariant: _ship is a Ship object, or None if it has been destroyed
     #
-    # Attribute _asteroids: the asteroids on screen 
-    # Invariant: _asteroids is a list of Asteroid, possibly empty
+    # Attribute _spareship: the ship object reused for every life
+    # Invariant: _spareship is a Ship object; _ship is either None or _spareship
     #
-    # Attribute _bullets: the bullets currently on screen 
-    # Invariant: _bullets is a list of Bullet, possibly empty
+    # Attribute _asteroidbodies: the positions, velocities and sizes of the asteroids
+    # Invariant: _asteroidbodies is a Bodies object holding only asteroids in play
+    #
+    # Attribute _mostasteroids: the most asteroids the wave can ever have, when 
+    #     every one of them has broken into the smallest size
+    # Invariant: _mostasteroids is an int >= 0
+    #
+    # Attribute _bulletbodies: the positions and velocities of the bullets
+    # Invariant: _bulletbodies is a Bodies object holding at most BULLET_POOL bullets
+    #
+    # Attribute _asteroidsprites: the sprites used to draw the asteroids
+    # Invariant: _asteroidsprites is a list of the shared SpritePool of Asteroid 
+    #            for each size class in SIZE_IMAGES (see spritepool)
+    #
+    # Attribute _shipsprites: the sprite used to draw the ship, which is left 
+    #     where it is drawn until the next frame (as Kivy renders it after draw
+    #     returns), so the ship object itself keeps the position of the last tick
+    # Invariant: _shipsprites is the shared SpritePool of the ship image
+    #
+    # Attribute _bulletsprites: the sprites used to draw the bullets
+    # Invariant: _bulletsprites is the shared SpritePool of Bullet
+    #
+    # Attribute _grid: the grid used to find asteroids that may be hit
+    # Invariant: _grid is a Grid object
+    #
+    # Attribute _gridready: whether _grid holds the asteroids where they are now,
+    #     as bounce leaves it for detect to use in the same tick
+    # Invariant: _gridready is a bool
     #
     # Attribute _lives: the number of lives left 
     # Invariant: _lives is an int >= 0
     #
-    # Attribute _firerate: the number of frames until the player can fire again 
+    # Attribute _firerate: the number of ticks until the player can fire again 
     # Invariant: _firerate is an int >= 0
+    #
+    # Attribute _accumulator: the time (in seconds) not yet simulated
+    # Invariant: _accumulator is a float >= 0
+    #
+    # Attribute _timescale: how many times faster than real time the wave runs
+    # Invariant: _timescale is a float > 0
+    #
+    # Attribute _ticks: the number of physics ticks run so far
+    # Invariant: _ticks is an int >= 0
+    #
+    # Attribute _recorder: the recorder of the input and control calls, if any
+    # Invariant: _recorder is an InputRecorder (see replay.py) or None
+    #
+    # Attribute _pairs: the number of pairs that have had their distance tested
+    # Invariant: _pairs is an int >= 0
+    #
+    # Attribute _fragments: the number of asteroid fragments added
+    # Invariant: _fragments is an int >= 0
     
     # GETTERS AND SETTERS (ONLY ADD IF YOU NEED THEM)
     def getLives(self):
@@ -85,8 +224,129 @@ class Wave(object):
         Precondition: lives is an integer in the range from 0 to 
         SHIP_LIVES, inclusive
         """
+        if self._recorder is not None:
+            self._recorder.event(self._ticks,'setLives',lives)
         self._lives=lives
 
+    def getAsteroidCount(self):
+        """
+        Returns the number of asteroids left in the wave.
+        """
+        return self._asteroidbodies.getCount()
+
+    def getBulletCount(self):
+        """
+        Returns the number of bullets currently in the wave.
+        """
+        return self._bulletbodies.getCount()
+
+    def getShip(self):
+        """
+        Returns the player ship, or None if it has been destroyed.
+        """
+        return self._ship
+
+    def getPairCount(self):
+        """
+        Returns the number of pairs whose distance has been tested so far.
+        """
+        return self._pairs
+
+    def getFragmentCount(self):
+        """
+        Returns the number of asteroid fragments added so far.
+        """
+        return self._fragments
+
+    def getEntityMemory(self):
+        """
+        Returns the number and estimated bytes of the wave's entities of each type.
+
+        The result is a dictionary from 'Ship', 'Asteroid' and 'Bullet' to a list
+        [count, bytes]. The count is the number in play. The bytes are those of the
+        ship object and its sprite, or of the store of that type (every slot, used or not) and of 
+        the sprites in its shared pools (see objectsize in models.py).
+        """
+        asteroids=self._asteroidbodies.getBytes()
+        for pool in self._asteroidsprites:
+            asteroids+=pool.getBytes()
+        bullets=self._bulletbodies.getBytes()+self._bulletsprites.getBytes()
+        ship=objectsize(self._spareship)+self._shipsprites.getBytes()
+        return {'Ship':[0 if self._ship is None else 1,ship],
+            'Asteroid':[self._asteroidbodies.getCount(),asteroids],
+            'Bullet':[self._bulletbodies.getCount(),bullets]}
+
+    def getData(self):
+        """
+        Returns the wave JSON this wave was made from, as a dictionary.
+        """
+        return self._data.getData()
+
+    def getTicks(self):
+        """
+        Returns the number of physics ticks run so far.
+        """
+        return self._ticks
+
+    def getTimeScale(self):
+        """
+        Returns how many times faster than real time the wave runs.
+        """
+        return self._timescale
+
+    def setTimeScale(self,scale):
+        """
+        Sets how many times faster than real time the wave runs.
+
+        A scale of 100 runs 100 ticks for each TICK_TIME passed to update. The 
+        number of ticks one update may run to catch up grows with the scale.
+
+        Parameter scale: the new time scale
+        Precondition: scale is a number > 0
+        """
+        self._timescale=scale
+
+    def setRecorder(self,recorder):
+        """
+        Sets the recorder that is given the input at the start of every tick.
+
+        The recorder is also told about every call to newship, setLives and 
+        setAsteroidsvelocity, so that a replay can repeat them at the same tick.
+
+        Parameter recorder: the recorder to use, or None to stop recording
+        Precondition: recorder is an InputRecorder (see replay.py) or None
+        """
+        self._recorder=recorder
+
+    def getDigest(self):
+        """
+        Returns a SHA-256 hex digest of the whole simulation state.
+
+        Two waves with the same digest have the same ship, asteroids, bullets,
+        lives, fire rate and tick count, bit for bit.
+        """
+        digest=hashlib.sha256()
+        digest.update(struct.pack('<qqq',self._lives,self._firerate,self._ticks))
+        if self._ship!=None:
+            velocity=self._ship.getVelocity()
+            facing=self._ship.getFacing()
+            digest.update(struct.pack('<7d',self._ship.x,self._ship.y,
+                self._ship.angle,velocity.x,velocity.y,facing.x,facing.y))
+        for bodies in [self._asteroidbodies,self._bulletbodies]:
+            for column in [bodies.getX(),bodies.getY(),bodies.getVX(),
+                bodies.getVY(),bodies.getRadius(),bodies.getAlive(),bodies.getAge()]:
+                digest.update(column.tobytes())
+        return digest.hexdigest()
+
+    def getAlpha(self):
+        """
+        Returns how far (as a fraction of a tick) the time is past the last tick.
+
+        Drawing moves each object on by this fraction of its velocity, so motion
+        looks smooth even when frames and ticks do not line up.
+        """
+        return self._accumulator/TICK_TIME
+
     def setAsteroidsvelocity(self,velocity):
         """ 
         Sets the velocity of each asteroid in the wave to a given velocity.
@@ -94,60 +354,94 @@ class Wave(object):
         Parameter velocity: the velocity to set to.
         Precondition: velocity is a list of velocity x and y coordinates.
         """
-        for i in range(len(self._asteroids)):
-            self._asteroids[i].setVelocity(velocity)
+        if self._recorder is not None:
+            self._recorder.event(self._ticks,'setAsteroidsvelocity',list(velocity))
+        self._asteroidbodies.setVelocity(velocity)
     
     # INITIALIZER (standard form) TO CREATE SHIP AND ASTEROIDS
-    def __init__(self,json):
+    def __init__(self,json,asteroids=None):
         """Creates a Wave.
 
-        The wave is created from the data stored in the json.              
+        The wave is created from the data stored in the json. The json is first 
+        compiled (see compiler.py) unless it already is, and the asteroids are then
+        built straight from the compiled records (see buildasteroids), unless they
+        were built ahead of time.
         Paramater json: the level to load
 
-        Precondition: json is a dictionary loaded from a JSON file
-        """
-        self._data=json                  
-        xs=self._data['ship']['position'][0]
-        ys=self._data['ship']['position'][1]
-        sangle=self._data['ship']['angle']
-        self._ship=Ship(xs,ys,sangle)
-        self._asteroids=[]
-        for item in self._data['asteroids']:
-            size=item['size']
-            xa=item['position'][0]
-            ya=item['position'][1]
-            direction=item['direction']
-            dv=Vector2(direction[0],direction[1])
-            sizes=[SMALL_ASTEROID,MEDIUM_ASTEROID,LARGE_ASTEROID]
-            sources=[SMALL_IMAGE,MEDIUM_IMAGE,LARGE_IMAGE]
-            radii=[SMALL_RADIUS,MEDIUM_RADIUS,LARGE_RADIUS]
-            index=sizes.index(size)
-            source=sources[index]
-            width=radii[index]*2
-            height=radii[index]*2
-            self._asteroids.append(Asteroid(xa,ya,width,height,source,dv))    
-        self._bullets=[]
+        Precondition: json is a dictionary loaded from a JSON file, or a 
+        CompiledWave
+
+        Parameter asteroids: the asteroid store built from json, or None
+        Precondition: asteroids is None, or a Bodies object returned by 
+        buildasteroids for json and not used by any other wave
+        """
+        if not isinstance(json,CompiledWave):
+            json=compilewave(json)
+        self._data=json
+        xs,ys,sangle=self._data.getShip()
+        self._spareship=Ship(xs,ys,sangle)
+        self._ship=self._spareship
+        if asteroids is None:
+            asteroids=buildasteroids(self._data)
+        self._asteroidbodies=asteroids
+        self._mostasteroids=int((3**self._data.getAsteroids()['kind']).sum())
+        self._bulletbodies=Bodies(BULLET_POOL)
+        self._asteroidsprites=[spritepool(image) for image in SIZE_IMAGES]
+        self._shipsprites=spritepool(SHIP_IMAGE)
+        self._bulletsprites=spritepool('bullet')
+        self._grid=Grid()
+        self._gridready=False
         self._firerate=0               
         self._lives=SHIP_LIVES
+        self._accumulator=0.0
+        self._timescale=1.0
+        self._ticks=0
+        self._recorder=None
+        self._pairs=0
+        self._fragments=0
     
     # UPDATE METHOD TO MOVE THE SHIP, ASTEROIDS, AND BULLETS
     def update(self,input,dt):
         """
-        Animates the ship.                          
+        Animates the ship, asteroids and bullets for the time since the last frame.
+
+        The physics runs in fixed ticks of TICK_TIME seconds, whatever the frame
+        rate. The time dt (times the time scale) is added to an accumulator and one
+        tick is run for each whole TICK_TIME in it, so a slow frame runs several
+        ticks and a fast frame may run none. To keep a slow machine from falling
+        further and further behind, at most MAX_TICKS ticks (times the time scale)
+        are run, and any time past that is dropped.
         
         Parameter input:the user input, used to control the ship and change state
         Precondition: input is an instance of GInput 
         Parameter dt: The time since the last animation frame.
         Precondition: dt is a float.
         """
-        
-        if self.getLives()!=0 or len(self._asteroids)!=0:      
+        self._accumulator+=dt*self._timescale
+        ticks=MAX_TICKS*max(1,math.ceil(self._timescale))
+        while self._accumulator>=TICK_TIME and ticks>0:
+            self.tick(input)
+            self._accumulator-=TICK_TIME
+            ticks-=1
+        if ticks==0:
+            self._accumulator=min(self._accumulator,TICK_TIME)
+
+    def tick(self,input):
+        """
+        Runs one fixed physics tick of TICK_TIME seconds.
+
+        Parameter input:the user input, used to control the ship and change state
+        Precondition: input is an instance of GInput 
+        """
+        if self._recorder is not None:
+            self._recorder.capture(input)
+        self._ticks+=1
+        if self.getLives()!=0 or self._asteroidbodies.getCount()!=0:      
             if self._ship!=None:
-                self._ship.turnship(input)
-                self._ship.x+=self._ship.getVelocity().x   
-                self._ship.y+=self._ship.getVelocity().y    
-                self._ship.wrapship()           
+                self.moveship(input)
                 self.asteroidwrapandvel()
+                if self._data.getBounce():
+                    self.bounce()
                 self.fire(input)
                 self.deletebullet()
                 self.resolve() 
@@ -157,25 +451,119 @@ class Wave(object):
         """
         This method draws the ship, asteroids and bullets.
 
+        Everything is drawn getAlpha() of a tick ahead of where the last tick left
+        it, along its velocity. Anything that does not overlap the window (such as
+        an asteroid in the DEAD_ZONE) is skipped, so the cost grows with what can
+        be seen rather than with what is in play. What is left is drawn one texture
+        at a time: the ship, then the asteroids of each size, then the bullets, 
+        each group in a single call to SpritePool.draw.
+
         Parameter: The view window
         Precondition: view is a GView.
         """
-        if self._ship!=None:
-            self._ship.draw(view)
-        for item in self._asteroids:
-            item.draw(view)
-        for item in self._bullets:
-            item.draw(view)
+        alpha=self.getAlpha()
+        ship=self._ship
+        if ship!=None:
+            x=ship.x+ship.getVelocity().x*alpha
+            y=ship.y+ship.getVelocity().y*alpha
+            if visible(x,y,SHIP_RADIUS):
+                self._shipsprites.draw(view,[x],[y],[ship.angle])
+        x,y,shown=self._placebodies(self._asteroidbodies,alpha)
+        kind=sizeclass(self._asteroidbodies.getRadius())
+        for k in range(len(self._asteroidsprites)):
+            group=shown & (kind==k)
+            self._asteroidsprites[k].draw(view,x[group].tolist(),y[group].tolist())
+        x,y,shown=self._placebodies(self._bulletbodies,alpha)
+        self._bulletsprites.draw(view,x[shown].tolist(),y[shown].tolist())
     
     # RESET METHOD FOR CREATING A NEW LIFE
+    def getSnapshotSize(self):
+        """
+        Returns the number of values in a snapshot of the wave as it is now.
+        """
+        return len(SNAPSHOT_HEADER)+7*(self._asteroidbodies.getCount()+
+            self._bulletbodies.getCount())
+
+    def snapshot(self,out=None):
+        """
+        Returns the whole simulation state of the wave as a flat float NumPy array.
+
+        The snapshot holds the lives, the fire rate, the tick count, the time not
+        yet simulated, the ship (if any) and every asteroid and bullet, laid out as
+        in SNAPSHOT_HEADER. It does not hold the wave JSON, the time scale or any
+        recorder, which restore leaves as they are. Counts are stored as floats,
+        which hold them exactly, so a restored wave plays on bit for bit as this 
+        one would.
+
+        Parameter out: the array to write into, or None to make a new one
+        Precondition: out is None or a float NumPy array of length at least
+        getSnapshotSize()
+        """
+        size=self.getSnapshotSize()
+        if out is None:
+            out=np.empty(size)
+        out=out[:size]
+        header=len(SNAPSHOT_HEADER)
+        n=self._asteroidbodies.getCount()
+        out[:header]=0
+        out[0]=SNAPSHOT_VERSION
+        out[1]=self._lives
+        out[2]=self._firerate
+        out[3]=self._ticks
+        out[4]=self._accumulator
+        if self._ship is not None:
+            velocity=self._ship.getVelocity()
+            out[5:11]=(1,self._ship.x,self._ship.y,self._ship.angle,velocity.x,
+                velocity.y)
+        out[11]=n
+        out[12]=self._bulletbodies.getCount()
+        self._asteroidbodies.pack(out[header:header+7*n])
+        self._bulletbodies.pack(out[header+7*n:])
+        return out
+
+    def restore(self,snapshot):
+        """
+        Puts the wave back in the state saved in a snapshot.
+
+        Only plain copies are made: the ship is reused and the asteroid and bullet
+        stores are refilled in place, so a wave can be reset or branched many 
+        times a second. The snapshot may come from any wave with the same JSON.
+
+        Parameter snapshot: the snapshot to restore
+        Precondition: snapshot is a float NumPy array returned by snapshot (a 
+        ValueError is raised if it fails checksnapshot, has more asteroids than
+        this wave can ever have, or has an asteroid of no size class)
+        """
+        checksnapshot(snapshot)
+        header=len(SNAPSHOT_HEADER)
+        n=int(snapshot[11])
+        m=int(snapshot[12])
+        radius=snapshot[header+4*n:header+5*n]
+        if n>self._mostasteroids or not np.isin(radius,SIZE_RADII).all():
+            raise ValueError('snapshot does not fit this wave')
+        self._lives=int(snapshot[1])
+        self._firerate=int(snapshot[2])
+        self._ticks=int(snapshot[3])
+        self._accumulator=float(snapshot[4])
+        if snapshot[5]!=0:
+            x,y,angle,vx,vy=snapshot[6:11].tolist()
+            self._spareship.restore(x,y,angle,vx,vy)
+            self._ship=self._spareship
+        else:
+            self._ship=None
+        self._asteroidbodies.unpack(snapshot[header:header+7*n])
+        self._gridready=False
+        self._bulletbodies.unpack(snapshot[header+7*n:header+7*(n+m)])
+
     def newship(self):
         """
         This method created a new ship after a life is lost.
         """
-        xs=self._data['ship']['position'][0]
-        ys=self._data['ship']['position'][1]
-        sangle=self._data['ship']['angle']
-        self._ship=Ship(xs,ys,sangle)
+        if self._recorder is not None:
+            self._recorder.event(self._ticks,'newship')
+        xs,ys,sangle=self._data.getShip()
+        self._spareship.reset(xs,ys,sangle)
+        self._ship=self._spareship
         
     # HELPER METHODS FOR PHYSICS AND COLLISION DETECTION
     def isshipnone(self):
@@ -192,20 +580,88 @@ class Wave(object):
         This method returns True if no asteroids left on the screen.
         Returns False otherwise.
         """
-        if self._asteroids==[]:
+        if self._asteroidbodies.getCount()==0:
             return True
         else:
             return False
     
+    def moveship(self,input):
+        """
+        This method turns and thrusts the ship according to the input, then moves
+        and wraps it.
+
+        Parameter input:the user input, used to control the ship and change state
+        Precondition: input is an instance of GInput
+        """
+        self._ship.turnship(input)
+        self._ship.x+=self._ship.getVelocity().x   
+        self._ship.y+=self._ship.getVelocity().y    
+        self._ship.wrapship()           
+
     def asteroidwrapandvel(self):
         """
         This method wraps each asteroid and changes its position according 
-        to the velocity.
+        to the velocity. All asteroids are moved in one vectorized step.
         """
-        for i in range(len(self._asteroids)):
-            self._asteroids[i].x+=self._asteroids[i].getVelocity().x
-            self._asteroids[i].y+=self._asteroids[i].getVelocity().y
-            self._asteroids[i].wrapasteroid()
+        self._asteroidbodies.move()
+        self._gridready=False
+
+    def bounce(self):
+        """
+        This method bounces asteroids that touch off each other.
+
+        Each pair of asteroids that overlap and are moving closer together may have
+        an elastic collision along the line between their centers, with masses in
+        proportion to the square of their radii. Pairs moving apart are left alone,
+        so asteroids that start out overlapping (such as fragments) drift apart
+        rather than stick.
+
+        An asteroid takes part in at most one collision per tick, so each collision
+        keeps the momentum and energy of its pair exactly, however crowded the
+        field. The pairs closing fastest go first (see _matchpairs), and a pair
+        left out still touches and is moving closer, so it collides in a later
+        tick.
+
+        The pairs tested come from the grid (see Grid.pairs), so the time taken
+        grows with the number of asteroids plus the number of pairs in
+        neighbouring cells, and at most about BOUNCE_PAIRS pairs are tested in
+        one tick. In a field so dense that there are more, each tick tests a
+        different share of them. With BOUNCE_PAIRS at 32768, a tick of a field 
+        of 1000 to 10000 asteroids packed into the window takes about 3 to 7 ms.
+        As bounce moves no asteroid, detect reuses the grid built here.
+        """
+        bodies=self._asteroidbodies
+        n=bodies.getCount()
+        if n<2:
+            return
+        x=bodies.getX()
+        y=bodies.getY()
+        self._grid.build(x,y)
+        self._gridready=True
+        i,j=self._grid.pairs(x,y,BOUNCE_PAIRS,self._ticks)
+        self._pairs+=len(i)
+        vx=bodies.getVX()
+        vy=bodies.getVY()
+        r=bodies.getRadius()
+        dx,dy=wrapoffset(x[j]-x[i],y[j]-y[i])
+        distance2=dx*dx+dy*dy
+        closing=(vx[j]-vx[i])*dx+(vy[j]-vy[i])*dy
+        touch=np.flatnonzero((distance2<(r[i]+r[j])**2) & (closing<0) &
+            (distance2>0))
+        if len(touch)==0:
+            return
+        touch=touch[np.argsort(closing[touch]/np.sqrt(distance2[touch]),
+            kind='stable')]
+        touch=touch[self._matchpairs(i[touch],j[touch],n)]
+        i=i[touch]
+        j=j[touch]
+        mi=r[i]*r[i]
+        mj=r[j]*r[j]
+        impulse=2*closing[touch]/(distance2[touch]*(mi+mj))
+        vx[i]+=impulse*mj*dx[touch]
+        vy[i]+=impulse*mj*dy[touch]
+        vx[j]-=impulse*mi*dx[touch]
+        vy[j]-=impulse*mi*dy[touch]
 
     def fire(self,input):
         """
@@ -213,32 +669,32 @@ class Wave(object):
         bullet to the bullet list. It then changes the positions of the bullets 
         according to the velocities.
 
+        If all BULLET_POOL bullets are in play, no bullet is fired.
+
         Parameter input:the user input, used to control the ship and change state
         Precondition: input is an instance of GInput
         """
-        if input.is_key_down('spacebar') and self._firerate>=BULLET_RATE:                   
-            x=self._ship.getFacing().x*SHIP_RADIUS+self._ship.x
-            y=self._ship.getFacing().y*SHIP_RADIUS+self._ship.y
-            width=BULLET_RADIUS*2
-            height=BULLET_RADIUS*2
-            self._bullets.append(Bullet(self._ship.getFacing(),x,y,width,height))
+        if (input.is_key_down('spacebar') and self._firerate>=BULLET_RATE
+            and self._bulletbodies.getCount()<BULLET_POOL):
+            facing=self._ship.getFacing()
+            x=facing.x*SHIP_RADIUS+self._ship.x
+            y=facing.y*SHIP_RADIUS+self._ship.y
+            self._bulletbodies.add(x,y,facing.x*BULLET_SPEED,facing.y*BULLET_SPEED,
+                BULLET_RADIUS)
             self._firerate=0            
         self._firerate+=1               
-        for i in range(len(self._bullets)):
-            self._bullets[i].x+=self._bullets[i].getVelocity().x
-            self._bullets[i].y+=self._bullets[i].getVelocity().y
+        self._bulletbodies.move(wrap=False)
 
     def deletebullet(self):
         """
-        This method deletes the given bullet from the list of bullets when it 
-        exists the window.
+        This method deletes a bullet from the list of bullets when it exits the
+        window and its DEAD_ZONE, or when it has lasted BULLET_LIFETIME frames.
+        This frees its slot for a new bullet.
         """
-        i=0
-        while i<len(self._bullets):
-            if GAME_WIDTH+2*DEAD_ZONE<self._bullets[i].x<-DEAD_ZONE:
-                del self._bullets[i]
-            else:
-                i+=1   
+        x=self._bulletbodies.getX()
+        y=self._bulletbodies.getY()
+        age=self._bulletbodies.getAge()
+        self._bulletbodies.compact(inworld(x,y) & (age<BULLET_LIFETIME))
 
     def resolve(self):
         """
@@ -254,52 +710,197 @@ class Wave(object):
         This method detects collisions: either between asteroid and ship or 
         asteroid and bullet. It also breaks up the asteroids as needed and sets 
         the ship to none as needed. 
+
+        It works in three stages. First every contact of the tick is gathered 
+        (see _gathercontacts), without changing anything. Then the contacts are 
+        resolved so that the ship, each bullet and each asteroid is used up by at
+        most one of them (see _resolvecontacts). Last, the bullets and the ship 
+        hit are removed and all the asteroids hit are broken up together (see 
+        _applyhits). So a tick breaks up at most one asteroid for the ship and 
+        one for each bullet, and the same contacts always give the same outcome.
         """
-        if self._ship!=None:
-            length=len(self._asteroids)
-            for i in range(length):
-                if self._ship!=None:
-                    positions=self._ship.getPosition()
-                    if (self._asteroids[i]!=None and self._ship!=None
-                        and self._asteroids[i].collideshp(positions)):
-                        velocitys=self._ship.getVelocity()
-                        facing=self._ship.getFacing()
-                        self._asteroids[i].setDeleted(True)
-                        self._asteroids+=self._asteroids[i].breakupshp(velocitys,
-                            facing)
-                        self._ship=None
-                    for k in range(len(self._bullets)):
-                        positionb=self._bullets[k].getPosition()
-                        if (self._asteroids[i]!=None and self._bullets[k]!=None 
-                            and self._asteroids[i].collideshp(positionb)):
-                            velocityb=self._bullets[k].getVelocity()
-                            self._asteroids+=(
-                                self._asteroids[i].breakupblt(velocityb))       
-                            self._asteroids[i].setDeleted(True)
-                            self._bullets[k].setDeleted(True)
+        if self._ship==None or self._asteroidbodies.getCount()==0:
+            return
+        crash,q,b=self._gathercontacts()
+        events=self._resolvecontacts(crash,q,b)
+        if events!=[]:
+            self._applyhits(events)
+
+    def breakup(self,hit,dx,dy):
+        """
+        Breaks up the asteroids in the given slots, adding all their fragments.
+
+        Each asteroid is marked as no longer in play, and its fragments (see 
+        fragments() in models.py) are added to the end of the asteroid store in one
+        step.
+
+        Parameter hit: the slots of the asteroids to break up
+        Precondition: hit is an int NumPy array of slots < getAsteroidCount()
+
+        Parameter dx, dy: the direction of the first fragment of each asteroid
+        Precondition: dx and dy are float NumPy arrays the same length as hit, and 
+        each (dx, dy) is a unit vector
+        """
+        bodies=self._asteroidbodies
+        bodies.kill(hit)
+        kind,x,y,vx,vy=fragments(sizeclass(bodies.getRadius()[hit]),
+            bodies.getX()[hit],bodies.getY()[hit],dx,dy)
+        radius=SIZE_RADII[kind]
+        self._fragments+=len(kind)
+        bodies.extend(x,y,vx,vy,radius)
         
     def cleanup(self):
         """
-        Removes collided items from their lists.
+        Removes collided items from their stores.
+
+        Each store is compacted in a single pass, however many items were hit.
         """   
-        i=0
-        while i<len(self._asteroids):
-            if self._asteroids[i].getDeleted():
-                del self._asteroids[i]
-                
-            else:
-                i+=1
-        k=0
-        while k<len(self._bullets):
-            if self._bullets[k].getDeleted():
-                del self._bullets[k]
+        self._asteroidbodies.compact(self._asteroidbodies.getAlive())
+        self._bulletbodies.compact(self._bulletbodies.getAlive())
+
+    def _gathercontacts(self):
+        """
+        Returns a tuple (crash, q, b) of the contacts of this tick.
+
+        Here crash is the lowest numbered asteroid the ship touches, or -1 if it 
+        touches none. The arrays q and b are the bullets and asteroids of each 
+        bullet contact, ordered by bullet and then by how soon in the tick the 
+        bullet reached the asteroid (the lowest numbered asteroid on a tie).
+
+        Only the pairs that the grid finds in neighbouring cells are tested. The 
+        ship is tested where it ends the tick, against SHIP_RADIUS. A bullet is 
+        tested against BULLET_RADIUS along its whole path through the tick (see 
+        impacttime in models.py), so it cannot pass through a small asteroid.
+        Bullets never wrap, but deletebullet removes them before they leave the 
+        world, so wrapped distances are safe for them too. The grid is built from
+        the asteroids unless bounce has just built it.
+        """
+        asteroids=self._asteroidbodies
+        x=asteroids.getX()
+        y=asteroids.getY()
+        r=asteroids.getRadius()
+        if not self._gridready:
+            self._grid.build(x,y)
+        self._gridready=False
+        sx=np.array([self._ship.x],dtype=float)
+        sy=np.array([self._ship.y],dtype=float)
+        q,b=self._grid.candidates(sx,sy)
+        self._pairs+=len(b)
+        b=b[wrapdistance2(x[b],y[b],sx[q],sy[q])<(SHIP_RADIUS+r[b])**2]
+        crash=int(b.min()) if len(b)!=0 else -1
+
+        bullets=self._bulletbodies
+        bx=bullets.getX()
+        by=bullets.getY()
+        q,b=self._grid.candidates(bx,by)
+        self._pairs+=len(b)
+        t=impacttime(bx[q],by[q],bullets.getVX()[q],bullets.getVY()[q],x[b],y[b],
+            asteroids.getVX()[b],asteroids.getVY()[b],BULLET_RADIUS+r[b])
+        hit=t<=1
+        order=np.lexsort((b[hit],t[hit],q[hit]))
+        return (crash,q[hit][order],b[hit][order])
+
+    def _resolvecontacts(self,crash,q,b):
+        """
+        Returns the contacts that take effect, as a sorted list of (asteroid, cause).
+
+        The cause is the bullet, or -1 for the ship. The ship takes the asteroid it
+        crashed into. Then each bullet in turn takes the first asteroid it reached 
+        that nothing has taken yet. A contact with an asteroid already taken is 
+        ignored, so no asteroid is broken up twice in a tick.
+
+        Parameter crash: the asteroid the ship touches, or -1
+        Precondition: crash is an int
+
+        Parameter q, b: the bullets and asteroids of each bullet contact
+        Precondition: q and b are int NumPy arrays as returned by _gathercontacts
+        """
+        events=[]
+        taken=set()
+        if crash>=0:
+            events.append((crash,-1))
+            taken.add(crash)
+        spent=set()
+        for k,i in zip(q.tolist(),b.tolist()):
+            if k not in spent and i not in taken:
+                events.append((i,k))
+                taken.add(i)
+                spent.add(k)
+        events.sort()
+        return events
+
+    def _applyhits(self,events):
+        """
+        Removes the bullets and ship of the given contacts and breaks up their 
+        asteroids, all in one step.
+
+        Each asteroid's first fragment moves the way the bullet was going, or the 
+        way the ship was moving (or facing, if it was still).
+
+        Parameter events: the contacts that take effect
+        Precondition: events is a non-empty list from _resolvecontacts
+        """
+        hit=np.array([i for i,k in events])
+        cause=np.array([k for i,k in events])
+        dx=np.zeros(len(events))
+        dy=np.zeros(len(events))
+        shot=cause>=0
+        k=cause[shot]
+        vx=self._bulletbodies.getVX()[k]
+        vy=self._bulletbodies.getVY()[k]
+        length=np.sqrt(vx*vx+vy*vy)
+        dx[shot]=vx/length
+        dy[shot]=vy/length
+        self._bulletbodies.kill(k)
+        if not shot.all():
+            velocity=self._ship.getVelocity()
+            length=velocity.length()
+            if length!=0:
+                dx[~shot]=velocity.x/length
+                dy[~shot]=velocity.y/length
             else:
-                k+=1
+                dx[~shot]=self._ship.getFacing().x
+                dy[~shot]=self._ship.getFacing().y
+            self._ship=None
+        self.breakup(hit,dx,dy)
 
-    
+    def _matchpairs(self,i,j,n):
+        """
+        Returns the indices of pairs chosen so that no body is in two of them.
 
+        The pairs are taken greedily in order of preference, in one pass: a pair 
+        is chosen unless one of its bodies is in a pair chosen before it. The time
+        taken grows with the number of pairs.
 
+        Parameter i, j: the two bodies of each pair, most preferred pair first
+        Precondition: i and j are int NumPy arrays of the same length, of bodies
+        < n, with i[k] != j[k]
 
+        Parameter n: the number of bodies
+        Precondition: n is an int > 0
+        """
+        used=bytearray(n)
+        chosen=[]
+        for k,a,b in zip(range(len(i)),i.tolist(),j.tolist()):
+            if not used[a] and not used[b]:
+                used[a]=1
+                used[b]=1
+                chosen.append(k)
+        return np.array(chosen,dtype=np.intp)
 
+    def _placebodies(self,bodies,alpha):
+        """
+        Returns a tuple (x, y, shown) for drawing the bodies in a store.
 
+        Here x and y are the positions alpha of a tick ahead along the velocity,
+        and shown is a bool NumPy array of whether each body overlaps the window.
 
+        Parameter bodies: the store to draw
+        Precondition: bodies is a Bodies object
+
+        Parameter alpha: the fraction of a tick to move each body along its velocity
+        Precondition: alpha is a float >= 0
+        """
+        x=bodies.getX()+bodies.getVX()*alpha
+        y=bodies.getY()+bodies.getVY()*alpha
+        return (x,y,visible(x,y,bodies.getRadius()))